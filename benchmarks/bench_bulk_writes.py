@@ -0,0 +1,140 @@
+"""
+Benchmark: rows/sec of the bulk write API versus one create_* call (and commit) per row.
+
+Runs against SQLite by default, using a scratch copy of the shipped schema. With
+USE_POSTGRESQL=true it runs against DATABASE_URL (tables from migrate.py) and deletes
+the rows it inserted afterwards.
+
+Usage:
+    python benchmarks/bench_bulk_writes.py [--rows 100000] [--single-rows 2000] [--chunk-size 1000]
+    USE_POSTGRESQL=true DATABASE_URL=postgresql://localhost/oce_bench python benchmarks/bench_bulk_writes.py
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from oce import create_app  # noqa: E402
+from oce.utils import db_interface as dbi  # noqa: E402
+from oce.utils.models import Post, User  # noqa: E402
+
+SHIPPED_DB = Path(__file__).resolve().parent.parent / 'oce' / 'static' / 'oce.db'
+AUTHOR = 'bench-' + str(uuid4())
+
+
+def copy_schema(db_path: Path) -> None:
+    source = sqlite3.connect(SHIPPED_DB)
+    # Full-text indexes create their own shadow tables
+    schema = [
+        row[0]
+        for row in source.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "AND name NOT IN (SELECT name FROM pragma_table_list WHERE type = 'shadow');"
+        )
+    ]
+    source.close()
+
+    con = sqlite3.connect(db_path)
+    for statement in schema:
+        con.execute(statement)
+    con.commit()
+    con.close()
+
+
+def report(label: str, rows: int, seconds: float) -> None:
+    print(f'{label:<28} {rows:>8} rows {seconds:>8.2f} s {rows / seconds:>12.0f} rows/s')
+
+
+def run(args) -> None:
+    author = User(AUTHOR, AUTHOR, f'{AUTHOR}@example.com', '', None, '', '')
+
+    start = time.perf_counter()
+    for i in range(args.single_rows):
+        dbi.create_post(AUTHOR, f'single post {i}')
+    report('create_post (per row)', args.single_rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    created = dbi.create_posts(
+        ({'author_uuid': AUTHOR, 'text_content': f'bulk post {i}'} for i in range(args.rows)),
+        chunk_size=args.chunk_size,
+    )
+    report('create_posts', created, time.perf_counter() - start)
+
+    parent = Post(**dbi.get_posts_by_author(author)[0])
+
+    start = time.perf_counter()
+    for i in range(args.single_rows):
+        dbi.create_comment(parent, author, f'single comment {i}', '')
+    report('create_comment (per row)', args.single_rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    created = dbi.create_comments(
+        ({'parent_post_uuid': parent.post_uuid, 'author_uuid': AUTHOR, 'text_content': f'bulk comment {i}'} for i in range(args.rows)),
+        chunk_size=args.chunk_size,
+    )
+    report('create_comments', created, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    created = dbi.create_users(
+        (
+            {'username': f'{AUTHOR}-{i}', 'email': f'{AUTHOR}-{i}@example.com', 'password': 'prehashed', 'profile_pic': b''}
+            for i in range(args.rows)
+        ),
+        chunk_size=args.chunk_size,
+        hash_passwords=False,
+    )
+    report('create_users (prehashed)', created, time.perf_counter() - start)
+
+
+def cleanup() -> None:
+    con = dbi.get_db()
+    cur = con.cursor()
+    users, posts, comments, post_tags = (
+        ('users', 'posts', 'comments', 'post_tags') if dbi.USE_POSTGRESQL else ('USERS', 'POSTS', 'COMMENTS', 'POST_TAGS')
+    )
+    placeholder = '%s' if dbi.USE_POSTGRESQL else '?'
+    cur.execute(f'DELETE FROM {comments} WHERE author_uuid = {placeholder};', (AUTHOR,))
+    cur.execute(
+        f'DELETE FROM {post_tags} WHERE post_uuid IN (SELECT post_uuid FROM {posts} WHERE author_uuid = {placeholder});',
+        (AUTHOR,),
+    )
+    cur.execute(f'DELETE FROM {posts} WHERE author_uuid = {placeholder};', (AUTHOR,))
+    cur.execute(f'DELETE FROM {users} WHERE username LIKE {placeholder};', (AUTHOR + '-%',))
+    con.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--single-rows', type=int, default=2000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['BLOB_STORE_DIR'] = str(Path(tmp) / 'blobs')
+        app.config['QUERY_SLOW_MS'] = None  # timed here instead
+        if not dbi.USE_POSTGRESQL:
+            db_path = Path(tmp) / 'bench.db'
+            copy_schema(db_path)
+            app.config['DB_NAME'] = str(db_path)  # absolute, so it overrides the static folder
+
+        print(f"backend: {'postgresql' if dbi.USE_POSTGRESQL else 'sqlite'}, chunk size {args.chunk_size}")
+        with app.app_context():
+            try:
+                run(args)
+            finally:
+                if dbi.USE_POSTGRESQL:
+                    cleanup()
+                dbi.close_db()
+                dbi.close_thread_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: signups and logins per second, hashing on the request thread versus in the
+password hashing pool.
+
+Each simulated client thread posts to the signup or login page through the test client,
+so a request includes its queries and rendering as well as the Argon2 work. The same
+requests are run with PASSWORD_HASH_WORKERS=0 (inline) and with the pool at its
+configured size, and throughput is also shown per core.
+
+Usage:
+    python benchmarks/bench_password_hashing.py [--threads 8] [--requests 200] [--workers N]
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PASSWORD = 'benchmark-password'
+
+
+def run(label: str, app, path: str, forms, threads: int, requests: int, expected: str) -> None:
+    latencies = []
+    local = threading.local()
+
+    def timed(form):
+        # One test client per thread, like one browser per user
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        client = local.client
+        start = time.perf_counter()
+        response = client.post(path, data=form)
+        latencies.append(time.perf_counter() - start)
+        if response.location != expected:
+            raise RuntimeError(f'{path} returned {response.status_code} {response.location}')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, itertools.islice(forms, requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    cores = os.cpu_count() or 1
+    print(
+        f'{label:<16} {requests / elapsed:>8.1f} req/s   {requests / elapsed / cores:>7.1f} req/s/core   '
+        f'p50 {statistics.median(latencies) * 1000:>8.1f} ms   '
+        f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.1f} ms'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, help='hashing pool processes, defaults to one per core')
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix='oce-bench-'))
+
+    from oce.utils.db_interface import close_thread_connections, create_users, get_password_hasher
+    from oce.utils.migrations import migrate
+    from wsgi import app
+
+    app.config.update({
+        'TESTING': True,
+        'DB_NAME': str(tmp / 'hashing.db'),
+        'BLOB_STORE_DIR': str(tmp / 'blobs'),
+        'SESSION_SQLITE_PATH': str(tmp / 'sessions.db'),
+        'QUERY_SLOW_MS': None,
+        'RATE_LIMIT_LOGIN_PER_IP': None,  # every attempt comes from the same client
+        'RATE_LIMIT_LOGIN_PER_EMAIL': None,
+        'RATE_LIMIT_SIGNUP_PER_IP': None,
+        'PASSWORD_HASH_TIMEOUT': 60,
+    })
+    with app.app_context():
+        migrate()
+        create_users([{'username': 'user0', 'email': 'user0@example.com', 'password': PASSWORD}])
+    print(f'{os.cpu_count()} cores, {args.threads} client threads, {args.requests} requests each')
+
+    signups = itertools.count()
+    for label, workers in (('inline', 0), ('pool', args.workers)):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        with app.app_context():
+            get_password_hasher().hash(PASSWORD)  # start the workers outside the timings
+        run(
+            f'{label} signup', app, '/content/SignupPage',
+            ({'username': f'new{n}', 'email': f'new{n}@example.com', 'password': PASSWORD} for n in signups),
+            args.threads, args.requests, '/content/Login/',
+        )
+        run(
+            f'{label} login', app, '/content/Login/',
+            itertools.repeat({'email': 'user0@example.com', 'password': PASSWORD}),
+            args.threads, args.requests, '/',
+        )
+    close_thread_connections()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: per-request psycopg2.connect() versus the pooled connections used by get_db().
+
+Every simulated request opens a connection (or borrows one from the pool), runs one
+lookup similar to the one inject_logged_in_user makes, and releases the connection again.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/oce_bench python benchmarks/bench_pg_pool.py [--threads 16] [--requests 2000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from oce.utils.db_pool import ConnectionPool  # noqa: E402
+
+QUERY = 'SELECT 1 AS user_uuid;'
+
+
+def per_request_connect(database_url: str) -> None:
+    con = psycopg2.connect(database_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        with con.cursor() as cur:
+            cur.execute(QUERY)
+            cur.fetchone()
+    finally:
+        con.close()
+
+
+def pooled(pool: ConnectionPool) -> None:
+    con = pool.getconn()
+    try:
+        with con.cursor() as cur:
+            cur.execute(QUERY)
+            cur.fetchone()
+    finally:
+        pool.putconn(con)
+
+
+def run(label: str, request, threads: int, requests: int) -> None:
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        request()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f'{label:<12} {requests / elapsed:>10.1f} req/s   '
+        f'p50 {statistics.median(latencies) * 1000:>7.2f} ms   '
+        f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:>7.2f} ms'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--pool-max', type=int, default=int(os.getenv('DB_POOL_MAX_SIZE', '10')))
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL environment variable not set')
+
+    print(f'{args.requests} requests over {args.threads} threads')
+    run('connect', lambda: per_request_connect(database_url), args.threads, args.requests)
+
+    pool = ConnectionPool(
+        lambda: psycopg2.connect(database_url, cursor_factory=psycopg2.extras.RealDictCursor),
+        min_size=1,
+        max_size=args.pool_max,
+        reset=lambda con: con.rollback(),
+    )
+    try:
+        run('pool', lambda: pooled(pool), args.threads, args.requests)
+        print('pool stats:', pool.stats())
+    finally:
+        pool.closeall()
+
+
+if __name__ == '__main__':
+    main()
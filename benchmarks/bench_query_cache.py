@@ -0,0 +1,150 @@
+"""
+Benchmark: requests/sec of a read-heavy forum workload with the query cache off and on.
+
+Each simulated request runs in its own app context and renders what the forum shows:
+the session user, the first page of the feed and a few of its posts with their
+authors, comments and commenters. One request in --write-every also edits a post,
+which invalidates the cached feed.
+
+Runs against SQLite by default, on a scratch copy of the shipped schema. With
+USE_POSTGRESQL=true it runs against DATABASE_URL (tables from migrate.py) and deletes
+the rows it inserted afterwards.
+
+Usage:
+    python benchmarks/bench_query_cache.py [--requests 5000] [--posts 2000] [--write-every 100]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from oce import create_app  # noqa: E402
+from oce.utils import db_interface as dbi  # noqa: E402
+from oce.utils.models import Post  # noqa: E402
+
+SHIPPED_DB = Path(__file__).resolve().parent.parent / 'oce' / 'static' / 'oce.db'
+PREFIX = 'bench-' + str(uuid4())
+
+
+def copy_schema(db_path: Path) -> None:
+    source = sqlite3.connect(SHIPPED_DB)
+    # Full-text indexes create their own shadow tables
+    schema = [
+        row[0]
+        for row in source.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "AND name NOT IN (SELECT name FROM pragma_table_list WHERE type = 'shadow');"
+        )
+    ]
+    source.close()
+
+    con = sqlite3.connect(db_path)
+    for statement in schema:
+        con.execute(statement)
+    con.commit()
+    con.close()
+
+
+def seed(args) -> list[str]:
+    user_uuids = [str(uuid4()) for _ in range(args.users)]
+    dbi.create_users(
+        (
+            {'user_uuid': user_uuid, 'username': f'{PREFIX}-{i}', 'email': f'{PREFIX}-{i}@example.com', 'password': 'prehashed'}
+            for i, user_uuid in enumerate(user_uuids)
+        ),
+        hash_passwords=False,
+    )
+    post_uuids = [str(uuid4()) for _ in range(args.posts)]
+    dbi.create_posts(
+        {'post_uuid': post_uuid, 'author_uuid': random.choice(user_uuids), 'text_content': f'{PREFIX} post {i}'}
+        for i, post_uuid in enumerate(post_uuids)
+    )
+    dbi.create_comments(
+        {'parent_post_uuid': random.choice(post_uuids), 'author_uuid': random.choice(user_uuids), 'text_content': f'comment {i}'}
+        for i in range(args.posts * 5)
+    )
+    return user_uuids
+
+
+def forum_request(user_uuids: list[str], write: bool) -> None:
+    dbi.get_session_user_by_uuid(random.choice(user_uuids))
+    posts, _, _ = dbi.get_posts_page(limit=20)
+    for row in random.sample(posts, min(5, len(posts))):
+        post = Post(**dbi.get_post_by_uuid(row['post_uuid']))
+        dbi.get_user_by_uuid(post.author_uuid)
+        for comment in dbi.get_comments_by_parent_post(post):
+            dbi.get_user_by_uuid(comment['author_uuid'])
+    if write:
+        post = Post(**dbi.get_post_by_uuid(posts[0]['post_uuid']))
+        dbi.update_post_text_content(post, f'{PREFIX} edited {time.perf_counter()}')
+
+
+def run(app, args, user_uuids: list[str], cache: bool) -> None:
+    app.config['QUERY_CACHE_ENABLED'] = cache
+    app.extensions.pop('oce_query_cache', None)
+    random.seed(0)
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        with app.app_context():
+            forum_request(user_uuids, write=args.write_every and i % args.write_every == 0)
+    seconds = time.perf_counter() - start
+
+    line = f"cache {'on' if cache else 'off':<4} {args.requests / seconds:>10.0f} requests/s"
+    if cache:
+        with app.app_context():
+            stats = dbi.get_query_cache_stats()
+        line += f"   hits {stats['hits']}, misses {stats['misses']}, evictions {stats['evictions']}"
+    print(line)
+
+
+def cleanup() -> None:
+    con = dbi.get_db()
+    cur = con.cursor()
+    cur.execute(
+        'DELETE FROM comments WHERE parent_post_uuid IN (SELECT post_uuid FROM posts WHERE text_content LIKE %s);',
+        (PREFIX + '%',),
+    )
+    cur.execute('DELETE FROM posts WHERE text_content LIKE %s;', (PREFIX + '%',))
+    cur.execute('DELETE FROM users WHERE username LIKE %s;', (PREFIX + '-%',))
+    con.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--write-every', type=int, default=100, help='one request in N edits a post, 0 for none')
+    args = parser.parse_args()
+
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['BLOB_STORE_DIR'] = str(Path(tmp) / 'blobs')
+        if not dbi.USE_POSTGRESQL:
+            db_path = Path(tmp) / 'bench.db'
+            copy_schema(db_path)
+            app.config['DB_NAME'] = str(db_path)  # absolute, so it overrides the static folder
+
+        print(f"backend: {'postgresql' if dbi.USE_POSTGRESQL else 'sqlite'}, one write every {args.write_every} requests")
+        with app.app_context():
+            user_uuids = seed(args)
+        try:
+            run(app, args, user_uuids, cache=False)
+            run(app, args, user_uuids, cache=True)
+        finally:
+            with app.app_context():
+                if dbi.USE_POSTGRESQL:
+                    cleanup()
+                dbi.close_thread_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark: latency of search_posts() over a large synthetic corpus.
+
+Fills the database with --posts posts of random text, with word frequencies following
+Zipf's law like real text, then times searches for a common word, a rare word, two
+words together and a word with no matches, on the first page and deeper pages. Reports
+the time to index the corpus and p50/p95/p99 latency per query.
+
+Runs against SQLite by default, using a scratch copy of the shipped schema. With
+USE_POSTGRESQL=true it runs against DATABASE_URL (tables from migrate.py) and deletes
+the posts it inserted afterwards.
+
+Usage:
+    python benchmarks/bench_search.py [--posts 1000000] [--runs 50] [--vocabulary 20000]
+    USE_POSTGRESQL=true DATABASE_URL=postgresql://localhost/oce_bench python benchmarks/bench_search.py
+"""
+
+import argparse
+import itertools
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from oce import create_app  # noqa: E402
+from oce.utils import db_interface as dbi  # noqa: E402
+
+SHIPPED_DB = Path(__file__).resolve().parent.parent / 'oce' / 'static' / 'oce.db'
+AUTHOR = 'bench-' + str(uuid4())
+
+
+def copy_schema(db_path: Path) -> None:
+    source = sqlite3.connect(SHIPPED_DB)
+    # Full-text indexes create their own shadow tables
+    schema = [
+        row[0]
+        for row in source.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "AND name NOT IN (SELECT name FROM pragma_table_list WHERE type = 'shadow');"
+        )
+    ]
+    source.close()
+
+    con = sqlite3.connect(db_path)
+    for statement in schema:
+        con.execute(statement)
+    con.commit()
+    con.close()
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list[str]:
+    # Letters only, so the stemmers leave the words alone and every word is distinct
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices('bcdfghjklmnprstvwz', k=3)) + rng.choice(('ava', 'elo', 'iru', 'ono', 'uxi')))
+    return sorted(words)
+
+
+def make_posts(rng: random.Random, vocabulary: list[str], cum_weights: list[float], count: int) -> list[dict]:
+    return [
+        {
+            'author_uuid': AUTHOR,
+            'text_content': ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(8, 60))).capitalize() + '.',
+        }
+        for _ in range(count)
+    ]
+
+
+def report(label: str, timings: list[float], results: int) -> None:
+    timings = sorted(t * 1000 for t in timings)
+    percentile = statistics.quantiles(timings, n=100, method='inclusive')
+    print(
+        f'{label:<32} {results:>4} results  p50 {percentile[49]:>8.2f} ms  '
+        f'p95 {percentile[94]:>8.2f} ms  p99 {percentile[98]:>8.2f} ms'
+    )
+
+
+def run(args) -> None:
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    # Only the inserts are timed, not making up the text
+    created, seconds = 0, 0.0
+    while created < args.posts:
+        posts = make_posts(rng, vocabulary, cum_weights, min(args.chunk_size, args.posts - created))
+        start = time.perf_counter()
+        created += dbi.create_posts(posts, chunk_size=args.chunk_size)
+        seconds += time.perf_counter() - start
+    print(f'indexed {created} posts in {seconds:.1f} s ({created / seconds:.0f} posts/s)')
+
+    common, mid, rare = vocabulary[0], vocabulary[len(vocabulary) // 100], vocabulary[-1]
+    queries = (
+        ('common word', common, 1),
+        ('common word, page 10', common, 10),
+        ('common word, page 100', common, 100),
+        ('less common word', mid, 1),
+        ('rare word', rare, 1),
+        ('two words', f'{common} {mid}', 1),
+        ('two words, page 10', f'{common} {mid}', 10),
+        ('no matches', 'zzzzzz', 1),
+    )
+
+    for label, text, page in queries:
+        results, _ = dbi.search_posts(text, args.limit, page)  # warm up
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            dbi.search_posts(text, args.limit, page)
+            timings.append(time.perf_counter() - start)
+        report(label, timings, len(results))
+
+
+def cleanup() -> None:
+    con = dbi.get_db()
+    cur = con.cursor()
+    # PostgreSQL indexes the posts themselves, so there is no separate index to clear
+    cur.execute('DELETE FROM posts WHERE author_uuid = %s;', (AUTHOR,))
+    con.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.runs < 2:
+        parser.error('--runs must be at least 2')
+
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['BLOB_STORE_DIR'] = str(Path(tmp) / 'blobs')
+        app.config['QUERY_SLOW_MS'] = None  # timed here instead
+        if not dbi.USE_POSTGRESQL:
+            db_path = Path(tmp) / 'bench.db'
+            copy_schema(db_path)
+            app.config['DB_NAME'] = str(db_path)  # absolute, so it overrides the static folder
+
+        print(f"backend: {'postgresql' if dbi.USE_POSTGRESQL else 'sqlite'}, {args.posts} posts, {args.runs} runs per query")
+        with app.app_context():
+            try:
+                run(args)
+            finally:
+                if dbi.USE_POSTGRESQL:
+                    cleanup()
+                dbi.close_db()
+                dbi.close_thread_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: mixed read/write throughput on SQLite, default connections versus the tuned ones.
+
+"default" opens a connection with default settings for every request and closes it
+afterwards, like get_db()/close_db() used to. "tuned" keeps one connection per worker
+thread in WAL mode with the pragmas applied by get_db(). Several worker processes
+hammer the same database file, mimicking gunicorn workers.
+
+Usage:
+    python benchmarks/bench_sqlite_mixed.py [--workers 4] [--threads 4] [--seconds 5] [--write-ratio 0.2]
+"""
+
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from uuid import uuid4
+
+SCHEMA = (
+    'CREATE TABLE POSTS(post_uuid TEXT PRIMARY KEY, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, tag1 TEXT, tag2 TEXT, tag3 TEXT, tag4 TEXT, tag5 TEXT, image_hash TEXT, datetime TEXT NOT NULL, location TEXT);',
+    'CREATE TABLE COMMENTS(comment_uuid TEXT PRIMARY KEY, parent_post_uuid TEXT NOT NULL, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, datetime TEXT NOT NULL);',
+)
+SEED_POSTS = 1000
+
+
+def open_default(db_path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(db_path)
+
+
+def open_tuned(db_path: Path) -> sqlite3.Connection:
+    con = sqlite3.connect(db_path, timeout=5)
+    con.execute('PRAGMA journal_mode = WAL;')
+    con.execute('PRAGMA busy_timeout = 5000;')
+    con.execute('PRAGMA synchronous = NORMAL;')
+    con.execute('PRAGMA cache_size = -16384;')
+    con.execute(f'PRAGMA mmap_size = {128 * 1024 * 1024};')
+    return con
+
+
+def one_request(con: sqlite3.Connection, post_uuids: list[str], write: bool) -> None:
+    post_uuid = random.choice(post_uuids)
+    if write:
+        con.execute(
+            'INSERT INTO COMMENTS VALUES(?, ?, ?, ?, ?);',
+            (str(uuid4()), post_uuid, 'bench', 'comment text', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        )
+        con.commit()
+    else:
+        con.execute('SELECT * FROM POSTS WHERE post_uuid = ?;', (post_uuid,)).fetchone()
+        con.execute('SELECT * FROM COMMENTS WHERE parent_post_uuid = ?;', (post_uuid,)).fetchall()
+
+
+def worker(mode: str, db_path: Path, threads: int, seconds: float, write_ratio: float, post_uuids, results) -> None:
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop():
+        local = {'reads': 0, 'writes': 0, 'locked': 0}
+        con = open_tuned(db_path) if mode == 'tuned' else None
+        while time.monotonic() < deadline:
+            write = random.random() < write_ratio
+            request_con = con or open_default(db_path)
+            try:
+                one_request(request_con, post_uuids, write)
+                local['writes' if write else 'reads'] += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                local['locked'] += 1
+            finally:
+                if con is None:
+                    request_con.close()
+        if con is not None:
+            con.close()
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    pool = [threading.Thread(target=loop) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def run(mode: str, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.db'
+        con = sqlite3.connect(db_path)
+        for statement in SCHEMA:
+            con.execute(statement)
+        post_uuids = [str(uuid4()) for _ in range(SEED_POSTS)]
+        con.executemany(
+            "INSERT INTO POSTS VALUES(?, 'bench', 'post text', NULL, NULL, NULL, NULL, NULL, NULL, '', NULL);",
+            [(post_uuid,) for post_uuid in post_uuids],
+        )
+        con.commit()
+        con.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=worker,
+                args=(mode, db_path, args.threads, args.seconds, args.write_ratio, post_uuids, results),
+            )
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'reads': 0, 'writes': 0, 'locked': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+
+    ops = totals['reads'] + totals['writes']
+    print(
+        f'{mode:<8} {ops / args.seconds:>10.1f} req/s   '
+        f"reads {totals['reads']:>8}   writes {totals['writes']:>7}   locked errors {totals['locked']:>5}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers x {args.threads} threads, {args.write_ratio:.0%} writes, {args.seconds}s per mode')
+    for mode in ('default', 'tuned'):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: per-call overhead of db_interface queries before and after the statement registry.
+
+"before" reproduces the previous shape of get_user_by_uuid(): pick the table name and
+placeholder for the dialect and format the SQL on every call. "after" is the current
+get_user_by_uuid(), which runs a statement compiled once at import. Both run against
+the same in-process SQLite database, so the difference is the per-call Python work.
+
+Usage:
+    python benchmarks/bench_statements.py [--calls 200000]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from oce import create_app  # noqa: E402
+from oce.utils import db_interface  # noqa: E402
+from oce.utils.db_interface import USE_POSTGRESQL, get_db, get_user_by_uuid  # noqa: E402
+
+
+def legacy_get_user_by_uuid(user_uuid: str):
+    con = get_db()
+    cur = con.cursor()
+
+    table_name = 'users' if USE_POSTGRESQL else 'USERS'
+
+    if USE_POSTGRESQL:
+        cur.execute(f'SELECT * FROM {table_name} WHERE user_uuid = %s;', (user_uuid,))
+        datum = cur.fetchone()
+        return dict(datum) if datum else None
+    else:
+        datum = cur.execute(f'SELECT * FROM {table_name} WHERE user_uuid = ?;', (user_uuid,)).fetchone()
+        return datum
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.db'
+        con = sqlite3.connect(db_path)
+        con.execute(
+            'CREATE TABLE USERS(user_uuid TEXT PRIMARY KEY, username TEXT NOT NULL, email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, profile_pic_hash TEXT, about_me TEXT NOT NULL, datetime_created TEXT);'
+        )
+        user_uuid = str(uuid4())
+        con.execute("INSERT INTO USERS VALUES(?, 'bench', 'bench@example.com', '', NULL, '', '');", (user_uuid,))
+        con.commit()
+        con.close()
+
+        app = create_app()
+        app.config['DB_NAME'] = str(db_path)  # absolute, so it overrides the static folder
+        with app.app_context():
+            for label, call in (
+                ('before', lambda: legacy_get_user_by_uuid(user_uuid)),
+                ('after', lambda: get_user_by_uuid(user_uuid)),
+            ):
+                call()
+                seconds = min(timeit.repeat(call, number=args.calls, repeat=3))
+                print(f'{label:<8} {seconds / args.calls * 1e6:>7.2f} us/call')
+            db_interface.close_thread_connections()
+
+
+if __name__ == '__main__':
+    main()
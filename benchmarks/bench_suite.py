@@ -0,0 +1,468 @@
+"""
+Benchmark suite: every public db_interface function and the forum, login and signup
+request paths, at several data sizes, written out as JSON.
+
+For each size in --sizes a fresh database is created with migrate.py's migrations and
+filled with datagen.Dataset rows (users, posts with tags, locations and images, and
+comments) through the bulk create_* functions. Each operation then runs up to --runs
+times, each time in its own app context like a request, with keys picked by a seeded
+random generator. An operation stops early once it has used --budget seconds and run
+at least three times, so full scans stay affordable at millions of rows. Write
+operations change rows the suite created for them, leaving the dataset intact.
+
+Each size runs in its own process, so connection pools, caches and memory start fresh.
+SQLite uses a scratch file. With USE_POSTGRESQL=true a scratch schema is created in
+DATABASE_URL, ANALYZEd after loading and dropped afterwards.
+
+The JSON holds the load rates and, per operation, p50/p95/mean/min/max milliseconds and
+the number of statements it ran. --compare prints the operations whose p50 moved by
+more than --threshold against an earlier run and exits with status 1 on regressions.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes 10000,100000] [--runs 20] [--budget 5] [--output results.json]
+    USE_POSTGRESQL=true DATABASE_URL=postgresql://localhost/oce_bench python benchmarks/bench_suite.py --sizes 1000000
+    python benchmarks/bench_suite.py --compare before.json after.json
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from datagen import LOCATIONS, PASSWORD, TAGS, Dataset  # noqa: E402
+
+# Public db_interface functions that are plumbing rather than queries.
+NOT_TIMED = frozenset({
+    'close_db', 'close_thread_connections', 'get_blob_store', 'get_db', 'get_pool_stats',
+    'get_queries_saved', 'get_query_cache_stats', 'get_query_stats', 'report_query_stats', 'search_rowid',
+})
+
+# Rows created per call by the bulk create_* operations.
+BATCH = 100
+
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+class Bench:
+    """State shared by the operations of one size: the dataset and the rows made for writes."""
+
+    def __init__(self, dbi, models, app, dataset: Dataset, seed: int):
+        self.dbi = dbi
+        self.models = models
+        self.app = app
+        self.client = app.test_client()
+        self.data = dataset
+        self.rng = random.Random(f'{seed}:operations')
+        self.counter = 0
+        self.common_word = dataset.words[0]
+        self.rare_word = dataset.words[len(dataset.words) // 2]
+        # Rows with a picture, so the image reads have a file to read
+        sample = 1000
+        self.image_users = [
+            i for i, row in enumerate(itertools.islice(dataset.generate_users(''), sample)) if row['profile_pic']
+        ] or [0]
+        self.image_posts = [
+            i for i, row in enumerate(itertools.islice(dataset.generate_posts(), sample)) if row['image']
+        ] or [0]
+
+    def unique(self, prefix: str) -> str:
+        self.counter += 1
+        return f'{prefix}-{self.counter}'
+
+    def timestamp(self, value: datetime) -> str:
+        return self.dbi._normalize_timestamp(value)
+
+    # Random rows of the dataset
+
+    def user(self) -> int:
+        return self.rng.randrange(self.data.users)
+
+    def post(self) -> int:
+        return self.rng.randrange(self.data.posts)
+
+    def recent_post(self) -> int:
+        return self.data.posts - 1 - self.rng.randrange(min(self.data.posts, 100))
+
+    def comment(self) -> int:
+        return self.rng.randrange(self.data.comments) if self.data.comments else 0
+
+    # Rows for write operations, made outside the timed part
+
+    def new_user(self):
+        email = self.unique('writer') + '@example.com'
+        self.dbi.create_users([{'username': email, 'email': email, 'password': 'prehashed'}], hash_passwords=False)
+        return self.models.User(**self.dbi.get_user_by_email(email))
+
+    def new_post(self, author):
+        post_uuid = self.unique('bench-post')
+        self.dbi.create_posts([{'post_uuid': post_uuid, 'author_uuid': author.user_uuid, 'text_content': 'benchmark post'}])
+        return self.models.Post(**self.dbi.get_post_by_uuid(post_uuid))
+
+    def new_comment(self, post, author):
+        comment_uuid = self.unique('bench-comment')
+        self.dbi.create_comments([{
+            'comment_uuid': comment_uuid,
+            'parent_post_uuid': post.post_uuid,
+            'author_uuid': author.user_uuid,
+            'text_content': 'benchmark comment',
+        }])
+        return self.models.Comment(**self.dbi.get_comment_by_uuid(comment_uuid))
+
+
+# Operations. Each takes the Bench, prepares what it needs and returns the call to time.
+
+def _reads(b: Bench) -> dict[str, Callable[[], Callable]]:
+    dbi, data = b.dbi, b.data
+    return {
+        'get_user_by_uuid': lambda: lambda uuid=data.user_uuid(b.user()): dbi.get_user_by_uuid(uuid),
+        'get_user_by_email': lambda: lambda email=data.email(b.user()): dbi.get_user_by_email(email),
+        'get_user_by_username': lambda: lambda name=data.username(b.user()): dbi.get_user_by_username(name),
+        'get_session_user_by_uuid': lambda: lambda uuid=data.user_uuid(b.user()): dbi.get_session_user_by_uuid(uuid),
+        'get_user_credentials_by_email': lambda: lambda email=data.email(b.user()): dbi.get_user_credentials_by_email(email),
+        'get_user_avatar': lambda: lambda uuid=data.user_uuid(b.user()): dbi.get_user_avatar(uuid),
+        'get_user_profile_pic_path': lambda: lambda uuid=data.user_uuid(b.rng.choice(b.image_users)): dbi.get_user_profile_pic_path(uuid),
+        'get_user_profile_pic': lambda: lambda uuid=data.user_uuid(b.rng.choice(b.image_users)): dbi.get_user_profile_pic(uuid),
+        'get_all_posts': lambda: dbi.get_all_posts,
+        'get_posts_page': lambda: lambda: dbi.get_posts_page(20),
+        'get_posts_page (deep)': lambda: lambda cursor=_cursor(b, 'datetime'): dbi.get_posts_page(20, cursor),
+        'get_posts_page (activity)': lambda: lambda: dbi.get_posts_page(20, sort='activity'),
+        'get_post_by_uuid': lambda: lambda uuid=data.post_uuid(b.post()): dbi.get_post_by_uuid(uuid),
+        'get_posts_by_author': lambda: lambda author=_user_object(b): dbi.get_posts_by_author(author),
+        'get_posts_by_tag': lambda: lambda tag=b.rng.choice(TAGS): dbi.get_posts_by_tag(tag),
+        'get_posts_by_tags': lambda: lambda tags=b.rng.sample(TAGS, 2): dbi.get_posts_by_tags(tags, match='all'),
+        'get_tag_counts': lambda: dbi.get_tag_counts,
+        'get_posts_by_datetime': lambda: lambda when=data.post_datetime(b.post()): dbi.get_posts_by_datetime(when),
+        'get_posts_between': lambda: lambda start=data.post_datetime(b.post()): dbi.get_posts_between(start, start + timedelta(days=1)),
+        'get_posts_by_location': lambda: lambda location=b.rng.choice(LOCATIONS): dbi.get_posts_by_location(location),
+        'get_post_image_path': lambda: lambda post=_post_object(b, b.rng.choice(b.image_posts)): dbi.get_post_image_path(post),
+        'get_post_image': lambda: lambda post=_post_object(b, b.rng.choice(b.image_posts)): dbi.get_post_image(post),
+        'get_comment_by_uuid': lambda: lambda uuid=data.comment_uuid(b.comment()): dbi.get_comment_by_uuid(uuid),
+        'get_comments_by_parent_post': lambda: lambda post=_post_object(b, b.recent_post()): dbi.get_comments_by_parent_post(post),
+        'get_comments_by_author': lambda: lambda author=_user_object(b): dbi.get_comments_by_author(author),
+        'get_comments_by_datetime': lambda: lambda when=data.post_datetime(b.post()): dbi.get_comments_by_datetime(when),
+        'get_comments_since': lambda: lambda since=data.post_datetime(data.posts - 1) - timedelta(hours=1): dbi.get_comments_since(since),
+        'search_posts': lambda: lambda: dbi.search_posts(b.common_word),
+        'search_posts (rare word)': lambda: lambda: dbi.search_posts(b.rare_word),
+        'search_comments': lambda: lambda: dbi.search_comments(b.common_word),
+        'check_activity_counters': lambda: dbi.check_activity_counters,
+    }
+
+
+def _cursor(b: Bench, column: str) -> str:
+    index = b.post()
+    post = {column: b.timestamp(b.data.post_datetime(index)), 'post_uuid': b.data.post_uuid(index)}
+    return b.dbi._encode_cursor('older', column, post)
+
+
+def _user_object(b: Bench, index: int | None = None):
+    uuid = b.data.user_uuid(b.user() if index is None else index)
+    return b.models.User(uuid, '', '', '', None, '', '')
+
+
+def _post_object(b: Bench, index: int | None = None):
+    row = b.dbi.get_post_by_uuid(b.data.post_uuid(b.post() if index is None else index))
+    return b.models.Post(**row)
+
+
+def _writes(b: Bench) -> dict[str, Callable[[], Callable]]:
+    dbi = b.dbi
+    writer = b.new_user()
+    post = b.new_post(writer)
+    comment = b.new_comment(post, writer)
+    image = b.data.images[0]
+
+    def batch(kind: str) -> list[dict]:
+        if kind == 'users':
+            return [
+                {'username': name, 'email': name + '@example.com', 'password': 'prehashed'}
+                for name in (b.unique('batch-user') for _ in range(BATCH))
+            ]
+        if kind == 'posts':
+            return [{'author_uuid': writer.user_uuid, 'text_content': 'batch post'} for _ in range(BATCH)]
+        return [
+            {'parent_post_uuid': post.post_uuid, 'author_uuid': writer.user_uuid, 'text_content': 'batch comment'}
+            for _ in range(BATCH)
+        ]
+
+    return {
+        'create_user': lambda: lambda email=b.unique('signup') + '@example.com': dbi.create_user(email, email, PASSWORD),
+        'create_users': lambda: lambda rows=batch('users'): dbi.create_users(rows, hash_passwords=False),
+        'update_user_username': lambda: lambda name=b.unique('name'): dbi.update_user_username(writer, name),
+        'update_user_email': lambda: lambda email=b.unique('email') + '@example.com': dbi.update_user_email(writer, email),
+        'update_user_password': lambda: lambda: dbi.update_user_password(writer, PASSWORD),
+        'update_user_profile_pic': lambda: lambda pic=b.rng.choice(b.data.images): dbi.update_user_profile_pic(writer, pic),
+        'update_user_about_me': lambda: lambda text=b.unique('about'): dbi.update_user_about_me(writer, text),
+        'update_user': lambda: lambda name=b.unique('name'): dbi.update_user(writer, username=name, about_me=name),
+        'delete_user': lambda: lambda user=b.new_user(): dbi.delete_user(user),
+        'create_post': lambda: lambda: dbi.create_post(writer.user_uuid, 'benchmark post'),
+        'create_posts': lambda: lambda rows=batch('posts'): dbi.create_posts(rows),
+        'update_post_text_content': lambda: lambda text=b.unique('text'): dbi.update_post_text_content(post, text),
+        'update_post_tags': lambda: lambda tags=tuple(b.rng.sample(TAGS, 2)) + ('None',) * 3: dbi.update_post_tags(post, tags),
+        'update_post_image': lambda: lambda: dbi.update_post_image(post, image),
+        'update_post_datetime': lambda: lambda: dbi.update_post_datetime(post, datetime.now(timezone.utc)),
+        'update_post_location': lambda: lambda place=b.rng.choice(LOCATIONS): dbi.update_post_location(post, place),
+        'update_post': lambda: lambda text=b.unique('text'): dbi.update_post(post, text_content=text, location='Omaha'),
+        'delete_post': lambda: lambda doomed=b.new_post(writer): dbi.delete_post(doomed),
+        'create_comment': lambda: lambda: dbi.create_comment(post, writer, 'benchmark comment'),
+        'create_comments': lambda: lambda rows=batch('comments'): dbi.create_comments(rows),
+        'update_comment_text_content': lambda: lambda text=b.unique('text'): dbi.update_comment_text_content(comment, text),
+        'update_comment_datetime': lambda: lambda: dbi.update_comment_datetime(comment, datetime.now(timezone.utc)),
+        'delete_comment': lambda: lambda doomed=b.new_comment(post, writer): dbi.delete_comment(doomed),
+        'rebuild_activity_counters': lambda: dbi.rebuild_activity_counters,
+    }
+
+
+def _requests(b: Bench) -> dict[str, Callable[[], Callable]]:
+    def get(url: str) -> Callable:
+        return lambda: _expect(b.client.get(url), 200)
+
+    def login(index: int) -> Callable:
+        form = {'email': b.data.email(index), 'password': PASSWORD}
+        return lambda: _expect(b.client.post('/content/Login/', data=form), 302, '/')
+
+    def signup(name: str) -> Callable:
+        form = {'username': name, 'email': f'{name}@example.com', 'password': PASSWORD, 'about_me': ''}
+        return lambda: _expect(b.client.post('/content/SignupPage', data=form), 302, '/content/Login/')
+
+    return {
+        'GET forum': lambda: get('/content/ConceptExchange/'),
+        'GET forum (deep page)': lambda: get(f'/content/ConceptExchange/?cursor={quote(_cursor(b, "datetime"))}'),
+        'GET forum (activity)': lambda: get('/content/ConceptExchange/?sort=activity'),
+        'GET forum (search)': lambda: get(f'/content/ConceptExchange/?q={b.common_word}'),
+        'POST login': lambda: login(b.user()),
+        'POST signup': lambda: signup(b.unique('signup')),
+    }
+
+
+def _expect(response, status: int, location: str | None = None):
+    """Fail the benchmark if a request did not take the path it is meant to time."""
+    if response.status_code != status or (location is not None and response.location != location):
+        raise RuntimeError(
+            f'{response.request.method} {response.request.path} returned {response.status_code} {response.location or ""}'
+        )
+    return response
+
+
+def _time(b: Bench, name: str, prepare: Callable[[], Callable], runs: int, budget: float) -> dict:
+    timings, queries = [], []
+    spent = 0.0
+    while len(timings) < runs and (spent < budget or len(timings) < 3):
+        with b.app.app_context():
+            call = prepare()
+            before = b.dbi.get_query_stats().count
+            start = time.perf_counter()
+            result = call()
+            elapsed = time.perf_counter() - start
+            after = b.dbi.get_query_stats().count
+        if hasattr(result, 'headers'):
+            # Requests run in their own app context and report their queries in Server-Timing
+            timing = result.headers.get('Server-Timing', '')
+            after, before = int(timing.rpartition('desc="')[2].split(' ')[0] or 0), 0
+        timings.append(elapsed)
+        queries.append(after - before)
+        spent += elapsed
+
+    timings_ms = sorted(t * 1000 for t in timings)
+    percentile = statistics.quantiles(timings_ms, n=100, method='inclusive')
+    return {
+        'runs': len(timings_ms),
+        'p50_ms': round(percentile[49], 4),
+        'p95_ms': round(percentile[94], 4),
+        'mean_ms': round(statistics.fmean(timings_ms), 4),
+        'min_ms': round(timings_ms[0], 4),
+        'max_ms': round(timings_ms[-1], 4),
+        'queries': max(queries),
+    }
+
+
+def untimed_functions(dbi, timed: set[str]) -> list[str]:
+    public = {
+        name
+        for name, function in inspect.getmembers(dbi, inspect.isfunction)
+        if not name.startswith('_') and function.__module__ == dbi.__name__
+    }
+    return sorted(public - NOT_TIMED - {name.split(' ')[0] for name in timed})
+
+
+def run_size(args) -> dict:
+    """Load one dataset and time every operation against it. Runs in a child process."""
+    tmp = Path(tempfile.mkdtemp(prefix='oce-bench-'))
+
+    schema = None
+    if os.getenv('USE_POSTGRESQL', 'false').lower() == 'true':
+        import psycopg2
+
+        base_url = os.environ['DATABASE_URL']
+        schema = f'oce_bench_{os.getpid()}'
+        with psycopg2.connect(base_url) as con, con.cursor() as cur:
+            cur.execute(f'CREATE SCHEMA {schema};')
+        separator = '&' if '?' in base_url else '?'
+        os.environ['DATABASE_URL'] = f"{base_url}{separator}options={quote(f'-c search_path={schema}')}"
+
+    from oce.utils import db_interface as dbi
+    from oce.utils import models
+    from oce.utils.migrations import migrate
+    from wsgi import app
+
+    app.config.update({
+        'TESTING': True,
+        'DB_NAME': str(tmp / 'bench.db'),  # absolute, so it overrides the static folder
+        'BLOB_STORE_DIR': str(tmp / 'blobs'),
+        'SESSION_SQLITE_PATH': str(tmp / 'sessions.db'),
+        'QUERY_SLOW_MS': None,
+        'RATE_LIMIT_LOGIN_PER_IP': None,  # every attempt comes from the same client
+        'RATE_LIMIT_LOGIN_PER_EMAIL': None,
+        'RATE_LIMIT_SIGNUP_PER_IP': None,
+        'QUERY_REPEAT_WARNING': None,
+    })
+    dataset = Dataset(args.size, args.seed)
+    result = {'rows': args.size, 'users': dataset.users, 'posts': dataset.posts, 'comments': dataset.comments}
+
+    try:
+        with app.app_context():
+            migrate()
+            password_hash = dbi.get_password_hasher().hash(PASSWORD)
+            load = {}
+            for table, rows, create in (
+                ('users', dataset.generate_users(password_hash), lambda rows: dbi.create_users(rows, args.chunk_size, hash_passwords=False)),
+                ('posts', dataset.generate_posts(), lambda rows: dbi.create_posts(rows, args.chunk_size)),
+                ('comments', dataset.generate_comments(), lambda rows: dbi.create_comments(rows, args.chunk_size)),
+            ):
+                start = time.perf_counter()
+                created = create(rows)
+                seconds = time.perf_counter() - start
+                load[table] = {'rows': created, 'seconds': round(seconds, 3), 'rows_per_second': round(created / seconds)}
+                log(f'  loaded {created} {table} in {seconds:.1f} s')
+            if dbi.USE_POSTGRESQL:
+                con = dbi.get_db()
+                con.cursor().execute('ANALYZE;')
+                con.commit()
+            result['load'] = load
+
+        bench = Bench(dbi, models, app, dataset, args.seed)
+        with app.app_context():
+            operations = {**_reads(bench), **_writes(bench), **_requests(bench)}
+        result['operations'] = {}
+        for name, prepare in operations.items():
+            result['operations'][name] = stats = _time(bench, name, prepare, args.runs, args.budget)
+            log(f"  {name:<32} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  {stats['queries']} queries")
+        result['untimed'] = untimed_functions(dbi, set(operations))
+    finally:
+        dbi.close_thread_connections()
+        if schema is not None:
+            with psycopg2.connect(base_url) as con, con.cursor() as cur:
+                cur.execute(f'DROP SCHEMA {schema} CASCADE;')
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def git_commit() -> dict:
+    def git(*command: str) -> str | None:
+        try:
+            return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def compare(before: dict, after: dict, threshold: float) -> int:
+    """Print the operations whose p50 changed by more than threshold. Returns the regression count."""
+    regressions = 0
+    old = {(size['rows'], name): stats for size in before['sizes'] for name, stats in size['operations'].items()}
+    for size in after['sizes']:
+        for name, stats in size['operations'].items():
+            if (base := old.get((size['rows'], name))) is None or not base['p50_ms']:
+                continue
+            ratio = stats['p50_ms'] / base['p50_ms']
+            if ratio > 1 + threshold:
+                regressions += 1
+                verdict = 'slower'
+            elif ratio < 1 / (1 + threshold):
+                verdict = 'faster'
+            else:
+                continue
+            print(
+                f"{size['rows']:>10} rows  {name:<32} {base['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms "
+                f"({ratio:.2f}x {verdict}, queries {base['queries']} -> {stats['queries']})"
+            )
+    print(f'{regressions} regressions above {threshold:.0%}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='comma-separated total rows, e.g. 10000,1000000,10000000')
+    parser.add_argument('--runs', type=int, default=20, help='most runs per operation')
+    parser.add_argument('--budget', type=float, default=5.0, help='seconds per operation before it stops early')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--output', type=Path, help='write the JSON here instead of to stdout')
+    parser.add_argument('--compare', nargs=2, type=Path, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative p50 change --compare reports')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)  # one size, in a child process
+    args = parser.parse_args()
+    if args.runs < 3:
+        parser.error('--runs must be at least 3')
+
+    if args.compare:
+        before, after = (json.loads(path.read_text()) for path in args.compare)
+        sys.exit(1 if compare(before, after, args.threshold) else 0)
+
+    if args.size is not None:
+        json.dump(run_size(args), sys.stdout)
+        return
+
+    backend = 'postgresql' if os.getenv('USE_POSTGRESQL', 'false').lower() == 'true' else 'sqlite'
+    results = {
+        'suite': 'db_interface',
+        'backend': backend,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'runs': args.runs,
+        'budget_seconds': args.budget,
+        'sizes': [],
+    }
+    for size in (int(size) for size in args.sizes.split(',')):
+        log(f'{backend}, {size} rows')
+        child = subprocess.run(
+            [
+                sys.executable, __file__, '--size', str(size), '--runs', str(args.runs), '--budget', str(args.budget),
+                '--seed', str(args.seed), '--chunk-size', str(args.chunk_size),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        results['sizes'].append(json.loads(child.stdout))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
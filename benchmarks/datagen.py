@@ -0,0 +1,167 @@
+"""
+Deterministic synthetic forum data for the benchmarks.
+
+A Dataset of a given size splits its rows between users (5%), posts (30%) and comments
+(65%). Every row is derived from the seed and its index alone, so the same size and
+seed always give the same data, rows can be generated lazily and a benchmark can name
+any row (e.g. dataset.post_uuid(123)) without keeping them in memory.
+
+- Users have distinct usernames and emails, all with the same password (PASSWORD), and
+  one in five has a profile picture from a small pool of images.
+- Posts are written by a few prolific users and many occasional ones, have zero to
+  three of the nine block tags, a location for half of them, an image for one in ten,
+  and are spread evenly over two years, oldest first.
+- Comments go mostly to recent posts and are made after the post they answer.
+- Text uses words whose frequencies follow Zipf's law, as in real text.
+
+Usage:
+    python benchmarks/datagen.py [--rows 10000] [--seed 0]   # prints the first rows
+"""
+
+import argparse
+import hashlib
+import itertools
+import random
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+PASSWORD = 'benchmark-password'
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=730)
+
+TAGS = tuple(f'block{i}' for i in range(1, 10))
+LOCATIONS = (
+    'Atlanta', 'Boston', 'Chicago', 'Denver', 'El Paso', 'Fresno', 'Houston', 'Kansas City',
+    'Las Vegas', 'Miami', 'Nashville', 'Omaha', 'Portland', 'Raleigh', 'Seattle', 'Tucson',
+)
+
+
+class Dataset:
+    """Synthetic users, posts and comments, about `rows` rows in total.
+
+    Args:
+        rows: Total rows across users, posts and comments.
+        seed: Seed every row is derived from. Defaults to 0.
+        vocabulary: Distinct words in the text. Defaults to 5000.
+        images: Distinct images shared by profile pictures and post images. Defaults to 32.
+    """
+
+    def __init__(self, rows: int, seed: int = 0, vocabulary: int = 5000, images: int = 32):
+        self.rows = rows
+        self.seed = seed
+        self.users = max(rows * 5 // 100, 1)
+        self.posts = max(rows * 30 // 100, 1)
+        self.comments = max(rows - self.users - self.posts, 0)
+
+        rng = random.Random(f'{seed}:setup')
+        self.words = self._make_vocabulary(rng, vocabulary)
+        self._word_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.words) + 1)))
+        # A few users write most of the posts
+        self._author_weights = list(itertools.accumulate(1 / rank ** 0.8 for rank in range(1, self.users + 1)))
+        self.images = [
+            b'\x89PNG\r\n\x1a\n' + hashlib.sha256(f'{seed}:image:{i}'.encode()).digest() * 64
+            for i in range(images)
+        ]
+
+    @staticmethod
+    def _make_vocabulary(rng: random.Random, size: int) -> list[str]:
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rng.choices('bcdfghjklmnprstvwz', k=3)) + rng.choice(('ava', 'elo', 'iru', 'ono', 'uxi')))
+        return sorted(words)
+
+    def _rng(self, kind: str, index: int) -> random.Random:
+        return random.Random(f'{self.seed}:{kind}:{index}')
+
+    def _uuid(self, kind: str, index: int) -> str:
+        digest = hashlib.blake2b(f'{self.seed}:{kind}:{index}'.encode(), digest_size=16).digest()
+        return str(uuid.UUID(bytes=digest, version=4))
+
+    def _text(self, rng: random.Random, low: int, high: int) -> str:
+        words = rng.choices(self.words, cum_weights=self._word_weights, k=rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    # Naming rows
+
+    def user_uuid(self, index: int) -> str:
+        return self._uuid('user', index)
+
+    def username(self, index: int) -> str:
+        return f'user{index}'
+
+    def email(self, index: int) -> str:
+        return f'user{index}@example.com'
+
+    def post_uuid(self, index: int) -> str:
+        return self._uuid('post', index)
+
+    def post_datetime(self, index: int) -> datetime:
+        return START + SPAN * index / self.posts
+
+    def comment_uuid(self, index: int) -> str:
+        return self._uuid('comment', index)
+
+    # Generating rows
+
+    def generate_users(self, password_hash: str) -> Iterator[dict]:
+        """Users for create_users(hash_passwords=False), all with password_hash."""
+        for i in range(self.users):
+            rng = self._rng('user', i)
+            yield {
+                'user_uuid': self.user_uuid(i),
+                'username': self.username(i),
+                'email': self.email(i),
+                'password': password_hash,
+                'profile_pic': rng.choice(self.images) if rng.random() < 0.2 else None,
+                'about_me': self._text(rng, 0, 20),
+            }
+
+    def generate_posts(self) -> Iterator[dict]:
+        """Posts for create_posts(), oldest first."""
+        for i in range(self.posts):
+            rng = self._rng('post', i)
+            tags = rng.sample(TAGS, rng.choice((0, 1, 1, 2, 3)))
+            yield {
+                'post_uuid': self.post_uuid(i),
+                'author_uuid': self.user_uuid(rng.choices(range(self.users), cum_weights=self._author_weights)[0]),
+                'text_content': self._text(rng, 8, 80),
+                **{f'tag{n}': tag for n, tag in enumerate(tags, start=1)},
+                'location': rng.choice(LOCATIONS) if rng.random() < 0.5 else 'None',
+                'image': rng.choice(self.images) if rng.random() < 0.1 else None,
+                'datetime': self.post_datetime(i),
+            }
+
+    def generate_comments(self) -> Iterator[dict]:
+        """Comments for create_comments(), each made after the post it answers."""
+        for i in range(self.comments):
+            rng = self._rng('comment', i)
+            # Skewed towards the newest posts
+            post = int(self.posts * (1 - rng.random() ** 2))
+            post = min(post, self.posts - 1)
+            yield {
+                'comment_uuid': self.comment_uuid(i),
+                'parent_post_uuid': self.post_uuid(post),
+                'author_uuid': self.user_uuid(rng.randrange(self.users)),
+                'text_content': self._text(rng, 3, 40),
+                'datetime': self.post_datetime(post) + timedelta(minutes=rng.randint(1, 60 * 24 * 14)),
+            }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--show', type=int, default=3, help='rows of each kind to print')
+    args = parser.parse_args()
+
+    dataset = Dataset(args.rows, args.seed)
+    print(f'{dataset.users} users, {dataset.posts} posts, {dataset.comments} comments')
+    for rows in (dataset.generate_users('<hash>'), dataset.generate_posts(), dataset.generate_comments()):
+        for row in itertools.islice(rows, args.show):
+            print({key: f'<{len(value)} bytes>' if isinstance(value, bytes) else value for key, value in row.items()})
+
+
+if __name__ == '__main__':
+    main()
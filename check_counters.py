@@ -0,0 +1,53 @@
+"""
+Check the activity counters kept on posts and users, and optionally rebuild them.
+
+posts.comment_count, posts.last_activity_at and users.post_count are updated along with
+every post and comment written through db_interface. Rows changed by other means, e.g.
+by hand or by an older version of the site, can leave them stale. This counts the stale
+rows, and with --rebuild recomputes them in one transaction.
+
+Works on whichever database the app is configured for (SQLite, or PostgreSQL with
+USE_POSTGRESQL=true and DATABASE_URL). Exits with status 1 if stale counters were found
+and not rebuilt.
+
+Usage:
+    python check_counters.py [--rebuild]
+"""
+
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from oce import create_app  # noqa: E402
+from oce.utils.db_interface import (  # noqa: E402
+    USE_POSTGRESQL, check_activity_counters, close_db, rebuild_activity_counters,
+)
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--rebuild', action='store_true', help='recompute the stale counters')
+args = parser.parse_args()
+
+app = create_app()
+stale = False
+
+with app.app_context():
+    try:
+        print(f"Database: {'PostgreSQL' if USE_POSTGRESQL else app.config['DB_NAME']}")
+        for table, count in check_activity_counters().items():
+            print(f"{'✅' if count == 0 else '⚠️ '} {count} {table} with stale counters")
+            stale = stale or count > 0
+
+        if stale and args.rebuild:
+            for table, count in rebuild_activity_counters().items():
+                print(f"✅ Rebuilt the counters of {count} {table}")
+            stale = False
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        stale = True
+    finally:
+        close_db()
+
+sys.exit(1 if stale else 0)
@@ -0,0 +1,63 @@
+"""
+Create or upgrade the database schema, then report which queries use an index.
+
+Applies the schema migrations in oce/utils/migrations.py that the database has not had
+yet and records them in the schema_migrations table. A new database gets all of them.
+Databases set up before versions were recorded (with init_db.py or the old migrate_*
+scripts) are brought up to date as well.
+
+Works on whichever database the app is configured for (SQLite, or PostgreSQL with
+USE_POSTGRESQL=true and DATABASE_URL). Restart running workers afterwards on
+PostgreSQL, since their prepared statements are planned against the old schema.
+
+Usage:
+    python migrate.py [--to VERSION] [--no-report]
+"""
+
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from oce import create_app  # noqa: E402
+from oce.utils.db_interface import USE_POSTGRESQL, close_db  # noqa: E402
+from oce.utils.migrations import MIGRATIONS, get_schema_version, index_report, migrate  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--to', type=int, metavar='VERSION', help='stop after this version')
+parser.add_argument('--no-report', action='store_true', help='skip the index usage report')
+args = parser.parse_args()
+
+app = create_app()
+
+failed = False
+with app.app_context():
+    try:
+        print(f"Database: {'PostgreSQL' if USE_POSTGRESQL else app.config['DB_NAME']}")
+        print(f"Schema version {get_schema_version()} of {MIGRATIONS[-1].version}")
+
+        for migration in migrate(args.to):
+            print(f"✅ {migration.version}: {migration.description}")
+        print(f"Schema is at version {get_schema_version()}")
+
+        if not args.no_report:
+            plans = index_report()
+            print("\nIndex usage of db_interface statements:")
+            for plan in plans:
+                if plan.error:
+                    print(f"  ❌ {plan.statement:<36} {plan.error.splitlines()[0]}")
+                elif plan.index_backed:
+                    print(f"  ✅ {plan.statement:<36} {', '.join(plan.indexes)}")
+                else:
+                    print(f"  ⚠️  {plan.statement:<36} scans {', '.join(plan.scanned_tables)}")
+            backed = sum(plan.index_backed for plan in plans)
+            print(f"\n{backed} of {len(plans)} statements are index-backed")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        failed = True
+    finally:
+        close_db()
+
+sys.exit(1 if failed else 0)
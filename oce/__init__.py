@@ -1,55 +1,64 @@
-from secrets import token_urlsafe
-
-from argon2 import PasswordHasher
 from flask import Flask
 from flask_dance.contrib.github import make_github_blueprint, github
 from flask_login import LoginManager
-from flask_session import Session
 from flask_mail import Mail
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
+from oce.config import load_config, redis_client
+
 mail = Mail()
 login_manager = LoginManager()
-password_hasher = PasswordHasher()
 
-import tempfile
-def create_app():
-    app = Flask(__name__)
-    app.config['DB_NAME'] = 'oce.db'  # TODO: extract into config file
-    app.secret_key = token_urlsafe(32)  # TODO: extract into config file
+def create_app(profile=None):
+    """Create the app with the given configuration profile, see oce/config.py."""
+    # Workers on one host share the instance folder, see load_config
+    app = Flask(__name__, instance_path=os.getenv('OCE_INSTANCE_PATH'))
+    load_config(app, profile)
     login_manager.init_app(app)
-    app.config['SESSION_TYPE'] = 'filesystem'
-    #app.config['SESSION_FILE_DIR'] = tempfile.mkdtemp()  # Store session data in files
-    app.config['SESSION_PERMANENT'] = False  # Ensure session resets properly
-    # Flask-Mail config goes here
-    app.config.update(
-        MAIL_SERVER='smtp.gmail.com',
-        MAIL_PORT=587,
-        MAIL_USE_TLS=True,
-        MAIL_USE_SSL=False,
-        MAIL_USERNAME='noreply.catronrobotics@gmail.com',
-        MAIL_PASSWORD='',
-        MAIL_DEFAULT_SENDER='noreply.catronrobotics@gmail.com'
-    )
-
-    Session(app)
+
+    if app.config['SESSION_TYPE']:
+        # A Flask-Session backend shared by several hosts, e.g. Redis
+        from flask_session import Session
+
+        if app.config['SESSION_TYPE'] == 'redis':
+            app.config['SESSION_REDIS'] = redis_client(app.config['SESSION_REDIS'])
+        Session(app)
+    else:
+        from oce.utils.sessions import SQLiteSessionInterface
+
+        app.session_interface = SQLiteSessionInterface(
+            app,
+            refresh_after=app.config['SESSION_REFRESH_AFTER'],
+            sweep_interval=app.config['SESSION_SWEEP_INTERVAL'],
+            sweep_batch=app.config['SESSION_SWEEP_BATCH'],
+            permanent=app.config['SESSION_PERMANENT'],
+        )
+
+    if app.config['PROXY_FIX_X_FOR']:
+        hops = app.config['PROXY_FIX_X_FOR']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
     
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
     #Github OAuth config
     github_blueprint = make_github_blueprint()
     app.register_blueprint(github_blueprint, url_prefix="/github_login")
-    app.config['MAIL_DEBUG'] = True
     mail.init_app(app)  # Initialize mail with the app
 
     from oce.accounts.routes import accounts
     from oce.content.routes import content
     from oce.errors.handlers import errors
     from oce.forum.routes import forum
+    from oce.utils.db_interface import close_db, report_query_stats
+    from oce.utils.models import inject_logged_in_user
 
     
     app.register_blueprint(accounts)
     app.register_blueprint(content)
     app.register_blueprint(errors)
     app.register_blueprint(forum)
+    app.after_request(report_query_stats)
+    app.context_processor(inject_logged_in_user)
+    app.teardown_appcontext(close_db)
 
     return app
@@ -1,3 +1,52 @@
-from flask import Blueprint
+from pathlib import Path
 
-accounts = Blueprint('accounts', __name__)
\ No newline at end of file
+from flask import Blueprint, abort, current_app, redirect, request, send_file, url_for
+
+from oce.utils.db_interface import get_blob_store, get_user_avatar
+from oce.utils.images import DEFAULT_AVATAR, file_digest, sniff_mimetype, square_thumbnail
+
+accounts = Blueprint('accounts', __name__)
+
+# Thumbnail sizes the avatar route renders, in pixels. Requests for other sizes get
+# the next larger one, so at most this many variants exist per picture.
+AVATAR_SIZES = (40, 80, 160, 320)
+
+# Avatar URLs include the avatar version, so a response never goes stale.
+AVATAR_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@accounts.route('/avatar/<user_uuid>/<int:version>')
+def avatar(user_uuid, version):
+    """Serve a user's profile picture, optionally as a square thumbnail.
+
+    The ?size= query parameter asks for a thumbnail of about that many pixels across.
+    Responses carry a strong ETag derived from the picture's hash and may be cached
+    for a year, since uploading a new picture bumps the version in the URL. A stale
+    version redirects to the current one.
+    """
+    user = get_user_avatar(user_uuid)
+    if user is None:
+        abort(404)
+    if version != user['avatar_version']:
+        return redirect(url_for('.avatar', user_uuid=user_uuid, version=user['avatar_version'], size=request.args.get('size')))
+
+    store = get_blob_store()
+    if (digest := user['profile_pic_hash']) is not None:
+        path = store.path(digest)
+        if not path.exists():
+            abort(404)
+    else:
+        # Shared by every user without a picture, so its ETag is the same for all of them.
+        path = Path(current_app.static_folder) / DEFAULT_AVATAR
+        digest = file_digest(path)
+    etag = digest
+
+    if (size := request.args.get('size', type=int)) is not None:
+        size = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+        if (thumbnail := square_thumbnail(store, digest, size, source=path)) is not None:
+            path, etag = thumbnail, f'{digest}-{size}'
+
+    response = send_file(path, mimetype=sniff_mimetype(path), etag=etag, max_age=AVATAR_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,174 @@
+"""
+Configuration profiles and how create_app() loads them.
+
+Settings are applied in this order, each overriding the one before:
+
+1. The profile named by OCE_PROFILE: `development` (the default) or `production`.
+2. The Python file named by OCE_SETTINGS, if set, e.g. /etc/oce/settings.py.
+3. Environment variables starting with OCE_, e.g. OCE_DB_NAME=/srv/oce/oce.db. Values
+   are parsed as JSON when they can be, so OCE_RATE_LIMIT_LOGIN_PER_IP='[20, 60]' is a
+   list and OCE_PASSWORD_HASH_WORKERS=2 a number.
+
+Every worker process and every node must sign with the same SECRET_KEY. When none is
+configured, the development profile generates one into the instance folder, which the
+workers on one host share and which survives restarts. The production profile refuses
+to start without one, since nodes do not share an instance folder. The instance folder
+is instance/ next to the oce package unless OCE_INSTANCE_PATH names another.
+
+The database backend is still chosen by the USE_POSTGRESQL and DATABASE_URL environment
+variables, which db_interface reads when it is imported.
+"""
+
+import os
+import secrets
+import time
+from pathlib import Path
+
+from flask import Flask
+
+
+class Config:
+    """Defaults shared by every profile."""
+
+    DB_NAME = 'oce.db'  # relative to the static folder, or an absolute path
+    BLOB_STORE_DIR = 'blobs'  # images, relative to the static folder like DB_NAME
+    SQLITE_BUSY_TIMEOUT = 5000  # milliseconds to wait on a locked database
+    SQLITE_CACHE_SIZE_KIB = 16384  # page cache per connection
+    SQLITE_MMAP_SIZE = 128 * 1024 * 1024  # bytes of the database memory-mapped
+
+    QUERY_CACHE_ENABLED = False  # cache query results across requests
+    QUERY_CACHE_TTL = 60  # seconds a cached result stays valid
+    QUERY_CACHE_MAX_ENTRIES = 1024  # results kept in process
+    QUERY_CACHE_BACKEND = None  # cachelib cache or redis:// URL shared by all workers
+    QUERY_SLOW_MS = 100  # log statements slower than this, None to disable
+    QUERY_REPEAT_WARNING = 10  # warn when a request runs one statement more often, likely N+1
+    QUERY_SERVER_TIMING = True  # report each request's query count and time in a Server-Timing header
+
+    PASSWORD_HASH_WORKERS = None  # processes hashing passwords, None for one per core, 0 for inline
+    PASSWORD_HASH_QUEUE = None  # hashes queued or running at once, None for four per worker
+    PASSWORD_HASH_TIMEOUT = 5  # seconds to wait for a hashing slot before answering 503
+    ARGON2_TIME_COST = None  # Argon2 iterations, None for argon2-cffi's default
+    ARGON2_MEMORY_COST = None  # Argon2 memory in KiB, None for argon2-cffi's default
+    ARGON2_PARALLELISM = None  # Argon2 lanes, None for argon2-cffi's default
+
+    RATE_LIMIT_LOGIN_PER_IP = (20, 60)  # login attempts per client per seconds, None for no limit
+    RATE_LIMIT_LOGIN_PER_EMAIL = (5, 60)  # login attempts per account per seconds
+    RATE_LIMIT_SIGNUP_PER_IP = (5, 300)  # signups per client per seconds
+    RATE_LIMIT_STORE = None  # SQLite file sharing the limits between workers, None for per process
+
+    SECRET_KEY = None  # None to generate one into the instance folder, see SECRET_KEY_REQUIRED
+    SECRET_KEY_REQUIRED = False  # refuse to start without a configured SECRET_KEY
+
+    SESSION_TYPE = None  # None for the SQLite session store, or a Flask-Session type such as 'redis'
+    SESSION_REDIS = None  # redis:// URL or client, for SESSION_TYPE 'redis'
+    SESSION_PERMANENT = False  # Ensure session resets properly
+    SESSION_SQLITE_PATH = None  # sessions file, None for sessions.db in the instance folder
+    SESSION_REFRESH_AFTER = 3600  # seconds before an unchanged session's expiry is written back
+    SESSION_SWEEP_INTERVAL = 300  # seconds between deletions of expired sessions, None to disable
+    SESSION_SWEEP_BATCH = 1000  # expired sessions deleted per transaction
+    PUBLIC_PAGE_MAX_AGE = 300  # seconds shared caches may keep public pages served without a session
+
+    PROXY_FIX_X_FOR = 0  # reverse proxies in front of the app whose X-Forwarded-* headers to trust
+
+    MAIL_SERVER = 'smtp.gmail.com'
+    MAIL_PORT = 587
+    MAIL_USE_TLS = True
+    MAIL_USE_SSL = False
+    MAIL_USERNAME = 'noreply.catronrobotics@gmail.com'
+    MAIL_PASSWORD = ''
+    MAIL_DEFAULT_SENDER = 'noreply.catronrobotics@gmail.com'
+    MAIL_DEBUG = True
+
+
+class DevelopmentConfig(Config):
+    """A single `flask run` or a few workers on one machine."""
+
+
+class ProductionConfig(Config):
+    """Several gunicorn workers, possibly on several nodes behind a load balancer.
+
+    Needs SECRET_KEY set. Sessions and rate limits are shared by the workers of a host
+    through SQLite files in the instance folder; with several nodes, set SESSION_TYPE to
+    'redis' with SESSION_REDIS, and QUERY_CACHE_BACKEND to the same Redis, so that all
+    of them share one store.
+    """
+
+    SECRET_KEY_REQUIRED = True
+    SESSION_COOKIE_SECURE = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    RATE_LIMIT_STORE = 'rate_limits.db'  # relative to the instance folder
+    PROXY_FIX_X_FOR = 1
+    QUERY_SLOW_MS = 250
+    MAIL_DEBUG = False
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def load_config(app: Flask, profile: str | None = None) -> None:
+    """Load a profile, then the OCE_SETTINGS file and OCE_* environment variables, into an app.
+
+    Args:
+        app: The app to configure.
+        profile: Profile name. Defaults to OCE_PROFILE, or 'development' if unset.
+
+    Raises:
+        ValueError: The profile does not exist.
+        RuntimeError: The profile requires a SECRET_KEY and none was configured.
+    """
+    profile = profile or os.getenv('OCE_PROFILE', 'development')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown configuration profile '{profile}', expected one of {', '.join(PROFILES)}.")
+
+    app.config.from_object(PROFILES[profile])
+    if settings := os.getenv('OCE_SETTINGS'):
+        app.config.from_pyfile(settings)
+    app.config.from_prefixed_env('OCE')
+    app.config['PROFILE'] = profile
+
+    instance = Path(app.instance_path)
+    instance.mkdir(parents=True, exist_ok=True)
+    if app.config['RATE_LIMIT_STORE']:
+        app.config['RATE_LIMIT_STORE'] = str(instance / app.config['RATE_LIMIT_STORE'])
+
+    if not app.config['SECRET_KEY']:
+        if app.config['SECRET_KEY_REQUIRED']:
+            raise RuntimeError(
+                f"The {profile} profile needs a SECRET_KEY shared by every worker, e.g. in OCE_SECRET_KEY."
+            )
+        app.config['SECRET_KEY'] = _instance_secret_key(instance / 'secret_key')
+
+
+def _instance_secret_key(path: Path) -> str:
+    """Read the generated secret key at path, creating it if this is the first worker to start."""
+    try:
+        # O_EXCL so that workers starting together agree on the first key written
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_urlsafe(32))
+
+    # A worker that lost the race may get here before the key is written
+    for _ in range(100):
+        if key := path.read_text().strip():
+            return key
+        time.sleep(0.01)
+    raise RuntimeError(f'The secret key file {path} is empty.')
+
+
+def redis_client(url_or_client):
+    """A Redis client for a redis:// URL, or the client itself if one was given.
+
+    Raises:
+        ImportError: The redis package is not installed.
+    """
+    if not isinstance(url_or_client, str):
+        return url_or_client
+    import redis
+
+    return redis.Redis.from_url(url_or_client)
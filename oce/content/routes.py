@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, send_file, request, jsonify, redirect, url_for, flash, session
-from oce.utils.db_interface import create_post, get_post_by_uuid, create_user, get_user_by_email
+from oce.utils.db_interface import create_post, get_post_by_uuid, create_user, get_user_credentials_by_email, check_user_password
 from oce.utils.models import User
 from flask_dance.contrib.github import github, make_github_blueprint
 from flask_dance.consumer.storage.session import BaseStorage
@@ -9,7 +9,9 @@ import os
 import stripe
 import json
 import re
-from .. import password_hasher
+from oce.utils.passwords import HashingBusyError
+from oce.utils.rate_limit import throttle
+from oce.utils.sessions import cacheable_when_anonymous
 from flask_mail import Message
 from .. import mail #mail from _init_.py
 
@@ -153,38 +155,47 @@ def success():
   return render_template('success.html')
 
 @content.route('/content/block1')
+@cacheable_when_anonymous
 def block1():
   return render_template('block1.html')
 
 @content.route('/content/block2')
+@cacheable_when_anonymous
 def block2():
   return render_template('block2.html')
 
 @content.route('/content/block3')
+@cacheable_when_anonymous
 def block3():
   return render_template('block3.html')
 
 @content.route('/content/block4')
+@cacheable_when_anonymous
 def block4():
   return render_template('block4.html')
 
 @content.route('/content/block5')
+@cacheable_when_anonymous
 def block5():
   return render_template('block5.html')
 
 @content.route('/content/block6')
+@cacheable_when_anonymous
 def block6():
   return render_template('block6.html')
 
 @content.route('/content/block7')
+@cacheable_when_anonymous
 def block7():
   return render_template('block7.html')
 
 @content.route('/content/block8')
+@cacheable_when_anonymous
 def block8():
   return render_template('block8.html')
 
 @content.route('/content/block9')
+@cacheable_when_anonymous
 def block9():
   return render_template('block9.html')
 
@@ -192,19 +203,52 @@ def block9():
 def tiles():
     return send_file('static/docs/Human-Domino-Effect-Footprint-Tiles.pdf', download_name='Human-Domino-Effect-Footprint-Tiles.pdf')
 
+FORUM_PAGE_SIZE = 20
+FORUM_MAX_PAGE_SIZE = 100
+
 @content.route('/content/ConceptExchange/')
 def concept_exchange():
-    from oce.utils.db_interface import get_all_posts
-    
+    from oce.utils.db_interface import get_posts_page, search_posts
+
+    limit = min(max(request.args.get('limit', FORUM_PAGE_SIZE, type=int), 1), FORUM_MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    query = request.args.get('q', '').strip()
+    sort = 'activity' if request.args.get('sort') == 'activity' else 'newest'
+
     try:
-        # Fetch all posts from the database
-        posts = get_all_posts()
-        return render_template('mainForum.html', posts=posts)
+        if query:
+            # Search results are ranked rather than chronological, so they are paged by number
+            page = max(request.args.get('page', 1, type=int), 1)
+            posts, has_more = search_posts(query, limit, page)
+            return render_template(
+                'mainForum.html',
+                posts=posts,
+                limit=limit,
+                query=query,
+                page=page,
+                has_more=has_more,
+            )
+
+        # Fetch one page of posts, newest or most recently active first
+        try:
+            posts, older_cursor, newer_cursor = get_posts_page(limit, cursor, sort)
+        except ValueError:
+            # Unknown or tampered cursor, start over from the first page
+            posts, older_cursor, newer_cursor = get_posts_page(limit, sort=sort)
+        return render_template(
+            'mainForum.html',
+            posts=posts,
+            limit=limit,
+            sort=sort,
+            older_cursor=older_cursor,
+            newer_cursor=newer_cursor,
+        )
     except Exception as e:
         print(f"Error fetching posts: {e}")
-        return render_template('mainForum.html', posts=[])
+        return render_template('mainForum.html', posts=[], query=query)
 
 @content.route('/content/resources/<selected_age>')
+@cacheable_when_anonymous
 def resources(selected_age):
     return render_template('resources.html', selected_age=selected_age)
 
@@ -214,19 +258,19 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '').strip()
+        # Answer floods with a 429 before looking anything up or hashing
+        throttle(login_ip=request.remote_addr, login_email=email.lower())
 
         if not email or not password:
             flash("Please enter both email and password.", "danger")
             return redirect(url_for('content.login'))
 
-        user = get_user_by_email(email)
+        user = get_user_credentials_by_email(email)
         if not user:
             flash("No account found with that email.", "danger")
             return redirect(url_for('content.login'))
 
-        try:
-            password_hasher.verify(user['password'], password)
-        except Exception:
+        if not check_user_password(user, password):
             flash("Incorrect password.", "danger")
             return redirect(url_for('content.login'))
 
@@ -238,6 +282,7 @@ def login():
     return render_template('LoginPage.html')
 
 @content.route('/content/calendar/')
+@cacheable_when_anonymous
 def calendar():
   return render_template('calendar.html')
 
@@ -260,14 +305,14 @@ def cart():
 def create_post_route():
     data = request.get_json()  # Get JSON data from the request
     text_content = data.get('text_content')  # Extract the post content
-    username = data.get('username')
 
+    if 'user_uuid' not in session:
+        return jsonify({'success': False, 'error': 'Please log in to post.'}), 401
     if not text_content:
         return jsonify({'success': False, 'error': 'Text content is required.'}), 400
 
     try:
-        # create_post(author=User(user_uuid="example", username="name", email="example@email.com", password="password", profile_pic=b"", about_me=''), text_content=text_content, tag1='', tag2='', tag3='', tag4='', tag5='', datetime='', location='', image=None)
-        create_post(author=username, text_content=text_content)  # this should be updated when the user login feature is added to look more like the one above this line
+        create_post(author_uuid=session['user_uuid'], text_content=text_content)
         return jsonify({'success': True})
     except Exception as e:
         print(f"Error: {e}")
@@ -547,6 +592,7 @@ def logout():
     return redirect(url_for('content.index'))
 
 @content.route('/')
+@cacheable_when_anonymous
 def index():
     return render_template('index.html')
 
@@ -559,6 +605,7 @@ def signup():
         email = request.form.get('email', '').strip().lower()  # Convert to lowercase for consistency
         password = request.form.get('password', '').strip()
         about_me = request.form.get('about_me', '').strip()
+        throttle(signup_ip=request.remote_addr)
 
         # Basic validation
         if not username or not email or not password:
@@ -576,25 +623,24 @@ def signup():
             return redirect(url_for('content.signup'))
 
         # Check if email already exists
-        if get_user_by_email(email):
+        if get_user_credentials_by_email(email):
             flash("Email already registered. Please login instead.", "warning")
             return redirect(url_for('content.login'))
 
         try:
-            # CRITICAL: Hash the password with Argon2 before storing
-            hashed_password = password_hasher.hash(password)
-            
-            # Create user with hashed password
+            # create_user hashes the password with Argon2, so pass it as typed
             create_user(
                 username=username, 
                 email=email, 
-                password=hashed_password,  # Pass the HASHED password, not plain text!
+                password=password,
                 about_me=about_me
             )
             
             flash("Account created successfully! You can now log in.", "success")
             return redirect(url_for('content.login'))
-            
+
+        except HashingBusyError:
+            raise  # answered with a 503 by the errors blueprint
         except Exception as e:
             print(f"Signup error: {e}")
             flash("An error occurred during signup. Please try again.", "danger")
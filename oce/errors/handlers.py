@@ -1,3 +1,11 @@
 from flask import Blueprint
 
-errors = Blueprint('errors', __name__)
\ No newline at end of file
+from oce.utils.passwords import HashingBusyError
+
+errors = Blueprint('errors', __name__)
+
+
+@errors.app_errorhandler(HashingBusyError)
+def hashing_busy(error):
+    # Every password hashing slot stayed taken, so shed the login or signup for now
+    return 'Too many logins at once, please try again in a moment.', 503, {'Retry-After': '5'}
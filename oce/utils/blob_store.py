@@ -0,0 +1,153 @@
+"""
+Content-addressed on-disk store for images.
+
+Each blob is saved once under the SHA-256 of its bytes, so the database only keeps the
+hex digest and identical uploads share one file. Files are sharded into two levels of
+directories named after the first four hex digits, e.g. `ab/cd/abcd...`, to keep
+directories small.
+
+Variants derived from a blob, such as thumbnails, are kept under `variants/<name>/`
+and addressed by the digest of the blob they were made from.
+
+Blobs are never modified in place. A blob no longer referenced by any row stays on disk
+until it is garbage collected.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+# Bytes read at a time when storing a stream.
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """Content-addressed files under a root directory, shared by all workers.
+
+    Args:
+        root: Directory holding the blobs. Created if missing.
+    """
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        """Path of the file holding a blob, whether or not it exists.
+
+        Raises:
+            ValueError: The digest is not a lowercase hex SHA-256.
+        """
+        if not _DIGEST.fullmatch(digest):
+            raise ValueError(f'Not a blob digest: {digest!r}')
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def variant_path(self, digest: str, variant: str) -> Path:
+        """Path of the file holding a variant of a blob, whether or not it exists.
+
+        Raises:
+            ValueError: The digest is not a lowercase hex SHA-256, or the variant name
+                is not a plain identifier.
+        """
+        if not variant.isidentifier():
+            raise ValueError(f'Not a variant name: {variant!r}')
+        return self.root / 'variants' / variant / digest[:2] / self.path(digest).name
+
+    def put_variant(self, digest: str, variant: str, data: bytes) -> Path:
+        """Store a variant of a blob, replacing any previous one.
+
+        Returns:
+            Path of the stored variant.
+        """
+        path = self.variant_path(digest, variant)
+        self._write(path, data)
+        return path
+
+    def put(self, data: bytes) -> str:
+        """Store bytes, unless a blob with the same content is already stored.
+
+        Returns:
+            Hex SHA-256 of the data, which identifies the blob.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if not (path := self.path(digest)).exists():
+            self._write(path, data)
+        return digest
+
+    def put_stream(self, stream: BinaryIO) -> str:
+        """Store the contents of a file object without reading it into memory at once.
+
+        Returns:
+            Hex SHA-256 of the contents, which identifies the blob.
+        """
+        sha256 = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while chunk := stream.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    tmp.write(chunk)
+            digest = sha256.hexdigest()
+            if (path := self.path(digest)).exists():
+                os.unlink(tmp_name)
+            else:
+                self._install(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        return digest
+
+    def _write(self, path: Path, data: bytes) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            self._install(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    def _install(self, tmp_name: str, path: Path) -> None:
+        """Move a fully written temporary file into place.
+
+        The rename is atomic, so readers never see a partial file, and a concurrent
+        upload of the same content just replaces the file with identical bytes.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+
+    def get(self, digest: str) -> bytes:
+        """Read a whole blob.
+
+        Raises:
+            FileNotFoundError: No blob with this digest is stored.
+        """
+        return self.path(digest).read_bytes()
+
+    def open(self, digest: str) -> BinaryIO:
+        """Open a blob for streaming.
+
+        Raises:
+            FileNotFoundError: No blob with this digest is stored.
+        """
+        return open(self.path(digest), 'rb')
+
+    def __contains__(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def delete(self, digest: str) -> None:
+        """Remove a blob if it is stored."""
+        self.path(digest).unlink(missing_ok=True)
+
+    def __iter__(self) -> Iterator[str]:
+        """Digests of every stored blob."""
+        for path in self.root.glob('??/??/*'):
+            if _DIGEST.fullmatch(path.name):
+                yield path.name
@@ -3,14 +3,29 @@ Functions to interface to the database.
 Supports both SQLite and PostgreSQL based on USE_POSTGRESQL environment variable.
 """
 
+import base64
+import hashlib
+import json
 import os
-from collections.abc import Sequence
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from itertools import islice
 from pathlib import Path
 from typing import Any, TypeAlias
 from uuid import uuid4 as create_uuid
-from flask import current_app, g
-from .. import password_hasher
+from flask import Response, current_app, g, request
+from markupsafe import Markup, escape
+from ..config import redis_client
+from .blob_store import BlobStore
 from .models import Comment, Post, User
+from .passwords import PasswordHashingPool
+from .query_cache import MISSING, QueryCache
+from .query_stats import QueryStats
+from .statements import Statement, StatementRegistry
 from datetime import datetime
 import pytz
 
@@ -21,10 +36,32 @@ USE_POSTGRESQL = os.getenv('USE_POSTGRESQL', 'false').lower() == 'true'
 
 if USE_POSTGRESQL:
     import psycopg2
+    import psycopg2.extensions
     import psycopg2.extras
+    from .db_pool import ConnectionPool
 else:
     import sqlite3 as sql
 
+# Process-wide PostgreSQL connection pool, created on first use.
+_pool = None
+_pool_lock = threading.Lock()
+
+# Process-wide Argon2 hashing pool, created on first use, and the settings it was made with.
+_password_pool = None
+_password_pool_settings = None
+_password_pool_lock = threading.Lock()
+
+# Long-lived SQLite connections, one per worker thread and database file.
+_sqlite_connections = threading.local()
+
+# Every statement this module runs, compiled once for the active dialect.
+_statements = StatementRegistry('postgresql' if USE_POSTGRESQL else 'sqlite')
+
+# Names of the statements already prepared server-side on each PostgreSQL connection.
+# Prepared plans live as long as the pooled connection, so restart workers after a
+# schema migration.
+_prepared_statements: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
 
 def _dict_factory(cursor, row: Sequence) -> DatabaseRow:
     """Factory for SQLite to return dict rows."""
@@ -46,24 +83,15 @@ def get_db():
     
     if db is None:
         if USE_POSTGRESQL:
-            # PostgreSQL connection
-            database_url = os.getenv('DATABASE_URL')
-            if not database_url:
-                raise ValueError('DATABASE_URL environment variable not set')
-            
-            db = psycopg2.connect(
-                database_url,
-                cursor_factory=psycopg2.extras.RealDictCursor
-            )
+            # PostgreSQL connection, borrowed from the pool until teardown
+            db = _get_pool().getconn()
         else:
             # SQLite connection
             if not isinstance(current_app.static_folder, str):
                 raise FileNotFoundError(
                     'App static folder not registered properly. Unable to locate database.'
                 )
-            con = sql.connect(Path(current_app.static_folder) / current_app.config['DB_NAME'])
-            con.row_factory = _dict_factory
-            db = con
+            db = _get_sqlite_connection(Path(current_app.static_folder) / current_app.config['DB_NAME'])
         
         g._database = db
     
@@ -71,30 +99,579 @@ def get_db():
 
 
 def close_db(e=None):
-    """Close the database connection."""
+    """Release the database connection.
+
+    In PostgreSQL mode the connection is rolled back and returned to the pool.
+    In SQLite mode it stays open for the next request on this thread, and only
+    a transaction left open by the request is rolled back.
+    """
+    if (saved := g.pop('_queries_saved', 0)) and current_app.debug:
+        current_app.logger.debug('Identity map saved %d queries in this request.', saved)
+    g.pop('_identity_maps', None)
+    # Anything written but not committed is rolled back below, so nothing to invalidate.
+    g.pop('_written_tables', None)
+
     db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        if USE_POSTGRESQL:
+            _get_pool().putconn(db)
+        elif db.in_transaction:
+            db.rollback()
+
+
+def _open_sqlite_connection(db_path: Path) -> 'sql.Connection':
+    """Open a SQLite connection tuned for concurrent readers and writers.
+
+    The database is switched to WAL journaling so readers do not block the writer,
+    and waits on locks for up to SQLITE_BUSY_TIMEOUT milliseconds instead of failing
+    with "database is locked".
+
+    Args:
+        db_path: Path to the database file.
+
+    Returns:
+        The new connection.
+    """
+    config = current_app.config
+    busy_timeout = int(config.get('SQLITE_BUSY_TIMEOUT', 5000))
+
+    con = sql.connect(db_path, timeout=busy_timeout / 1000)
+    con.row_factory = _dict_factory
+    con.execute('PRAGMA journal_mode = WAL;')
+    con.execute(f'PRAGMA busy_timeout = {busy_timeout};')
+    con.execute('PRAGMA synchronous = NORMAL;')
+    con.execute(f"PRAGMA cache_size = {-int(config.get('SQLITE_CACHE_SIZE_KIB', 16384))};")
+    con.execute(f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))};")
+    return con
+
+
+def _get_sqlite_connection(db_path: Path) -> 'sql.Connection':
+    """Retrieve this thread's connection to a SQLite database, opening it if needed.
+
+    Args:
+        db_path: Path to the database file.
+
+    Returns:
+        A connection reused across requests served by the current thread.
+    """
+    if getattr(_sqlite_connections, 'pid', None) != os.getpid():
+        # Never reuse connections inherited from a parent process.
+        _sqlite_connections.pid = os.getpid()
+        _sqlite_connections.by_path = {}
+
+    con = _sqlite_connections.by_path.get(db_path)
+    if con is None:
+        con = _sqlite_connections.by_path[db_path] = _open_sqlite_connection(db_path)
+    return con
+
+
+def close_thread_connections() -> None:
+    """Close the SQLite connections held open by the current thread."""
+    if getattr(_sqlite_connections, 'pid', None) == os.getpid():
+        for con in _sqlite_connections.by_path.values():
+            con.close()
+    _sqlite_connections.by_path = {}
+
+
+def _check_pg_connection(con, idle_for: float) -> bool:
+    """Health check run on a pooled PostgreSQL connection when it is checked out.
+
+    The connection state is inspected locally. A round trip is only made when the
+    connection sat idle longer than DB_POOL_PING_AFTER seconds.
+    """
+    if con.closed or con.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_for < float(os.getenv('DB_POOL_PING_AFTER', '30')):
+        return True
+    try:
+        with con.cursor() as cur:
+            cur.execute('SELECT 1;')
+        con.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _get_pool() -> 'ConnectionPool':
+    """Retrieve the process-wide PostgreSQL connection pool, creating it if needed.
+
+    The pool is sized with the DB_POOL_MIN_SIZE and DB_POOL_MAX_SIZE environment
+    variables, and DB_POOL_TIMEOUT bounds how long a checkout may wait. A pool
+    inherited across a fork is replaced rather than shared with the parent.
+
+    Returns:
+        The connection pool.
+    """
+    global _pool
+
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            database_url = os.getenv('DATABASE_URL')
+            if not database_url:
+                raise ValueError('DATABASE_URL environment variable not set')
+
+            _pool = ConnectionPool(
+                lambda: psycopg2.connect(
+                    database_url,
+                    cursor_factory=psycopg2.extras.RealDictCursor
+                ),
+                min_size=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+                max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                check=_check_pg_connection,
+                reset=lambda con: con.rollback(),
+            )
+    return _pool
+
+
+def get_pool_stats() -> dict[str, int] | None:
+    """Retrieve statistics of the PostgreSQL connection pool.
+
+    Returns:
+        Pool statistics, or None when running on SQLite or before the pool was created.
+    """
+    if _pool is None or _pool.pid != os.getpid():
+        return None
+    return _pool.stats()
+
+
+# Post and comment timestamps are stored as fixed-width ISO-8601 UTC strings, so
+# comparing them as text compares them chronologically and range queries can use the
+# datetime indexes.
+_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f+00:00'
+
+
+def _now_timestamp() -> str:
+    """Current time as a fixed-width ISO-8601 UTC string, which sorts chronologically."""
+    return datetime.now(pytz.utc).strftime(_TIMESTAMP_FORMAT)
+
+
+def _normalize_timestamp(timestamp: str | datetime) -> str:
+    """Convert a timestamp to the fixed-width ISO-8601 UTC string stored in the database.
+
+    Args:
+        timestamp: A datetime, or an ISO-8601 string such as '2025-10-04T12:50:32-04:00',
+            '2025-10-04T16:50:32Z' or '2025-10-04'. Timestamps without a time zone are
+            taken to be UTC.
+
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
+    """
+    if isinstance(timestamp, str):
+        # fromisoformat() only accepts a 'Z' suffix from Python 3.11
+        if timestamp.endswith(('Z', 'z')):
+            timestamp = timestamp[:-1] + '+00:00'
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=pytz.utc)
+    return timestamp.astimezone(pytz.utc).strftime(_TIMESTAMP_FORMAT)
+
+
+def _get_query_cache() -> QueryCache | None:
+    """Retrieve the app's query cache, creating it on first use.
+
+    Returns:
+        The cache, or None if QUERY_CACHE_ENABLED is not set.
+    """
+    if not current_app.config.get('QUERY_CACHE_ENABLED'):
+        return None
+
+    cache = current_app.extensions.get('oce_query_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'oce_query_cache',
+            QueryCache(
+                max_entries=current_app.config.get('QUERY_CACHE_MAX_ENTRIES', 1024),
+                ttl=current_app.config.get('QUERY_CACHE_TTL', 60),
+                shared=_shared_cache(current_app.config.get('QUERY_CACHE_BACKEND')),
+            ),
+        )
+    return cache
+
+
+def _shared_cache(backend):
+    """The cachelib cache for QUERY_CACHE_BACKEND, which may also be a redis:// URL."""
+    if not isinstance(backend, str):
+        return backend
+    from cachelib import RedisCache
+
+    return RedisCache(host=redis_client(backend), key_prefix='oce:query:')
+
+
+def get_blob_store() -> BlobStore:
+    """Retrieve the app's image store, creating it on first use.
+
+    BLOB_STORE_DIR is resolved against the static folder, like DB_NAME, so an absolute
+    path overrides it.
+    """
+    store = current_app.extensions.get('oce_blob_store')
+    if store is None:
+        root = Path(current_app.static_folder) / current_app.config['BLOB_STORE_DIR']
+        store = current_app.extensions.setdefault('oce_blob_store', BlobStore(root))
+    return store
+
+
+def get_password_hasher() -> PasswordHashingPool:
+    """Retrieve the process-wide password hashing pool, creating it if needed.
+
+    The pool is sized and tuned with the app's PASSWORD_HASH_* and ARGON2_* settings.
+    A pool inherited across a fork, or made for other settings, is replaced.
+
+    Returns:
+        The hashing pool.
+    """
+    global _password_pool, _password_pool_settings
+
+    config = current_app.config
+    settings = (
+        config.get('PASSWORD_HASH_WORKERS'),
+        config.get('PASSWORD_HASH_QUEUE'),
+        config.get('PASSWORD_HASH_TIMEOUT', 5),
+        config.get('ARGON2_TIME_COST'),
+        config.get('ARGON2_MEMORY_COST'),
+        config.get('ARGON2_PARALLELISM'),
+    )
+    pool = _password_pool
+    if pool is not None and pool.pid == os.getpid() and _password_pool_settings == settings:
+        return pool
+
+    with _password_pool_lock:
+        if _password_pool is None or _password_pool.pid != os.getpid() or _password_pool_settings != settings:
+            if _password_pool is not None and _password_pool.pid == os.getpid():
+                _password_pool.close()
+            _password_pool = PasswordHashingPool(*settings)
+            _password_pool_settings = settings
+    return _password_pool
+
+
+def get_query_cache_stats() -> dict[str, int] | None:
+    """Retrieve the query cache counters.
+
+    Returns:
+        Hit, miss and eviction counts of this process, or None if the cache is disabled.
+    """
+    cache = _get_query_cache()
+    return cache.stats() if cache is not None else None
+
+
+def _commit() -> None:
+    """Commit the current transaction and invalidate cached results of the tables it wrote.
+
+    Versions are bumped only once the data is committed, so no other connection can
+    cache the old rows under the new versions.
+    """
+    get_db().commit()
+    written = g.pop('_written_tables', None)
+    if written and (cache := _get_query_cache()) is not None:
+        cache.bump(sorted(written))
+
+
+def _execute_query(statement_name: str, params: Sequence = ()) -> Any:
+    """Run a registered statement. Every query in this module goes through here.
+
+    Reads are answered from the query cache when it is enabled, unless this request
+    has uncommitted writes to a table they read. Writes mark their tables for
+    invalidation on the next _commit().
+
+    Args:
+        statement_name: Name the statement was registered under.
+        params: Parameters for the statement's placeholders. Defaults to ().
+
+    Returns:
+        A row or None for statements fetching one row, a list of rows for statements
+        fetching all rows, and the number of affected rows otherwise. Cached rows are
+        shared between requests and must not be modified.
+    """
+    statement = _statements[statement_name]
+    written = g.setdefault('_written_tables', set())
+
+    if statement.fetch is None:
+        written.update(statement.tables)
+    elif (
+        statement.cacheable
+        and written.isdisjoint(statement.tables)
+        and (cache := _get_query_cache()) is not None
+    ):
+        # The key is taken before running the query, so a write committed meanwhile
+        # leaves the result under an outdated key.
+        key, result = cache.get(statement.name, params, statement.tables)
+        if result is MISSING:
+            result = _run_statement(statement, params)
+            cache.set(key, result)
+        return result
+
+    return _run_statement(statement, params)
+
+
+def _run_statement(statement: Statement, params: Sequence) -> Any:
+    """Run a compiled statement on the current connection and record it. See _execute_query()."""
+    started = time.perf_counter()
+    result = _send_statement(statement, params)
+    if statement.fetch == 'all':
+        rows = len(result)
+    elif statement.fetch == 'one':
+        rows = int(result is not None)
+    else:
+        rows = max(result, 0)
+    _record_query(statement.name, time.perf_counter() - started, rows)
+    return result
+
+
+def _send_statement(statement: Statement, params: Sequence) -> Any:
+    """Send a compiled statement to the database and fetch its result."""
+    con = get_db()
+    cur = con.cursor()
+
+    if USE_POSTGRESQL:
+        prepared = _prepared_statements.setdefault(con, set())
+        if statement.name not in prepared:
+            cur.execute(statement.prepare_sql)
+            prepared.add(statement.name)
+        cur.execute(statement.execute_sql, params)
+
+        if statement.fetch == 'one':
+            datum = cur.fetchone()
+            return dict(datum) if datum else None
+        if statement.fetch == 'all':
+            return [dict(row) for row in cur.fetchall()]
+    else:
+        cur.execute(statement.sql, params)
+
+        if statement.fetch == 'one':
+            return cur.fetchone()
+        if statement.fetch == 'all':
+            return cur.fetchall()
+    return cur.rowcount
 
 
-def _get_placeholder():
-    """Get the correct SQL placeholder for the current database."""
-    return '%s' if USE_POSTGRESQL else '?'
+def _execute_many(statement_name: str, rows: Sequence[Sequence]) -> None:
+    """Run a registered INSERT statement once for each of many rows in a single call.
 
+    Uses executemany on SQLite and execute_values on PostgreSQL, which sends all rows
+    as one multi-row INSERT.
+
+    Args:
+        statement_name: Name the statement was registered under.
+        rows: Parameters for each row.
+    """
+    statement = _statements[statement_name]
+    g.setdefault('_written_tables', set()).update(statement.tables)
+    cur = get_db().cursor()
+    started = time.perf_counter()
 
-def _execute_query(cursor, query, params=None):
-    """Execute a query with the correct placeholder syntax."""
     if USE_POSTGRESQL:
-        # PostgreSQL uses %s
-        pg_query = query.replace('?', '%s')
-        cursor.execute(pg_query, params or ())
+        psycopg2.extras.execute_values(cur, statement.many_sql, rows, page_size=len(rows))
     else:
-        # SQLite uses ?
-        cursor.execute(query, params or ())
+        cur.executemany(statement.sql, rows)
+    _record_query(statement.name, time.perf_counter() - started, len(rows))
+
+
+def _record_query(name: str, seconds: float, rows: int) -> None:
+    """Add a statement to the current request's query stats, logging it if slow.
+
+    Statements slower than QUERY_SLOW_MS milliseconds are logged as warnings.
+    """
+    get_query_stats().record(name, seconds, rows)
+
+    slow_ms = current_app.config.get('QUERY_SLOW_MS')
+    if slow_ms is not None and seconds * 1000 >= slow_ms:
+        current_app.logger.warning('Slow query %s took %.1f ms for %d rows.', name, seconds * 1000, rows)
+
+
+def get_query_stats() -> QueryStats:
+    """Retrieve the statements run so far in the current request, with their timings.
+
+    Returns:
+        Count, time and rows per statement. Results served by the query cache or the
+        identity map did not run and are not included.
+    """
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = QueryStats()
+    return stats
+
+
+def report_query_stats(response: Response) -> Response:
+    """Report the statements a request ran, as an after_request handler.
+
+    Adds a Server-Timing header with their count and total time unless
+    QUERY_SERVER_TIMING is off, and warns about any statement run more than
+    QUERY_REPEAT_WARNING times, which usually means a query inside a loop.
+    """
+    stats = g.get('_query_stats')
+    if stats is None:
+        return response
+
+    threshold = current_app.config.get('QUERY_REPEAT_WARNING')
+    if threshold is not None:
+        for name, count in stats.repeated(threshold):
+            current_app.logger.warning(
+                'Statement %s ran %d times in %s %s, likely an N+1 query.',
+                name,
+                count,
+                request.method,
+                request.path,
+            )
+    if current_app.config.get('QUERY_SERVER_TIMING', True):
+        response.headers.add('Server-Timing', stats.server_timing())
+    return response
+
+
+def _chunked(rows: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most size items without materializing it."""
+    if size < 1:
+        raise ValueError(f'Chunk size must be positive, got {size}.')
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _check_update_fields(fields: Mapping[str, Any], allowed: frozenset[str]) -> None:
+    """Validate the field names of an update, before anything is written.
+
+    Raises:
+        ValueError: A field is not an updatable field.
+    """
+    unknown = fields.keys() - allowed
+    if unknown:
+        raise ValueError(f'Cannot update unknown field(s): {", ".join(sorted(unknown))}')
+
+
+def _changed_fields(record: Any, fields: Mapping[str, Any]) -> dict[str, Any]:
+    """Drop the fields of an update whose value is unchanged.
+
+    Args:
+        record: User or Post being updated, holding the current values.
+        fields: Requested new values by column name.
+
+    Returns:
+        The fields whose value differs from the record, in column name order.
+        A password is always considered changed since only its hash is known.
+    """
+    return {
+        name: fields[name]
+        for name in sorted(fields)
+        if name == 'password' or getattr(record, name) != fields[name]
+    }
+
+
+def _update_statement_name(table: str, key: str, columns: Iterable[str], extra: str = '') -> str:
+    """Register, once per set of columns, an UPDATE of those columns by primary key.
+
+    Args:
+        table: Table name placeholder, e.g. 'users'.
+        key: Primary key column.
+        columns: Columns set from parameters.
+        extra: Additional parameterless assignments. Defaults to ''.
+
+    Returns:
+        Name of the statement.
+    """
+    columns = list(columns)
+    statement_name = f'update_{table}({",".join(columns)}{";" + extra if extra else ""})'
+    if statement_name not in _statements:
+        assignments = ', '.join([f'{column} = ?' for column in columns] + ([extra] if extra else []))
+        _statements.get_or_add(statement_name, f'UPDATE {{{table}}} SET {assignments} WHERE {key} = ?;')
+    return statement_name
+
+
+def _identity_map(table: str) -> dict[str, dict[str, Any]]:
+    """Retrieve the current request's identity map for a table.
+
+    The map holds, per UUID, the result of each by-UUID lookup already made during
+    this request, keyed by statement name.
+    """
+    identity_maps = g.setdefault('_identity_maps', {})
+    return identity_maps.setdefault(table, {})
+
+
+def _lookup_by_uuid(table: str, statement_name: str, uuid: str) -> DatabaseRow | None:
+    """Run a by-UUID lookup at most once per request.
+
+    Repeated lookups of the same row with the same statement return the object
+    fetched the first time, including a None for a missing row.
+
+    Args:
+        table: Table the statement reads, e.g. 'users'.
+        statement_name: Name of a statement taking the UUID as its only parameter.
+        uuid: UUID to look up.
+
+    Returns:
+        The row if it exists, None otherwise.
+    """
+    results = _identity_map(table).setdefault(uuid, {})
+    if statement_name in results:
+        g._queries_saved = g.get('_queries_saved', 0) + 1
+        return results[statement_name]
+
+    datum = results[statement_name] = _execute_query(statement_name, (uuid,))
+    return datum
+
+
+def _forget(table: str, uuid: str) -> None:
+    """Drop a row from the current request's identity map after it changed."""
+    _identity_map(table).pop(uuid, None)
+
+
+def _forget_created(table: str, rows: Iterable[Sequence]) -> None:
+    """Drop newly inserted rows, given with their UUID first, from the identity map.
+
+    A bulk insert may be given explicit UUIDs, whose earlier lookups in this request
+    cached a miss. The single-row create functions use fresh UUIDs and need not do this.
+    """
+    for row in rows:
+        _forget(table, row[0])
+
+
+def get_queries_saved() -> int:
+    """Retrieve how many queries the identity map avoided during the current request.
+
+    Returns:
+        Number of lookups answered from the identity map.
+    """
+    return g.get('_queries_saved', 0)
 
 
 # Methods for Users
 
+_statements.add(
+    'create_user',
+    'INSERT INTO {users} (user_uuid, username, email, password, profile_pic_hash, about_me, datetime_created) VALUES (?, ?, ?, ?, ?, ?, ?);',
+)
+# Password hashes are kept out of the query cache, so neither these full rows nor the
+# credentials are cached.
+_statements.add('get_user_by_uuid', 'SELECT * FROM {users} WHERE user_uuid = ?;', 'one', cache=False)
+_statements.add('get_user_by_email', 'SELECT * FROM {users} WHERE email = ?;', 'one', cache=False)
+_statements.add('get_user_by_username', 'SELECT * FROM {users} WHERE username = ?;', 'one', cache=False)
+_statements.add(
+    'get_session_user_by_uuid',
+    'SELECT user_uuid, username, avatar_version FROM {users} WHERE user_uuid = ?;',
+    'one',
+)
+_statements.add(
+    'get_user_credentials_by_email',
+    'SELECT user_uuid, username, email, password FROM {users} WHERE email = ?;',
+    'one',
+    cache=False,
+)
+_statements.add('get_user_avatar', 'SELECT profile_pic_hash, avatar_version FROM {users} WHERE user_uuid = ?;', 'one')
+_statements.add('update_user_username', 'UPDATE {users} SET username = ? WHERE user_uuid = ?;')
+_statements.add('update_user_email', 'UPDATE {users} SET email = ? WHERE user_uuid = ?;')
+_statements.add('update_user_password', 'UPDATE {users} SET password = ? WHERE user_uuid = ?;')
+_statements.add(
+    'update_user_profile_pic',
+    'UPDATE {users} SET profile_pic_hash = ?, avatar_version = avatar_version + 1 WHERE user_uuid = ?;',
+)
+_statements.add('update_user_about_me', 'UPDATE {users} SET about_me = ? WHERE user_uuid = ?;')
+_statements.add('delete_user', 'DELETE FROM {users} WHERE user_uuid = ?;')
+
+# Fields update_user() accepts. A new picture is given as profile_pic bytes, so that the
+# stored hash always names a file in the blob store.
+USER_UPDATE_FIELDS = frozenset({'username', 'email', 'password', 'profile_pic', 'about_me'})
+
 
 def create_user(
     username: str,
@@ -109,47 +686,78 @@ def create_user(
         username: User's user/display name.
         email: User's email.
         password: User's password. Will be hashed.
-        profile_pic: User's profile picture as raw bytes. Defaults to None.
+        profile_pic: User's profile picture as raw bytes, saved to the blob store.
+            Defaults to None, for the shared default picture.
         about_me: User's about me description. Defaults to ''.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    if profile_pic is None:
-        default_pic_path = Path(current_app.static_folder) / 'images' / '__DEFAULT.jpg'
-        if default_pic_path.exists():
-            with open(default_pic_path, 'rb') as fp:
-                profile_pic = fp.read()
-        else:
-            profile_pic = b''
+    profile_pic_hash = get_blob_store().put(profile_pic) if profile_pic is not None else None
 
     eastern = pytz.timezone('US/Eastern')
     now_est = datetime.now(eastern)
     
     user_uuid = str(create_uuid())
-    hashed_password = password_hasher.hash(password)
+    hashed_password = get_password_hasher().hash(password)
     
     new_user_data = (
         user_uuid,
         username,
         email,
         hashed_password,
-        profile_pic,
+        profile_pic_hash,
         about_me,
         now_est if USE_POSTGRESQL else now_est.isoformat()
     )
 
-    if USE_POSTGRESQL:
-        cur.execute(
-            'INSERT INTO users (user_uuid, username, email, password, profile_pic, about_me, datetime_created) VALUES (%s, %s, %s, %s, %s, %s, %s);',
-            new_user_data
-        )
-    else:
-        cur.execute(
-            'INSERT INTO USERS VALUES(?, ?, ?, ?, ?, ?, ?);',
-            new_user_data
-        )
-    con.commit()
+    _execute_query('create_user', new_user_data)
+    _commit()
+
+
+def create_users(
+    users: Iterable[Mapping[str, Any]],
+    chunk_size: int = 1000,
+    hash_passwords: bool = True,
+) -> int:
+    """Create many users, inserting and committing them one chunk at a time.
+
+    Args:
+        users: Users as mappings of column name to value. username, email and password
+            are required; user_uuid, profile_pic (raw bytes) and about_me are optional.
+            May be a generator, it is consumed one chunk at a time.
+        chunk_size: Users inserted per round trip and transaction. Defaults to 1000.
+        hash_passwords: Hash each password. Pass False when importing users whose
+            passwords are already hashed. Defaults to True.
+
+    Returns:
+        Number of users created.
+    """
+    store = get_blob_store()
+    created = 0
+
+    for chunk in _chunked(users, chunk_size):
+        now_est = datetime.now(pytz.timezone('US/Eastern'))
+        passwords = [user['password'] for user in chunk]
+        if hash_passwords:
+            # Hashed side by side in the hashing pool's workers
+            passwords = get_password_hasher().hash_many(passwords)
+        rows = []
+        for user, password in zip(chunk, passwords):
+            profile_pic = user.get('profile_pic')
+
+            rows.append((
+                user.get('user_uuid') or str(create_uuid()),
+                user['username'],
+                user['email'],
+                password,
+                store.put(profile_pic) if profile_pic is not None else None,
+                user.get('about_me', ''),
+                now_est if USE_POSTGRESQL else now_est.isoformat(),
+            ))
+
+        _execute_many('create_user', rows)
+        _commit()
+        _forget_created('users', rows)
+        created += len(rows)
+    return created
 
 
 def get_user_by_uuid(user_uuid: str) -> DatabaseRow | None:
@@ -161,18 +769,7 @@ def get_user_by_uuid(user_uuid: str) -> DatabaseRow | None:
     Returns:
         Database query if the UUID exists, None otherwise.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE user_uuid = %s;', (user_uuid,))
-        datum = cur.fetchone()
-        return dict(datum) if datum else None
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE user_uuid = ?;', (user_uuid,)).fetchone()
-        return datum
+    return _lookup_by_uuid('users', 'get_user_by_uuid', user_uuid)
 
 
 def get_user_by_email(email: str) -> DatabaseRow | None:
@@ -184,18 +781,7 @@ def get_user_by_email(email: str) -> DatabaseRow | None:
     Returns:
         Database query if the email exists, None otherwise.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE email = %s;', (email,))
-        datum = cur.fetchone()
-        return dict(datum) if datum else None
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE email = ?;', (email,)).fetchone()
-        return datum
+    return _execute_query('get_user_by_email', (email,))
 
 
 def get_user_by_username(username: str) -> DatabaseRow | None:
@@ -207,18 +793,104 @@ def get_user_by_username(username: str) -> DatabaseRow | None:
     Returns:
         Database query if the username exists, None otherwise.
     """
-    con = get_db()
-    cur = con.cursor()
+    return _execute_query('get_user_by_username', (username,))
 
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE username = %s;', (username,))
-        datum = cur.fetchone()
-        return dict(datum) if datum else None
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE username = ?;', (username,)).fetchone()
-        return datum
+
+def get_session_user_by_uuid(user_uuid: str) -> DatabaseRow | None:
+    """Retrieve the fields needed to render pages for a logged in user.
+
+    Unlike get_user_by_uuid(), the profile picture hash and password hash are not read.
+
+    Args:
+        user_uuid: UUID of user.
+
+    Returns:
+        The user's UUID, username and avatar version if the UUID exists, None otherwise.
+    """
+    return _lookup_by_uuid('users', 'get_session_user_by_uuid', user_uuid)
+
+
+def get_user_credentials_by_email(email: str) -> DatabaseRow | None:
+    """Retrieve the fields needed to check a login attempt.
+
+    Unlike get_user_by_email(), the profile picture hash is not read.
+
+    Args:
+        email: Email of user.
+
+    Returns:
+        The user's UUID, username, email and password hash if the email exists, None otherwise.
+    """
+    return _execute_query('get_user_credentials_by_email', (email,))
+
+
+def check_user_password(credentials: Mapping[str, Any], password: str) -> bool:
+    """Check a login attempt's password against the user's stored hash.
+
+    If the password matches but was hashed with other Argon2 parameters than the app's
+    current ones, it is hashed again with them and saved.
+
+    Args:
+        credentials: The user's row from get_user_credentials_by_email().
+        password: Password given to log in with.
+
+    Raises:
+        HashingBusyError: The hashing pool stayed full for its whole timeout.
+
+    Returns:
+        True if the password matches, False otherwise.
+    """
+    hasher = get_password_hasher()
+    if not hasher.verify(credentials['password'], password):
+        return False
+
+    if hasher.needs_rehash(credentials['password']):
+        _execute_query('update_user_password', (hasher.hash(password), credentials['user_uuid']))
+        _forget('users', credentials['user_uuid'])
+        _commit()
+    return True
+
+
+def get_user_avatar(user_uuid: str) -> DatabaseRow | None:
+    """Retrieve what is needed to serve a user's profile picture.
+
+    Args:
+        user_uuid: UUID of user.
+
+    Returns:
+        The picture's hash in the blob store, None for the default picture, and the
+        avatar version if the UUID exists, None otherwise.
+    """
+    return _lookup_by_uuid('users', 'get_user_avatar', user_uuid)
+
+
+def get_user_profile_pic_path(user_uuid: str) -> Path | None:
+    """Retrieve the file holding a user's profile picture, for streaming it from disk.
+
+    Args:
+        user_uuid: UUID of user.
+
+    Returns:
+        Path of the picture if the user exists and has uploaded one, None otherwise.
+    """
+    datum = get_user_avatar(user_uuid)
+    if datum is None or datum['profile_pic_hash'] is None:
+        return None
+    return get_blob_store().path(datum['profile_pic_hash'])
+
+
+def get_user_profile_pic(user_uuid: str) -> bytes | None:
+    """Retrieve only a user's profile picture.
+
+    Args:
+        user_uuid: UUID of user.
+
+    Returns:
+        The picture's bytes if the user exists and has uploaded one, None otherwise.
+    """
+    if (path := get_user_profile_pic_path(user_uuid)) is None:
+        return None
+    return path.read_bytes()
 
 
 def update_user_username(user: User, username: str) -> None:
@@ -228,17 +900,9 @@ def update_user_username(user: User, username: str) -> None:
         user: User to be edited.
         username: New username.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET username = {placeholder} WHERE user_uuid = {placeholder};',
-        (username, user.user_uuid)
-    )
-    con.commit()
+    _execute_query('update_user_username', (username, user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
 
 
 def update_user_email(user: User, email: str) -> None:
@@ -248,17 +912,9 @@ def update_user_email(user: User, email: str) -> None:
         user: User to be edited.
         email: New email.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET email = {placeholder} WHERE user_uuid = {placeholder};',
-        (email, user.user_uuid)
-    )
-    con.commit()
+    _execute_query('update_user_email', (email, user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
 
 
 def update_user_password(user: User, password: str) -> None:
@@ -268,17 +924,9 @@ def update_user_password(user: User, password: str) -> None:
         user: User to be edited.
         password: New password. Will be hashed.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET password = {placeholder} WHERE user_uuid = {placeholder};',
-        (password_hasher.hash(password), user.user_uuid)
-    )
-    con.commit()
+    _execute_query('update_user_password', (get_password_hasher().hash(password), user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
 
 
 def update_user_profile_pic(user: User, profile_pic: bytes) -> None:
@@ -286,19 +934,12 @@ def update_user_profile_pic(user: User, profile_pic: bytes) -> None:
 
     Args:
         user: User to be edited.
-        profile_pic: New profile pic.
+        profile_pic: New profile pic as raw bytes, saved to the blob store.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET profile_pic = {placeholder} WHERE user_uuid = {placeholder};',
-        (profile_pic, user.user_uuid)
-    )
-    con.commit()
+    profile_pic_hash = get_blob_store().put(profile_pic)
+    _execute_query('update_user_profile_pic', (profile_pic_hash, user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
 
 
 def update_user_about_me(user: User, about_me: str) -> None:
@@ -308,17 +949,54 @@ def update_user_about_me(user: User, about_me: str) -> None:
         user: User to be edited.
         about_me: New about me.
     """
-    con = get_db()
-    cur = con.cursor()
+    _execute_query('update_user_about_me', (about_me, user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
 
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET about_me = {placeholder} WHERE user_uuid = {placeholder};',
-        (about_me, user.user_uuid)
+
+def update_user(user: User, **fields: Any) -> bool:
+    """Update several of a user's fields with a single UPDATE in one transaction.
+
+    Nothing is written if every value matches what the user object already holds.
+    The user object is updated to the new values.
+
+    Args:
+        user: User to be edited.
+        **fields: New values for any of username, email, password, profile_pic and
+            about_me. The password will be hashed, and a profile_pic is given as raw
+            bytes, saved to the blob store and bumps the avatar version if it differs.
+            A profile_pic of None restores the default picture.
+
+    Raises:
+        ValueError: A field is not an updatable user column.
+
+    Returns:
+        True if the database was written to, False if nothing changed.
+    """
+    _check_update_fields(fields, USER_UPDATE_FIELDS)
+    if 'profile_pic' in fields:
+        profile_pic = fields.pop('profile_pic')
+        fields['profile_pic_hash'] = get_blob_store().put(profile_pic) if profile_pic is not None else None
+    changed = _changed_fields(user, fields)
+    if not changed:
+        return False
+
+    if 'password' in changed:
+        changed['password'] = get_password_hasher().hash(changed['password'])
+
+    new_avatar = 'profile_pic_hash' in changed
+    statement_name = _update_statement_name(
+        'users', 'user_uuid', changed, 'avatar_version = avatar_version + 1' if new_avatar else ''
     )
-    con.commit()
+    _execute_query(statement_name, (*changed.values(), user.user_uuid))
+    _forget('users', user.user_uuid)
+    _commit()
+
+    for name, value in changed.items():
+        setattr(user, name, value)
+    if new_avatar:
+        user.avatar_version += 1
+    return True
 
 
 def delete_user(user: User) -> None:
@@ -327,38 +1005,113 @@ def delete_user(user: User) -> None:
     Arguments:
         user: User to delete.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'users' if USE_POSTGRESQL else 'USERS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'DELETE FROM {table_name} WHERE user_uuid = {placeholder};',
-        (user.user_uuid,)
-    )
-    con.commit()
+    _execute_query('delete_user', (user.user_uuid,))
+    _forget('users', user.user_uuid)
+    _commit()
 
 
 # Methods for Posts
 
+# Columns of a Post, listed rather than * so columns used only for searching stay out.
+_POST_COLUMNS = 'post_uuid, author_uuid, text_content, tag1, tag2, tag3, tag4, tag5, image_hash, datetime, location'
+
+_statements.add(
+    'create_post',
+    'INSERT INTO {posts} (post_uuid, author_uuid, text_content, tag1, tag2, tag3, tag4, tag5, location, datetime, image_hash, last_activity_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);',
+)
+_statements.add('get_all_posts', 'SELECT post_uuid, author_uuid, text_content FROM {posts};', 'all')
+
+# A feed page carries what the forum shows with each post: the author's username and
+# avatar version, and the post's comment count and latest activity, so a page is one
+# query rather than one per post. Authors without an account have no username.
+_FEED_COLUMNS = (
+    'p.post_uuid, p.author_uuid, p.text_content, p.datetime, p.comment_count, p.last_activity_at, '
+    'u.username AS author_username, u.avatar_version AS author_avatar_version'
+)
+_FEED_AUTHOR_JOIN = 'LEFT JOIN {users} u ON u.user_uuid = p.author_uuid'
+
+# Orders get_posts_page() can list posts in, by the column they sort on. Each has an
+# index on (column, post_uuid).
+FEED_SORTS = {'newest': 'datetime', 'activity': 'last_activity_at'}
+
+for _sort, _column in FEED_SORTS.items():
+    _statements.add(
+        f'get_posts_page_{_sort}_first',
+        f'SELECT {_FEED_COLUMNS} FROM {{posts}} p {_FEED_AUTHOR_JOIN} '
+        f'ORDER BY p.{_column} DESC, p.post_uuid DESC LIMIT ?;',
+        'all',
+    )
+    _statements.add(
+        f'get_posts_page_{_sort}_older',
+        f'SELECT {_FEED_COLUMNS} FROM {{posts}} p {_FEED_AUTHOR_JOIN} WHERE (p.{_column}, p.post_uuid) < (?, ?) '
+        f'ORDER BY p.{_column} DESC, p.post_uuid DESC LIMIT ?;',
+        'all',
+    )
+    _statements.add(
+        f'get_posts_page_{_sort}_newer',
+        f'SELECT {_FEED_COLUMNS} FROM {{posts}} p {_FEED_AUTHOR_JOIN} WHERE (p.{_column}, p.post_uuid) > (?, ?) '
+        f'ORDER BY p.{_column} ASC, p.post_uuid ASC LIMIT ?;',
+        'all',
+    )
+_statements.add('get_post_by_uuid', f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE post_uuid = ?;', 'one')
+_statements.add('get_posts_by_author', f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE author_uuid = ?;', 'all')
+_statements.add(
+    'get_posts_by_tag',
+    f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE post_uuid IN (SELECT post_uuid FROM {{post_tags}} WHERE tag = ?);',
+    'all',
+)
+_statements.add(
+    'get_tag_counts',
+    'SELECT tag, COUNT(*) AS post_count FROM {post_tags} GROUP BY tag ORDER BY post_count DESC, tag ASC;',
+    'all',
+)
+_statements.add('get_posts_by_datetime', f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE datetime = ?;', 'all')
+_statements.add(
+    'get_posts_between',
+    f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE datetime >= ? AND datetime < ? ORDER BY datetime, post_uuid;',
+    'all',
+)
+_statements.add('get_posts_by_location', f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE location = ?;', 'all')
+_statements.add('update_post_text_content', 'UPDATE {posts} SET text_content = ? WHERE post_uuid = ?;')
+_statements.add(
+    'update_post_tags',
+    'UPDATE {posts} SET tag1 = ?, tag2 = ?, tag3 = ?, tag4 = ?, tag5 = ? WHERE post_uuid = ?;',
+)
+_statements.add('update_post_image', 'UPDATE {posts} SET image_hash = ? WHERE post_uuid = ?;')
+_statements.add('update_post_datetime', 'UPDATE {posts} SET datetime = ? WHERE post_uuid = ?;')
+_statements.add('update_post_location', 'UPDATE {posts} SET location = ? WHERE post_uuid = ?;')
+_statements.add('delete_post', 'DELETE FROM {posts} WHERE post_uuid = ?;')
+_statements.add('insert_post_tag', 'INSERT INTO {post_tags} (post_uuid, tag) VALUES (?, ?);')
+_statements.add('delete_post_tags', 'DELETE FROM {post_tags} WHERE post_uuid = ?;')
+
+# Fields update_post() accepts. A new image is given as image bytes, like profile_pic.
+POST_UPDATE_FIELDS = frozenset({
+    'text_content', 'tag1', 'tag2', 'tag3', 'tag4', 'tag5', 'image', 'datetime', 'location',
+})
+
+# Placeholder values the tag1-tag5 columns hold when a post has fewer than five tags.
+_NO_TAG = (None, '', 'None')
+
+# Upper bound on tags in one multi-tag query, which also bounds the statement variants.
+MAX_QUERY_TAGS = 20
+
 
 def create_post(
-    author: str,
+    author_uuid: str,
     text_content: str,
 ) -> None:
     """Create a new post (temporary simplified version).
 
     Args:
-        author: Author username.
+        author_uuid: user_uuid of the author, which the feed joins on for their name
+            and avatar.
         text_content: Content of the post.
     """
-    con = get_db()
-    cur = con.cursor()
-
+    post_uuid = str(create_uuid())
+    timestamp = _now_timestamp()
     new_post_data = (
-        str(create_uuid()),
-        author,
+        post_uuid,
+        author_uuid,
         text_content,
         'None',
         'None',
@@ -366,46 +1119,151 @@ def create_post(
         'None',
         'None',
         'None',
-        'None',
-        None
+        timestamp,
+        None,
+        timestamp,
     )
 
-    if USE_POSTGRESQL:
-        cur.execute(
-            'INSERT INTO posts (post_uuid, author_uuid, text_content, tag1, tag2, tag3, tag4, tag5, location, datetime, image) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);',
-            new_post_data
-        )
-    else:
-        cur.execute(
-            'INSERT INTO POSTS VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);',
-            new_post_data
-        )
-    con.commit()
+    _execute_query('create_post', new_post_data)
+    _index_text('post', post_uuid, text_content)
+    _count_user_posts({author_uuid: 1})
+    _commit()
+
+
+def create_posts(posts: Iterable[Mapping[str, Any]], chunk_size: int = 1000) -> int:
+    """Create many posts, inserting and committing them one chunk at a time.
+
+    Args:
+        posts: Posts as mappings of column name to value. author_uuid and text_content
+            are required; post_uuid, tag1 to tag5, location, datetime (a datetime or
+            ISO-8601 string, defaults to now) and image (raw bytes) are optional. May be
+            a generator, it is consumed one chunk at a time.
+        chunk_size: Posts inserted per round trip and transaction. Defaults to 1000.
+
+    Returns:
+        Number of posts created.
+    """
+    store = get_blob_store()
+    created = 0
+
+    for chunk in _chunked(posts, chunk_size):
+        rows = []
+        tag_rows = []
+        search_rows = []
+        for post in chunk:
+            post_uuid = post.get('post_uuid') or str(create_uuid())
+            tags = tuple(post.get(f'tag{i}', 'None') for i in range(1, 6))
+            image = post.get('image')
+            timestamp = _normalize_timestamp(post['datetime']) if post.get('datetime') else _now_timestamp()
+            rows.append((
+                post_uuid,
+                post['author_uuid'],
+                post['text_content'],
+                *tags,
+                post.get('location', 'None'),
+                timestamp,
+                store.put(image) if image is not None else None,
+                timestamp,
+            ))
+            tag_rows.extend((post_uuid, tag) for tag in dict.fromkeys(tags) if tag not in _NO_TAG)
+            search_rows.append((post_uuid, post['text_content']))
+
+        _execute_many('create_post', rows)
+        if tag_rows:
+            _execute_many('insert_post_tag', tag_rows)
+        _index_texts('post', search_rows)
+        _count_user_posts(Counter(row[1] for row in rows))
+        _commit()
+        _forget_created('posts', rows)
+        created += len(rows)
+    return created
+
+
+def get_all_posts() -> list[DatabaseRow]:
+    """Retrieve all posts from the database."""
+    return _execute_query('get_all_posts')
+
+
+def _encode_cursor(direction: str, column: str, post: DatabaseRow) -> str:
+    """Encode a post's position in the feed, sorted on a column, as an opaque, URL-safe cursor."""
+    raw = json.dumps([direction, post[column], post['post_uuid']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
 
+def _decode_cursor(cursor: str) -> tuple[str, str, str]:
+    """Decode a cursor made by _encode_cursor.
 
-def get_all_posts():
-    """Retrieve all posts from the database."""
-    con = get_db()
-    cur = con.cursor()
-    
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT post_uuid, author_uuid, text_content FROM {table_name};')
-        rows = cur.fetchall()
-        posts = [dict(row) for row in rows]
+    Raises:
+        ValueError: The cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, datetime_str, post_uuid = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Malformed feed cursor: {cursor!r}') from e
+    if direction not in ('older', 'newer') or not isinstance(datetime_str, str) or not isinstance(post_uuid, str):
+        raise ValueError(f'Malformed feed cursor: {cursor!r}')
+    return direction, datetime_str, post_uuid
+
+
+def get_posts_page(
+    limit: int = 20,
+    cursor: str | None = None,
+    sort: str = 'newest',
+) -> tuple[list[DatabaseRow], str | None, str | None]:
+    """Retrieve one page of posts, newest first, using keyset pagination.
+
+    Posts are ordered by creation time, or by latest activity with sort='activity',
+    with the UUID breaking ties. Each page seeks straight to its position on the
+    (datetime, post_uuid) or (last_activity_at, post_uuid) index, so fetching a page
+    costs the same no matter how far back it is.
+
+    Each post comes with its author's 'author_username' and 'author_avatar_version'
+    (None if the author has no account), its 'comment_count' and 'last_activity_at',
+    the time of its latest comment or else its own, all from one query.
+
+    Args:
+        limit: Maximum number of posts on the page. Defaults to 20.
+        cursor: Cursor returned alongside a previous page of the same sort, or None for
+            the first page. Defaults to None.
+        sort: 'newest' or 'activity'. Defaults to 'newest'.
+
+    Raises:
+        ValueError: The limit is not positive, the sort is unknown or the cursor is
+            malformed.
+
+    Returns:
+        The posts on the page, a cursor to the next older page and a cursor to the
+        next newer page. Either cursor is None when there is no such page.
+    """
+    if limit < 1:
+        raise ValueError(f'Page size must be positive, got {limit}.')
+    if sort not in FEED_SORTS:
+        raise ValueError(f'Unknown feed sort: {sort!r}')
+    column = FEED_SORTS[sort]
+
+    if cursor is None:
+        direction = 'older'
+        posts = _execute_query(f'get_posts_page_{sort}_first', (limit + 1,))
     else:
-        cur.execute(f'SELECT post_uuid, author_uuid, text_content FROM {table_name};')
-        rows = cur.fetchall()
-        posts = [
-            {
-                'post_uuid': row['post_uuid'],
-                'author_uuid': row['author_uuid'],
-                'text_content': row['text_content']
-            }
-            for row in rows
-        ]
-    return posts
+        direction, position, post_uuid = _decode_cursor(cursor)
+        posts = _execute_query(f'get_posts_page_{sort}_{direction}', (position, post_uuid, limit + 1))
+
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    if direction == 'newer':
+        posts.reverse()
+
+    if not posts:
+        return posts, None, None
+
+    has_older = has_more if direction == 'older' else True
+    has_newer = has_more if direction == 'newer' else cursor is not None
+    return (
+        posts,
+        _encode_cursor('older', column, posts[-1]) if has_older else None,
+        _encode_cursor('newer', column, posts[0]) if has_newer else None,
+    )
 
 
 def get_post_by_uuid(post_uuid: str) -> DatabaseRow | None:
@@ -417,18 +1275,7 @@ def get_post_by_uuid(post_uuid: str) -> DatabaseRow | None:
     Returns:
         Database query if the post exists, None otherwise.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE post_uuid = %s;', (post_uuid,))
-        datum = cur.fetchone()
-        return dict(datum) if datum else None
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE post_uuid = ?;', (post_uuid,)).fetchone()
-        return datum
+    return _lookup_by_uuid('posts', 'get_post_by_uuid', post_uuid)
 
 
 def get_posts_by_author(author: User) -> list[DatabaseRow]:
@@ -440,18 +1287,7 @@ def get_posts_by_author(author: User) -> list[DatabaseRow]:
     Returns:
         All posts by specified author.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE author_uuid = %s;', (author.user_uuid,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE author_uuid = ?;', (author.user_uuid,)).fetchall()
-        return datum
+    return _execute_query('get_posts_by_author', (author.user_uuid,))
 
 
 def get_posts_by_tag(tag: str) -> list[DatabaseRow]:
@@ -469,47 +1305,84 @@ def get_posts_by_tag(tag: str) -> list[DatabaseRow]:
     if not tag:
         raise ValueError('Cannot query for posts based on empty tag.')
 
-    con = get_db()
-    cur = con.cursor()
+    return _execute_query('get_posts_by_tag', (tag,))
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(
-            f'SELECT * FROM {table_name} WHERE tag1 = %s OR tag2 = %s OR tag3 = %s OR tag4 = %s OR tag5 = %s;',
-            (tag, tag, tag, tag, tag)
+
+def get_posts_by_tags(tags: Sequence[str], match: str = 'any') -> list[DatabaseRow]:
+    """Retrieve posts carrying any or all of several tags.
+
+    Args:
+        tags: Tags to look for.
+        match: 'any' for posts with at least one of the tags, 'all' for posts with every
+            tag. Defaults to 'any'.
+
+    Raises:
+        ValueError: No tags, an empty tag, too many tags or an unknown match mode.
+
+    Returns:
+        All posts matching the tags.
+    """
+    tags = list(dict.fromkeys(tags))
+    if not tags or not all(tags):
+        raise ValueError('Cannot query for posts based on empty tag.')
+    if len(tags) > MAX_QUERY_TAGS:
+        raise ValueError(f'Cannot query for more than {MAX_QUERY_TAGS} tags at once.')
+    if match not in ('any', 'all'):
+        raise ValueError(f"Tag match must be 'any' or 'all', got {match!r}.")
+
+    statement_name = f'get_posts_by_tags_{match}_{len(tags)}'
+    if statement_name not in _statements:
+        in_list = ', '.join(['?'] * len(tags))
+        having = ' GROUP BY post_uuid HAVING COUNT(*) = ?' if match == 'all' else ''
+        _statements.get_or_add(
+            statement_name,
+            f'SELECT {_POST_COLUMNS} FROM {{posts}} WHERE post_uuid IN '
+            f'(SELECT post_uuid FROM {{post_tags}} WHERE tag IN ({in_list}){having});',
+            'all',
         )
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(
-            f'SELECT * FROM {table_name} WHERE tag1 = ? OR tag2 = ? OR tag3 = ? OR tag4 = ? OR tag5 = ?;',
-            (tag, tag, tag, tag, tag)
-        ).fetchall()
-        return datum
+
+    params = (*tags, len(tags)) if match == 'all' else tuple(tags)
+    return _execute_query(statement_name, params)
 
 
-def get_posts_by_datetime(datetime_str: str) -> list[DatabaseRow]:
+def get_tag_counts() -> list[DatabaseRow]:
+    """Retrieve every tag in use with the number of posts carrying it.
+
+    Returns:
+        Rows of tag and post_count, most used tags first.
+    """
+    return _execute_query('get_tag_counts')
+
+
+def get_posts_by_datetime(datetime_str: str | datetime) -> list[DatabaseRow]:
     """Retrieve posts by date- and timestamp.
 
     Args:
-        datetime_str: Date- and timestamp of the posts.
+        datetime_str: Date- and timestamp of the posts, as a datetime or ISO-8601 string.
+
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
 
     Returns:
         All posts with specified date- and timestamp.
     """
-    con = get_db()
-    cur = con.cursor()
+    return _execute_query('get_posts_by_datetime', (_normalize_timestamp(datetime_str),))
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE datetime = %s;', (datetime_str,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE datetime = ?;', (datetime_str,)).fetchall()
-        return datum
+
+def get_posts_between(start: str | datetime, end: str | datetime) -> list[DatabaseRow]:
+    """Retrieve the posts made in a time range, using the datetime index.
+
+    Args:
+        start: Start of the range, inclusive, as a datetime or ISO-8601 string.
+        end: End of the range, exclusive, as a datetime or ISO-8601 string.
+
+    Raises:
+        ValueError: A string is not an ISO-8601 timestamp.
+
+    Returns:
+        The posts in the range, oldest first.
+    """
+    return _execute_query('get_posts_between', (_normalize_timestamp(start), _normalize_timestamp(end)))
 
 
 def get_posts_by_location(location: str) -> list[DatabaseRow]:
@@ -521,18 +1394,35 @@ def get_posts_by_location(location: str) -> list[DatabaseRow]:
     Returns:
         All posts with specified location.
     """
-    con = get_db()
-    cur = con.cursor()
+    return _execute_query('get_posts_by_location', (location,))
+
+
+def get_post_image_path(post: Post) -> Path | None:
+    """Retrieve the file holding a post's image, for streaming it from disk.
+
+    Args:
+        post: Post whose image to locate.
+
+    Returns:
+        Path of the image if the post has one, None otherwise.
+    """
+    if post.image_hash is None:
+        return None
+    return get_blob_store().path(post.image_hash)
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE location = %s;', (location,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE location = ?;', (location,)).fetchall()
-        return datum
+
+def get_post_image(post: Post) -> bytes | None:
+    """Retrieve a post's image.
+
+    Args:
+        post: Post whose image to read.
+
+    Returns:
+        The image's bytes if the post has one, None otherwise.
+    """
+    if (path := get_post_image_path(post)) is None:
+        return None
+    return path.read_bytes()
 
 
 def update_post_text_content(post: Post, text_content: str) -> None:
@@ -542,17 +1432,10 @@ def update_post_text_content(post: Post, text_content: str) -> None:
         post: Post to be edited.
         text_content: New content for the post.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET text_content = {placeholder} WHERE post_uuid = {placeholder};',
-        (text_content, post.post_uuid)
-    )
-    con.commit()
+    _execute_query('update_post_text_content', (text_content, post.post_uuid))
+    _reindex_text('post', post.post_uuid, text_content)
+    _forget('posts', post.post_uuid)
+    _commit()
 
 
 def update_post_tags(post: Post, tags: tuple[str, str, str, str, str]) -> None:
@@ -562,25 +1445,19 @@ def update_post_tags(post: Post, tags: tuple[str, str, str, str, str]) -> None:
         post: Post to be edited.
         tags: New tags for the post.
     """
-    con = get_db()
-    cur = con.cursor()
-
     tag1, tag2, tag3, tag4, tag5 = tags
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
+    _execute_query('update_post_tags', (tag1, tag2, tag3, tag4, tag5, post.post_uuid))
+    _replace_post_tags(post.post_uuid, tags)
+    _forget('posts', post.post_uuid)
+    _commit()
 
-    if USE_POSTGRESQL:
-        cur.execute(
-            f'UPDATE {table_name} SET tag1 = {placeholder}, tag2 = {placeholder}, tag3 = {placeholder}, tag4 = {placeholder}, tag5 = {placeholder} WHERE post_uuid = {placeholder};',
-            (tag1, tag2, tag3, tag4, tag5, post.post_uuid)
-        )
-    else:
-        cur.execute(f'UPDATE {table_name} SET tag1 = ? WHERE post_uuid = ?;', (tag1, post.post_uuid))
-        cur.execute(f'UPDATE {table_name} SET tag2 = ? WHERE post_uuid = ?;', (tag2, post.post_uuid))
-        cur.execute(f'UPDATE {table_name} SET tag3 = ? WHERE post_uuid = ?;', (tag3, post.post_uuid))
-        cur.execute(f'UPDATE {table_name} SET tag4 = ? WHERE post_uuid = ?;', (tag4, post.post_uuid))
-        cur.execute(f'UPDATE {table_name} SET tag5 = ? WHERE post_uuid = ?;', (tag5, post.post_uuid))
-    con.commit()
+
+def _replace_post_tags(post_uuid: str, tags: Iterable[str]) -> None:
+    """Replace a post's rows in post_tags, without committing."""
+    _execute_query('delete_post_tags', (post_uuid,))
+    for tag in dict.fromkeys(tags):
+        if tag not in _NO_TAG:
+            _execute_query('insert_post_tag', (post_uuid, tag))
 
 
 def update_post_image(post: Post, image: bytes) -> None:
@@ -588,39 +1465,27 @@ def update_post_image(post: Post, image: bytes) -> None:
 
     Args:
         post: Post to be edited.
-        image: New image for the post.
+        image: New image for the post as raw bytes, saved to the blob store.
     """
-    con = get_db()
-    cur = con.cursor()
+    _execute_query('update_post_image', (get_blob_store().put(image), post.post_uuid))
+    _forget('posts', post.post_uuid)
+    _commit()
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET image = {placeholder} WHERE post_uuid = {placeholder};',
-        (image, post.post_uuid)
-    )
-    con.commit()
 
-
-def update_post_datetime(post: Post, datetime_str: str) -> None:
+def update_post_datetime(post: Post, datetime_str: str | datetime) -> None:
     """Update a post's date- and timestamp.
 
     Args:
         post: Post to be edited.
-        datetime_str: New date- and timestamp for the post.
-    """
-    con = get_db()
-    cur = con.cursor()
+        datetime_str: New date- and timestamp for the post, as a datetime or ISO-8601 string.
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET datetime = {placeholder} WHERE post_uuid = {placeholder};',
-        (datetime_str, post.post_uuid)
-    )
-    con.commit()
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
+    """
+    _execute_query('update_post_datetime', (_normalize_timestamp(datetime_str), post.post_uuid))
+    _refresh_post_activity(post.post_uuid)
+    _forget('posts', post.post_uuid)
+    _commit()
 
 
 def update_post_location(post: Post, location: str) -> None:
@@ -630,17 +1495,57 @@ def update_post_location(post: Post, location: str) -> None:
         post: Post to be edited.
         location: New location for the post.
     """
-    con = get_db()
-    cur = con.cursor()
+    _execute_query('update_post_location', (location, post.post_uuid))
+    _forget('posts', post.post_uuid)
+    _commit()
 
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET location = {placeholder} WHERE post_uuid = {placeholder};',
-        (location, post.post_uuid)
-    )
-    con.commit()
+
+def update_post(post: Post, **fields: Any) -> bool:
+    """Update several of a post's fields with a single UPDATE in one transaction.
+
+    Nothing is written if every value matches what the post object already holds.
+    Changing any of tag1 to tag5 also refreshes the post's post_tags rows in the same
+    transaction. The post object is updated to the new values.
+
+    Args:
+        post: Post to be edited.
+        **fields: New values for any of text_content, tag1 to tag5, image, datetime
+            and location. An image is given as raw bytes and saved to the blob store,
+            a datetime as a datetime or ISO-8601 string.
+
+    Raises:
+        ValueError: A field is not an updatable post column, or the datetime is not
+            an ISO-8601 timestamp.
+
+    Returns:
+        True if the database was written to, False if nothing changed.
+    """
+    _check_update_fields(fields, POST_UPDATE_FIELDS)
+    if 'datetime' in fields:
+        fields['datetime'] = _normalize_timestamp(fields['datetime'])
+    if 'image' in fields:
+        fields['image_hash'] = get_blob_store().put(fields.pop('image'))
+    changed = _changed_fields(post, fields)
+    if not changed:
+        return False
+
+    statement_name = _update_statement_name('posts', 'post_uuid', changed)
+    _execute_query(statement_name, (*changed.values(), post.post_uuid))
+    if any(name.startswith('tag') for name in changed):
+        _replace_post_tags(
+            post.post_uuid,
+            (changed.get(f'tag{i}', getattr(post, f'tag{i}')) for i in range(1, 6)),
+        )
+    if 'text_content' in changed:
+        _reindex_text('post', post.post_uuid, changed['text_content'])
+    if 'datetime' in changed:
+        _refresh_post_activity(post.post_uuid)
+    _forget('posts', post.post_uuid)
+    _commit()
+
+    for name, value in changed.items():
+        setattr(post, name, value)
+    return True
 
 
 def delete_post(post: Post) -> None:
@@ -649,27 +1554,45 @@ def delete_post(post: Post) -> None:
     Args:
         post: Post to delete.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'posts' if USE_POSTGRESQL else 'POSTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'DELETE FROM {table_name} WHERE post_uuid = {placeholder};',
-        (post.post_uuid,)
-    )
-    con.commit()
+    _execute_query('delete_post_tags', (post.post_uuid,))
+    _unindex_text('post', post.post_uuid)
+    _execute_query('delete_post', (post.post_uuid,))
+    _count_user_posts({post.author_uuid: -1})
+    _forget('posts', post.post_uuid)
+    _commit()
 
 
 # Methods for Comments
 
+_COMMENT_COLUMNS = 'comment_uuid, parent_post_uuid, author_uuid, text_content, datetime'
+
+_statements.add(
+    'create_comment',
+    'INSERT INTO {comments} (comment_uuid, parent_post_uuid, author_uuid, text_content, datetime) VALUES (?, ?, ?, ?, ?);',
+)
+_statements.add('get_comment_by_uuid', f'SELECT {_COMMENT_COLUMNS} FROM {{comments}} WHERE comment_uuid = ?;', 'one')
+_statements.add(
+    'get_comments_by_parent_post',
+    f'SELECT {_COMMENT_COLUMNS} FROM {{comments}} WHERE parent_post_uuid = ?;',
+    'all',
+)
+_statements.add('get_comments_by_author', f'SELECT {_COMMENT_COLUMNS} FROM {{comments}} WHERE author_uuid = ?;', 'all')
+_statements.add('get_comments_by_datetime', f'SELECT {_COMMENT_COLUMNS} FROM {{comments}} WHERE datetime = ?;', 'all')
+_statements.add(
+    'get_comments_since',
+    f'SELECT {_COMMENT_COLUMNS} FROM {{comments}} WHERE datetime > ? ORDER BY datetime, comment_uuid;',
+    'all',
+)
+_statements.add('update_comment_text_content', 'UPDATE {comments} SET text_content = ? WHERE comment_uuid = ?;')
+_statements.add('update_comment_datetime', 'UPDATE {comments} SET datetime = ? WHERE comment_uuid = ?;')
+_statements.add('delete_comment', 'DELETE FROM {comments} WHERE comment_uuid = ?;')
+
 
 def create_comment(
     parent_post: Post,
     author: User,
     text_content: str,
-    datetime_str: str,
+    datetime_str: str | datetime | None = None,
 ) -> None:
     """Create a new comment for a post with content.
 
@@ -677,30 +1600,61 @@ def create_comment(
         parent_post: Post the comment will be under.
         author: Author of the comment.
         text_content: Content of the comment.
-        datetime_str: Date- and timestamp of the comment.
-    """
-    con = get_db()
-    cur = con.cursor()
+        datetime_str: Date- and timestamp of the comment, as a datetime or ISO-8601
+            string. Defaults to now.
 
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
+    """
+    comment_uuid = str(create_uuid())
     new_comment_data = (
-        str(create_uuid()),
+        comment_uuid,
         parent_post.post_uuid,
         author.user_uuid,
         text_content,
-        datetime_str,
+        _normalize_timestamp(datetime_str) if datetime_str else _now_timestamp(),
     )
 
-    if USE_POSTGRESQL:
-        cur.execute(
-            'INSERT INTO comments (comment_uuid, parent_post_uuid, author_uuid, text_content, datetime) VALUES (%s, %s, %s, %s, %s);',
-            new_comment_data
-        )
-    else:
-        cur.execute(
-            'INSERT INTO COMMENTS VALUES(?, ?, ?, ?, ?);',
-            new_comment_data
-        )
-    con.commit()
+    _execute_query('create_comment', new_comment_data)
+    _index_text('comment', comment_uuid, text_content)
+    _count_post_comments([new_comment_data])
+    _commit()
+
+
+def create_comments(comments: Iterable[Mapping[str, Any]], chunk_size: int = 1000) -> int:
+    """Create many comments, inserting and committing them one chunk at a time.
+
+    Args:
+        comments: Comments as mappings of column name to value. parent_post_uuid,
+            author_uuid and text_content are required; comment_uuid and datetime (a
+            datetime or ISO-8601 string, defaults to now) are optional. May be a
+            generator, it is consumed one chunk at a time.
+        chunk_size: Comments inserted per round trip and transaction. Defaults to 1000.
+
+    Returns:
+        Number of comments created.
+    """
+    created = 0
+
+    for chunk in _chunked(comments, chunk_size):
+        rows = [
+            (
+                comment.get('comment_uuid') or str(create_uuid()),
+                comment['parent_post_uuid'],
+                comment['author_uuid'],
+                comment['text_content'],
+                _normalize_timestamp(comment['datetime']) if comment.get('datetime') else _now_timestamp(),
+            )
+            for comment in chunk
+        ]
+
+        _execute_many('create_comment', rows)
+        _index_texts('comment', [(row[0], row[3]) for row in rows])
+        _count_post_comments(rows)
+        _commit()
+        _forget_created('comments', rows)
+        created += len(rows)
+    return created
 
 
 def get_comment_by_uuid(comment_uuid: str) -> DatabaseRow | None:
@@ -712,18 +1666,7 @@ def get_comment_by_uuid(comment_uuid: str) -> DatabaseRow | None:
     Returns:
         Database query if the comment exists, None otherwise.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE comment_uuid = %s;', (comment_uuid,))
-        datum = cur.fetchone()
-        return dict(datum) if datum else None
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE comment_uuid = ?;', (comment_uuid,)).fetchone()
-        return datum
+    return _lookup_by_uuid('comments', 'get_comment_by_uuid', comment_uuid)
 
 
 def get_comments_by_parent_post(parent_post: Post) -> list[DatabaseRow]:
@@ -735,18 +1678,7 @@ def get_comments_by_parent_post(parent_post: Post) -> list[DatabaseRow]:
     Returns:
         All comments under specified parent post.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE parent_post_uuid = %s;', (parent_post.post_uuid,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE parent_post_uuid = ?;', (parent_post.post_uuid,)).fetchall()
-        return datum
+    return _execute_query('get_comments_by_parent_post', (parent_post.post_uuid,))
 
 
 def get_comments_by_author(author: User) -> list[DatabaseRow]:
@@ -758,41 +1690,39 @@ def get_comments_by_author(author: User) -> list[DatabaseRow]:
     Returns:
         All comments by specified author.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE author_uuid = %s;', (author.user_uuid,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE author_uuid = ?;', (author.user_uuid,)).fetchall()
-        return datum
+    return _execute_query('get_comments_by_author', (author.user_uuid,))
 
 
-def get_comments_by_datetime(datetime_str: str) -> list[DatabaseRow]:
+def get_comments_by_datetime(datetime_str: str | datetime) -> list[DatabaseRow]:
     """Retrieve comments by date- and timestamp.
 
     Args:
-        datetime_str: Date- and timestamp of the comments.
+        datetime_str: Date- and timestamp of the comments, as a datetime or ISO-8601 string.
+
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
 
     Returns:
         All comments with specified date- and timestamp.
     """
-    con = get_db()
-    cur = con.cursor()
+    return _execute_query('get_comments_by_datetime', (_normalize_timestamp(datetime_str),))
 
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    
-    if USE_POSTGRESQL:
-        cur.execute(f'SELECT * FROM {table_name} WHERE datetime = %s;', (datetime_str,))
-        data = cur.fetchall()
-        return [dict(row) for row in data]
-    else:
-        datum = cur.execute(f'SELECT * FROM {table_name} WHERE datetime = ?;', (datetime_str,)).fetchall()
-        return datum
+
+def get_comments_since(since: str | datetime) -> list[DatabaseRow]:
+    """Retrieve the comments made after a point in time, using the datetime index.
+
+    For incremental sync, pass the datetime of the newest comment already seen.
+
+    Args:
+        since: Point in time, exclusive, as a datetime or ISO-8601 string.
+
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
+
+    Returns:
+        The comments made after it, oldest first.
+    """
+    return _execute_query('get_comments_since', (_normalize_timestamp(since),))
 
 
 def update_comment_text_content(comment: Comment, text_content: str) -> None:
@@ -802,37 +1732,27 @@ def update_comment_text_content(comment: Comment, text_content: str) -> None:
         comment: Comment to be edited.
         text_content: New content for the comment.
     """
-    con = get_db()
-    cur = con.cursor()
-
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET text_content = {placeholder} WHERE comment_uuid = {placeholder};',
-        (text_content, comment.comment_uuid)
-    )
-    con.commit()
+    _execute_query('update_comment_text_content', (text_content, comment.comment_uuid))
+    _reindex_text('comment', comment.comment_uuid, text_content)
+    _forget('comments', comment.comment_uuid)
+    _commit()
 
 
-def update_comment_datetime(comment: Comment, datetime_str: str) -> None:
+def update_comment_datetime(comment: Comment, datetime_str: str | datetime) -> None:
     """Update a comment's date- and timestamp.
 
     Args:
         comment: Comment to be edited.
-        datetime_str: New date- and timestamp for the comment.
-    """
-    con = get_db()
-    cur = con.cursor()
+        datetime_str: New date- and timestamp for the comment, as a datetime or
+            ISO-8601 string.
 
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'UPDATE {table_name} SET datetime = {placeholder} WHERE comment_uuid = {placeholder};',
-        (datetime_str, comment.comment_uuid)
-    )
-    con.commit()
+    Raises:
+        ValueError: The string is not an ISO-8601 timestamp.
+    """
+    _execute_query('update_comment_datetime', (_normalize_timestamp(datetime_str), comment.comment_uuid))
+    _refresh_post_activity(comment.parent_post_uuid)
+    _forget('comments', comment.comment_uuid)
+    _commit()
 
 
 def delete_comment(comment: Comment) -> None:
@@ -841,14 +1761,288 @@ def delete_comment(comment: Comment) -> None:
     Args:
         comment: Comment to delete.
     """
-    con = get_db()
-    cur = con.cursor()
+    _unindex_text('comment', comment.comment_uuid)
+    _execute_query('delete_comment', (comment.comment_uuid,))
+    _refresh_post_activity(comment.parent_post_uuid)
+    _forget('comments', comment.comment_uuid)
+    _commit()
+
+
+# Activity counters
+#
+# posts.comment_count, posts.last_activity_at and users.post_count are kept up to date
+# by the functions that create and delete posts and comments, in the same transaction,
+# so feeds sorted by activity and profile stats read them instead of counting.
+# last_activity_at is the time of a post's latest comment, or of the post itself if it
+# has none newer. check_activity_counters() and rebuild_activity_counters() find and
+# fix counters that drifted, e.g. after rows were changed by hand.
+
+_POST_COMMENT_COUNT = '(SELECT COUNT(*) FROM {comments} c WHERE c.parent_post_uuid = {posts}.post_uuid)'
+_POST_LAST_ACTIVITY = (
+    'COALESCE((SELECT MAX(c.datetime) FROM {comments} c '
+    'WHERE c.parent_post_uuid = {posts}.post_uuid AND c.datetime > {posts}.datetime), {posts}.datetime)'
+)
+_USER_POST_COUNT = '(SELECT COUNT(*) FROM {posts} p WHERE p.author_uuid = {users}.user_uuid)'
+_STALE_POST_COUNTERS = f'comment_count <> {_POST_COMMENT_COUNT} OR last_activity_at <> {_POST_LAST_ACTIVITY}'
+_STALE_USER_COUNTERS = f'post_count <> {_USER_POST_COUNT}'
+
+_statements.add(
+    'add_post_comments',
+    'UPDATE {posts} SET comment_count = comment_count + ?, '
+    'last_activity_at = CASE WHEN last_activity_at < ? THEN ? ELSE last_activity_at END WHERE post_uuid = ?;',
+)
+_statements.add(
+    'refresh_post_activity',
+    f'UPDATE {{posts}} SET comment_count = {_POST_COMMENT_COUNT}, last_activity_at = {_POST_LAST_ACTIVITY} '
+    'WHERE post_uuid = ?;',
+)
+_statements.add('add_user_posts', 'UPDATE {users} SET post_count = post_count + ? WHERE user_uuid = ?;')
+_statements.add(
+    'count_stale_post_counters',
+    f'SELECT COUNT(*) AS stale FROM {{posts}} WHERE {_STALE_POST_COUNTERS};',
+    'one',
+    cache=False,
+)
+_statements.add(
+    'count_stale_user_counters',
+    f'SELECT COUNT(*) AS stale FROM {{users}} WHERE {_STALE_USER_COUNTERS};',
+    'one',
+    cache=False,
+)
+_statements.add(
+    'rebuild_post_counters',
+    f'UPDATE {{posts}} SET comment_count = {_POST_COMMENT_COUNT}, last_activity_at = {_POST_LAST_ACTIVITY} '
+    f'WHERE {_STALE_POST_COUNTERS};',
+)
+_statements.add('rebuild_user_counters', f'UPDATE {{users}} SET post_count = {_USER_POST_COUNT} WHERE {_STALE_USER_COUNTERS};')
+
+
+def _count_user_posts(new_posts: Mapping[str, int]) -> None:
+    """Add to the post counts of authors, given the number of posts each gained or lost."""
+    for author_uuid, count in new_posts.items():
+        if _execute_query('add_user_posts', (count, author_uuid)):
+            _forget('users', author_uuid)
+
+
+def _count_post_comments(rows: Sequence[Sequence]) -> None:
+    """Count new comments, given as create_comment rows, on their posts."""
+    latest: dict[str, str] = {}
+    counts: Counter[str] = Counter()
+    for _, parent_post_uuid, _, _, timestamp in rows:
+        counts[parent_post_uuid] += 1
+        latest[parent_post_uuid] = max(latest.get(parent_post_uuid, timestamp), timestamp)
+    for parent_post_uuid, count in counts.items():
+        timestamp = latest[parent_post_uuid]
+        _execute_query('add_post_comments', (count, timestamp, timestamp, parent_post_uuid))
+        _forget('posts', parent_post_uuid)
+
+
+def _refresh_post_activity(post_uuid: str) -> None:
+    """Recount a post's comments and recompute its latest activity from its rows."""
+    _execute_query('refresh_post_activity', (post_uuid,))
+    _forget('posts', post_uuid)
+
+
+def check_activity_counters() -> dict[str, int]:
+    """Count the posts and users whose activity counters disagree with the rows they count.
+
+    Reads every post and user, so it is meant for maintenance rather than requests.
 
-    table_name = 'comments' if USE_POSTGRESQL else 'COMMENTS'
-    placeholder = '%s' if USE_POSTGRESQL else '?'
-    
-    cur.execute(
-        f'DELETE FROM {table_name} WHERE comment_uuid = {placeholder};',
-        (comment.comment_uuid,)
+    Returns:
+        The number of stale rows under 'posts' and 'users'.
+    """
+    return {
+        'posts': _execute_query('count_stale_post_counters')['stale'],
+        'users': _execute_query('count_stale_user_counters')['stale'],
+    }
+
+
+def rebuild_activity_counters() -> dict[str, int]:
+    """Recompute the activity counters that are stale, in one transaction.
+
+    Returns:
+        The number of rows fixed under 'posts' and 'users'.
+    """
+    fixed = {
+        'posts': _execute_query('rebuild_post_counters'),
+        'users': _execute_query('rebuild_user_counters'),
+    }
+    g.pop('_identity_maps', None)
+    _commit()
+    return fixed
+
+
+# Full-text search
+#
+# SQLite keeps searchable text in the POSTS_FTS and COMMENTS_FTS FTS5 tables, kept in
+# sync by the functions above within the same transaction as the change. PostgreSQL
+# keeps a generated search_vector column on posts and comments with a GIN index, which
+# the database maintains by itself.
+#
+# Snippets are made in an outer query so only the rows on the page get one, rather than
+# every match before it is ranked. Post results carry the same columns as a feed page,
+# with authors also looked up only for the rows on the page.
+
+# Marks around matched terms in snippets, replaced by <mark> tags once the rest of the
+# snippet is HTML-escaped.
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+
+if USE_POSTGRESQL:
+    _HEADLINE = "ts_headline('english', text_content, query, 'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=32, MinWords=12') AS snippet"
+    _statements.add(
+        'search_posts',
+        f'SELECT {_FEED_COLUMNS}, {_HEADLINE} FROM ('
+        'SELECT post_uuid, author_uuid, text_content, datetime, comment_count, last_activity_at, query, '
+        'ts_rank_cd(search_vector, query) AS rank '
+        "FROM {posts}, plainto_tsquery('english', ?) AS query WHERE search_vector @@ query "
+        'ORDER BY rank DESC, post_uuid LIMIT ? OFFSET ?'
+        f') AS p {_FEED_AUTHOR_JOIN} ORDER BY p.rank DESC, p.post_uuid;',
+        'all',
+    )
+    _statements.add(
+        'search_comments',
+        f'SELECT comment_uuid, parent_post_uuid, author_uuid, text_content, datetime, {_HEADLINE} FROM ('
+        'SELECT comment_uuid, parent_post_uuid, author_uuid, text_content, datetime, query, '
+        'ts_rank_cd(search_vector, query) AS rank '
+        "FROM {comments}, plainto_tsquery('english', ?) AS query WHERE search_vector @@ query "
+        'ORDER BY rank DESC, comment_uuid LIMIT ? OFFSET ?'
+        ') AS matches ORDER BY rank DESC, comment_uuid;',
+        'all',
+    )
+else:
+    _statements.add('index_post_text', 'INSERT INTO {posts_fts} (rowid, post_uuid, text_content) VALUES (?, ?, ?);')
+    _statements.add('reindex_post_text', 'UPDATE {posts_fts} SET text_content = ? WHERE rowid = ?;')
+    _statements.add('unindex_post_text', 'DELETE FROM {posts_fts} WHERE rowid = ?;')
+    _statements.add(
+        'search_posts',
+        f'SELECT {_FEED_COLUMNS}, p.snippet FROM ('
+        'SELECT {posts}.post_uuid, {posts}.author_uuid, {posts}.text_content, {posts}.datetime, '
+        '{posts}.comment_count, {posts}.last_activity_at, {posts_fts}.rank, '
+        "snippet({posts_fts}, 1, char(2), char(3), '…', 24) AS snippet "
+        'FROM {posts_fts} JOIN {posts} ON {posts}.post_uuid = {posts_fts}.post_uuid '
+        'WHERE {posts_fts} MATCH ? ORDER BY rank LIMIT ? OFFSET ?'
+        f') AS p {_FEED_AUTHOR_JOIN} ORDER BY p.rank;',
+        'all',
+    )
+    _statements.add(
+        'index_comment_text',
+        'INSERT INTO {comments_fts} (rowid, comment_uuid, text_content) VALUES (?, ?, ?);',
+    )
+    _statements.add('reindex_comment_text', 'UPDATE {comments_fts} SET text_content = ? WHERE rowid = ?;')
+    _statements.add('unindex_comment_text', 'DELETE FROM {comments_fts} WHERE rowid = ?;')
+    _statements.add(
+        'search_comments',
+        'SELECT {comments}.comment_uuid, {comments}.parent_post_uuid, {comments}.author_uuid, '
+        '{comments}.text_content, {comments}.datetime, '
+        "snippet({comments_fts}, 1, char(2), char(3), '…', 24) AS snippet "
+        'FROM {comments_fts} JOIN {comments} ON {comments}.comment_uuid = {comments_fts}.comment_uuid '
+        'WHERE {comments_fts} MATCH ? ORDER BY rank LIMIT ? OFFSET ?;',
+        'all',
+    )
+
+
+def search_rowid(uuid: str) -> int:
+    """Rowid of a post's or comment's entry in its SQLite full-text index.
+
+    Derived from the UUID, so an entry can be found without a lookup table and rowids
+    stay stable whatever happens to the rowids of the posts and comments tables. With
+    63 bits, a collision among a million entries has odds of about 1 in 20 million,
+    and would make the insert fail rather than mix up two entries.
+    """
+    return int.from_bytes(hashlib.blake2b(uuid.encode(), digest_size=8).digest(), 'big') >> 1
+
+
+def _index_text(kind: str, uuid: str, text_content: str) -> None:
+    """Add a new post's or comment's text to the search index, without committing."""
+    if not USE_POSTGRESQL:
+        _execute_query(f'index_{kind}_text', (search_rowid(uuid), uuid, text_content))
+
+
+def _index_texts(kind: str, rows: Sequence[tuple[str, str]]) -> None:
+    """Add the (uuid, text_content) of many new posts or comments to the search index."""
+    if not USE_POSTGRESQL and rows:
+        _execute_many(f'index_{kind}_text', [(search_rowid(uuid), uuid, text) for uuid, text in rows])
+
+
+def _reindex_text(kind: str, uuid: str, text_content: str) -> None:
+    """Replace a post's or comment's text in the search index, without committing."""
+    if not USE_POSTGRESQL:
+        _execute_query(f'reindex_{kind}_text', (text_content, search_rowid(uuid)))
+
+
+def _unindex_text(kind: str, uuid: str) -> None:
+    """Remove a post or comment from the search index, without committing."""
+    if not USE_POSTGRESQL:
+        _execute_query(f'unindex_{kind}_text', (search_rowid(uuid),))
+
+
+def _search_query(text: str) -> str | None:
+    """Turn what a user typed into a query matching every word in it.
+
+    On SQLite each word is quoted so FTS5 operators and punctuation in the input are
+    taken literally. PostgreSQL gets the words for plainto_tsquery().
+
+    Returns:
+        The query, or None if the text holds no words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    if USE_POSTGRESQL:
+        return ' '.join(words)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def _highlight(snippet: str) -> Markup:
+    """HTML-escape a snippet and wrap its matched terms in <mark> tags."""
+    return (
+        escape(snippet)
+        .replace(_MATCH_START, Markup('<mark>'))
+        .replace(_MATCH_END, Markup('</mark>'))
+    )
+
+
+def _search(kind: str, text: str, limit: int, page: int) -> tuple[list[DatabaseRow], bool]:
+    if limit < 1 or page < 1:
+        raise ValueError(f'Page size and number must be positive, got {limit} and {page}.')
+    if (query := _search_query(text)) is None:
+        return [], False
+
+    results = _execute_query(f'search_{kind}s', (query, limit + 1, (page - 1) * limit))
+    return (
+        [{**result, 'snippet': _highlight(result['snippet'])} for result in results[:limit]],
+        len(results) > limit,
     )
-    con.commit()
\ No newline at end of file
+
+
+def search_posts(text: str, limit: int = 20, page: int = 1) -> tuple[list[DatabaseRow], bool]:
+    """Find posts containing every word of a search, best matches first.
+
+    Words match regardless of case and inflection, e.g. "learning" matches "learn".
+
+    Args:
+        text: What the user searched for.
+        limit: Maximum number of posts on a page. Defaults to 20.
+        page: Page of results, counting from 1. Defaults to 1.
+
+    Raises:
+        ValueError: The limit or page is not positive.
+
+    Returns:
+        The posts on the page, each with the columns of a get_posts_page() post and a
+        'snippet' of its text as HTML with the matched words in <mark> tags, and
+        whether there are more pages.
+    """
+    return _search('post', text, limit, page)
+
+
+def search_comments(text: str, limit: int = 20, page: int = 1) -> tuple[list[DatabaseRow], bool]:
+    """Find comments containing every word of a search, best matches first.
+
+    See search_posts() for the arguments.
+
+    Returns:
+        The comments on the page, each with a 'snippet' as in search_posts(), and
+        whether there are more pages.
+    """
+    return _search('comment', text, limit, page)
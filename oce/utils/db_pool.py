@@ -0,0 +1,223 @@
+"""
+A small thread-safe connection pool.
+
+Used by get_db() in PostgreSQL mode so that a request borrows an already open
+connection instead of paying for a TCP and authentication handshake each time.
+The pool is driver agnostic: it is handed a `connect` callable and, optionally,
+callables to health check a connection on checkout and to reset it on return.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no connection became available before the checkout timeout."""
+
+
+class ConnectionPool:
+    """Pool of reusable connections with a minimum and maximum size.
+
+    Args:
+        connect: Callable opening a new connection.
+        min_size: Connections opened eagerly and kept open. Defaults to 1.
+        max_size: Upper bound on open connections. Defaults to 10.
+        timeout: Seconds to wait for a free connection before giving up. Defaults to 30.
+        check: Callable given a connection and the seconds it sat idle. Returns False if
+            the connection is unusable and should be replaced. Defaults to None (no check).
+        reset: Callable run on a connection when it is returned, e.g. a rollback.
+            If it raises, the connection is discarded. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        check: Callable[[Any, float], bool] | None = None,
+        reset: Callable[[Any], None] | None = None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size bounds: min={min_size}, max={max_size}.')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self._idle: deque[tuple[Any, float]] = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'connects': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'discarded': 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    def _open(self) -> Any:
+        """Open a connection. Must be called without the lock held."""
+        con = self._connect()
+        with self._cond:
+            self._stats['connects'] += 1
+        return con
+
+    def _discard(self, con: Any) -> None:
+        """Close a connection and release its slot. Must be called without the lock held."""
+        try:
+            con.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def _replenish(self) -> None:
+        """Open connections until the pool is back at min_size, after some were discarded."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                con = self._open()
+            except Exception:
+                # The next checkout or return tries again
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                self._idle.append((con, time.monotonic()))
+                self._cond.notify()
+
+    def _healthy(self, con: Any, idle_for: float) -> bool:
+        if self._check is None:
+            return True
+        try:
+            return self._check(con, idle_for)
+        except Exception:
+            return False
+
+    def getconn(self) -> Any:
+        """Check out a connection, opening one if the pool is below its maximum size.
+
+        Idle connections are health checked without holding the pool's lock, since a
+        check may make a round trip to the server.
+
+        Raises:
+            PoolTimeoutError: No connection became free within the pool timeout.
+
+        Returns:
+            A connection which must be handed back with putconn().
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            con = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError('Connection pool is closed.')
+
+                    if self._idle:
+                        con, returned_at = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        # Reserve the slot, then connect without holding the lock.
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'No database connection available after {self.timeout}s '
+                            f'(max_size={self.max_size}).'
+                        )
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            if con is None:
+                break
+            if self._healthy(con, time.monotonic() - returned_at):
+                with self._cond:
+                    self._stats['checkouts'] += 1
+                return con
+            self._discard(con)
+            self._replenish()
+
+        try:
+            con = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats['checkouts'] += 1
+        return con
+
+    def putconn(self, con: Any, discard: bool = False) -> None:
+        """Return a checked out connection to the pool.
+
+        Args:
+            con: Connection previously obtained from getconn().
+            discard: Close the connection instead of keeping it. Defaults to False.
+        """
+        if not discard and self._reset is not None:
+            try:
+                self._reset(con)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if not discard and not self._closed:
+                self._idle.append((con, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(con)
+        self._replenish()
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = [con for con, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for con in idle:
+            self._discard(con)
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the pool's size and counters.
+
+        Returns:
+            Mapping with the configured bounds, current size, idle and in-use counts,
+            and running totals of connects, checkouts, waits, timeouts and discards.
+        """
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                **self._stats,
+            }
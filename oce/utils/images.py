@@ -0,0 +1,95 @@
+"""
+Helpers for serving images kept in the blob store.
+
+Thumbnails are made with Pillow when it is installed, and stored as variants of the
+original blob so each size is only rendered once. Without Pillow, or for files it
+cannot read, the original image is served instead.
+"""
+
+import functools
+import hashlib
+import io
+from pathlib import Path
+
+from .blob_store import CHUNK_SIZE, BlobStore
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+
+# Picture shown for users who have not uploaded one, relative to the static folder.
+# Their rows hold no picture hash, and it is served straight from the static folder.
+DEFAULT_AVATAR = 'images/__DEFAULT.jpg'
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def sniff_mimetype(path: Path) -> str:
+    """Identify an image's type from its first bytes.
+
+    Returns:
+        The MIME type, or application/octet-stream if it is not a known image format.
+    """
+    with open(path, 'rb') as fp:
+        head = fp.read(12)
+    for signature, mimetype in _SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+@functools.cache
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file shipped with the app, computed once per process."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        while chunk := fp.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def square_thumbnail(store: BlobStore, digest: str, size: int, source: Path | None = None) -> Path | None:
+    """Retrieve a square thumbnail of an image, rendering it on first use.
+
+    The image is scaled and center-cropped to size x size pixels. Images with
+    transparency are saved as PNG, everything else as JPEG.
+
+    Args:
+        store: Blob store holding the image, and where the thumbnail is kept.
+        digest: Digest of the image.
+        size: Width and height of the thumbnail in pixels.
+        source: File to read the image from if it is not in the store, such as a
+            static file. Defaults to None.
+
+    Returns:
+        Path of the thumbnail, or None if it cannot be made.
+    """
+    if Image is None:
+        return None
+
+    variant = f'square_{size}'
+    path = store.variant_path(digest, variant)
+    if path.exists():
+        return path
+
+    try:
+        with Image.open(source or store.path(digest)) as image:
+            image = ImageOps.exif_transpose(image)
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+    buffer = io.BytesIO()
+    if thumbnail.mode in ('RGBA', 'LA', 'P'):
+        thumbnail.save(buffer, 'PNG', optimize=True)
+    else:
+        thumbnail.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+    return store.put_variant(digest, variant, buffer.getvalue())
@@ -0,0 +1,409 @@
+"""
+Versioned schema migrations for both SQLite and PostgreSQL.
+
+Each migration has a version number and moves the schema one step forward. migrate()
+applies the ones a database has not had yet, in order. Each runs in its own
+transaction and is recorded in the schema_migrations table. A fresh database gets
+every migration, so it ends up with the same schema as an upgraded one.
+
+Migrations check what is already there before changing it, so they are safe on
+databases that were upgraded by hand before versions were recorded. Add schema
+changes as a new migration at the end of MIGRATIONS. Never edit one that has
+already been released.
+
+index_report() runs EXPLAIN on every statement db_interface has registered and tells
+which of them are served by an index.
+"""
+
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from flask import current_app
+
+from .db_interface import (
+    USE_POSTGRESQL,
+    _normalize_timestamp,
+    _now_timestamp,
+    _prepared_statements,
+    _statements,
+    get_blob_store,
+    get_db,
+    search_rowid,
+)
+from .images import DEFAULT_AVATAR, file_digest
+from .statements import TABLE_NAMES
+
+# Stands in for post and comment timestamps that were never recorded, sorting oldest.
+UNKNOWN_TIMESTAMP = _normalize_timestamp(datetime.fromtimestamp(0, timezone.utc))
+
+_SQLITE_PLAN = re.compile(
+    r'^(?P<kind>SCAN|SEARCH) (?P<table>\w+)'
+    r'(?: USING (?:COVERING )?INDEX (?P<index>\w+)| USING (?:INTEGER )?(?P<key>PRIMARY KEY)| (?P<fts>VIRTUAL TABLE))?'
+)
+_POSTGRES_INDEX = re.compile(r'(?:Index (?:Only )?Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)')
+_POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Any], None]
+
+
+@dataclass(frozen=True, slots=True)
+class QueryPlan:
+    """How the database runs one registered statement.
+
+    Attributes:
+        statement: Name of the statement.
+        indexes: Indexes the plan reads, including primary keys and full-text indexes.
+        scanned_tables: Tables the plan reads from start to end.
+        error: Why the statement could not be explained, if it could not.
+    """
+
+    statement: str
+    indexes: tuple[str, ...] = ()
+    scanned_tables: tuple[str, ...] = ()
+    error: str | None = None
+
+    @property
+    def index_backed(self) -> bool:
+        return self.error is None and not self.scanned_tables
+
+
+def _table(name: str) -> str:
+    return TABLE_NAMES[_statements.dialect][name]
+
+
+def _execute(cur, template: str, params: tuple = ()) -> None:
+    """Run a statement template, written as for the statement registry."""
+    sql = template.format(**TABLE_NAMES[_statements.dialect])
+    cur.execute(sql.replace('?', '%s') if USE_POSTGRESQL else sql, params)
+
+
+def _columns(cur, table: str) -> list[str]:
+    cur.execute(f'SELECT * FROM {_table(table)} LIMIT 0;')
+    return [column[0] for column in cur.description]
+
+
+def _sqlite_or_postgres(sqlite: str, postgresql: str) -> str:
+    return postgresql if USE_POSTGRESQL else sqlite
+
+
+# Migrations. Each takes a cursor and must not commit.
+
+def _create_base_tables(cur) -> None:
+    blob = _sqlite_or_postgres('BLOB', 'BYTEA')
+    _execute(
+        cur,
+        'CREATE TABLE IF NOT EXISTS {users} ('
+        'user_uuid TEXT PRIMARY KEY, '
+        + _sqlite_or_postgres('username TEXT NOT NULL, ', 'username TEXT UNIQUE NOT NULL, ')
+        + 'email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, '
+        + _sqlite_or_postgres(
+            f'profile_pic {blob} NOT NULL, about_me TEXT NOT NULL, datetime_created TEXT);',
+            f'profile_pic {blob}, about_me TEXT, datetime_created TIMESTAMP NOT NULL DEFAULT NOW());',
+        ),
+    )
+    _execute(
+        cur,
+        'CREATE TABLE IF NOT EXISTS {posts} ('
+        'post_uuid TEXT PRIMARY KEY, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, '
+        'tag1 TEXT, tag2 TEXT, tag3 TEXT, tag4 TEXT, tag5 TEXT, '
+        f'image {blob}, datetime TEXT{_sqlite_or_postgres(" NOT NULL", "")}, location TEXT);',
+    )
+    _execute(
+        cur,
+        'CREATE TABLE IF NOT EXISTS {comments} ('
+        'comment_uuid TEXT PRIMARY KEY, parent_post_uuid TEXT NOT NULL, author_uuid TEXT NOT NULL, '
+        'text_content TEXT NOT NULL, datetime TEXT NOT NULL);',
+    )
+
+
+def _index_feed(cur) -> None:
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_posts_datetime ON {posts}(datetime, post_uuid);')
+
+
+def _create_post_tags(cur) -> None:
+    _execute(
+        cur,
+        'CREATE TABLE IF NOT EXISTS {post_tags} (post_uuid TEXT NOT NULL, tag TEXT NOT NULL, PRIMARY KEY (post_uuid, tag));',
+    )
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON {post_tags}(tag, post_uuid);')
+    _execute(
+        cur,
+        'INSERT INTO {post_tags} (post_uuid, tag) '
+        + ' UNION '.join(
+            f"SELECT post_uuid, tag{i} FROM {{posts}} WHERE tag{i} IS NOT NULL AND tag{i} <> '' AND tag{i} <> 'None'"
+            for i in range(1, 6)
+        )
+        + ' ON CONFLICT DO NOTHING;',
+    )
+
+
+def _add_avatar_version(cur) -> None:
+    if 'avatar_version' not in _columns(cur, 'users'):
+        _execute(cur, 'ALTER TABLE {users} ADD COLUMN avatar_version INTEGER NOT NULL DEFAULT 0;')
+
+
+def _move_images_to_blob_store(cur) -> None:
+    store = get_blob_store()
+    for table, key, blob_column, hash_column in (
+        ('users', 'user_uuid', 'profile_pic', 'profile_pic_hash'),
+        ('posts', 'post_uuid', 'image', 'image_hash'),
+    ):
+        columns = _columns(cur, table)
+        if hash_column not in columns:
+            _execute(cur, f'ALTER TABLE {{{table}}} ADD COLUMN {hash_column} TEXT;')
+        if blob_column not in columns:
+            continue
+
+        _execute(cur, f'SELECT {key} FROM {{{table}}} WHERE {blob_column} IS NOT NULL;')
+        for value in [row[key] for row in cur.fetchall()]:
+            _execute(cur, f'SELECT {blob_column} FROM {{{table}}} WHERE {key} = ?;', (value,))
+            blob = cur.fetchone()[blob_column]
+            # Empty values and leftover placeholders such as 'None' become NULL.
+            if isinstance(blob, (bytes, memoryview)) and len(blob):
+                _execute(
+                    cur,
+                    f'UPDATE {{{table}}} SET {hash_column} = ? WHERE {key} = ?;',
+                    (store.put(bytes(blob)), value),
+                )
+        _execute(cur, f'ALTER TABLE {{{table}}} DROP COLUMN {blob_column};')
+
+
+def _share_default_avatar(cur) -> None:
+    # Users used to get their own copy of the default picture.
+    store = get_blob_store()
+    default_digest = file_digest(Path(current_app.static_folder) / DEFAULT_AVATAR)
+    _execute(cur, 'UPDATE {users} SET profile_pic_hash = NULL WHERE profile_pic_hash = ?;', (default_digest,))
+    # Files are not transactional, but an upload of the default picture puts it back.
+    if default_digest in store:
+        store.delete(default_digest)
+
+
+def _create_search_indexes(cur) -> None:
+    for table, key in (('posts', 'post_uuid'), ('comments', 'comment_uuid')):
+        if USE_POSTGRESQL:
+            if 'search_vector' not in _columns(cur, table):
+                _execute(
+                    cur,
+                    f'ALTER TABLE {{{table}}} ADD COLUMN search_vector TSVECTOR '
+                    "GENERATED ALWAYS AS (to_tsvector('english', text_content)) STORED;",
+                )
+            _execute(cur, f'CREATE INDEX IF NOT EXISTS idx_{table}_search ON {{{table}}} USING GIN (search_vector);')
+        else:
+            fts = f'{table}_fts'
+            _execute(cur, f'DROP TABLE IF EXISTS {{{fts}}};')
+            _execute(
+                cur,
+                f'CREATE VIRTUAL TABLE {{{fts}}} USING fts5({key} UNINDEXED, text_content, '
+                "tokenize='porter unicode61 remove_diacritics 2');",
+            )
+            cur.connection.create_function('search_rowid', 1, search_rowid, deterministic=True)
+            _execute(
+                cur,
+                f'INSERT INTO {{{fts}}} (rowid, {key}, text_content) '
+                f'SELECT search_rowid({key}), {key}, text_content FROM {{{table}}};',
+            )
+
+
+def _normalize_timestamps(cur) -> None:
+    for table, key in (('posts', 'post_uuid'), ('comments', 'comment_uuid')):
+        _execute(cur, f'SELECT {key}, datetime FROM {{{table}}};')
+        for row in cur.fetchall():
+            try:
+                normalized = _normalize_timestamp(row['datetime'])
+            except (TypeError, ValueError):
+                normalized = UNKNOWN_TIMESTAMP
+            if normalized != row['datetime']:
+                _execute(cur, f'UPDATE {{{table}}} SET datetime = ? WHERE {key} = ?;', (normalized, row[key]))
+
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_comments_datetime ON {comments}(datetime, comment_uuid);')
+    if USE_POSTGRESQL:
+        _execute(cur, 'ALTER TABLE {posts} ALTER COLUMN datetime SET NOT NULL;')
+
+
+def _index_foreign_keys(cur) -> None:
+    # These used to exist on PostgreSQL only.
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_users_username ON {users}(username);')
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_posts_author ON {posts}(author_uuid);')
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_comments_post ON {comments}(parent_post_uuid);')
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_comments_author ON {comments}(author_uuid);')
+    # Duplicates the index behind the UNIQUE constraint on email.
+    _execute(cur, 'DROP INDEX IF EXISTS idx_users_email;')
+
+
+
+def _index_comments_by_post_and_time(cur) -> None:
+    # Covers a post's comment count and latest comment time in feed pages, and replaces
+    # idx_comments_post, which is a prefix of it.
+    _execute(
+        cur,
+        'CREATE INDEX IF NOT EXISTS idx_comments_post_datetime ON {comments}(parent_post_uuid, datetime);',
+    )
+    _execute(cur, 'DROP INDEX IF EXISTS idx_comments_post;')
+
+
+
+def _add_activity_counters(cur) -> None:
+    posts = _columns(cur, 'posts')
+    if 'comment_count' not in posts:
+        _execute(cur, 'ALTER TABLE {posts} ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0;')
+    if 'last_activity_at' not in posts:
+        _execute(cur, f"ALTER TABLE {{posts}} ADD COLUMN last_activity_at TEXT NOT NULL DEFAULT '{UNKNOWN_TIMESTAMP}';")
+    if 'post_count' not in _columns(cur, 'users'):
+        _execute(cur, 'ALTER TABLE {users} ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0;')
+
+    for name in ('rebuild_post_counters', 'rebuild_user_counters'):
+        cur.execute(_statements[name].sql, ())
+    _execute(cur, 'CREATE INDEX IF NOT EXISTS idx_posts_activity ON {posts}(last_activity_at, post_uuid);')
+
+
+MIGRATIONS = (
+    Migration(1, 'Create users, posts and comments tables', _create_base_tables),
+    Migration(2, 'Index posts by datetime for the feed', _index_feed),
+    Migration(3, 'Create post_tags and backfill it from tag1-tag5', _create_post_tags),
+    Migration(4, 'Add users.avatar_version', _add_avatar_version),
+    Migration(5, 'Move profile pictures and post images to the blob store', _move_images_to_blob_store),
+    Migration(6, 'Share one default profile picture', _share_default_avatar),
+    Migration(7, 'Create full-text search indexes', _create_search_indexes),
+    Migration(8, 'Normalize post and comment timestamps', _normalize_timestamps),
+    Migration(9, 'Index users, posts and comments by their foreign keys', _index_foreign_keys),
+    Migration(10, 'Index comments by post and time for feed pages', _index_comments_by_post_and_time),
+    Migration(11, 'Add comment, post and activity counters', _add_activity_counters),
+)
+
+
+def _create_version_table(cur) -> None:
+    _execute(
+        cur,
+        'CREATE TABLE IF NOT EXISTS {schema_migrations} ('
+        'version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TEXT NOT NULL);',
+    )
+
+
+def get_applied_versions() -> set[int]:
+    """Retrieve the versions of the migrations applied to the database."""
+    con = get_db()
+    cur = con.cursor()
+    _create_version_table(cur)
+    _execute(cur, 'SELECT version FROM {schema_migrations};')
+    versions = {row['version'] for row in cur.fetchall()}
+    con.commit()
+    return versions
+
+
+def get_schema_version() -> int:
+    """Retrieve the version of the newest migration applied, 0 if there is none."""
+    return max(get_applied_versions(), default=0)
+
+
+def migrate(target: int | None = None) -> list[Migration]:
+    """Apply the migrations the database has not had yet, oldest first.
+
+    Each migration and the record of it commit together, so a failed migration leaves
+    the database as it was before that migration.
+
+    Args:
+        target: Version to stop at. Defaults to None, for the newest.
+
+    Raises:
+        Exception: Whatever a migration raised. The migrations before it stay applied.
+
+    Returns:
+        The migrations applied.
+    """
+    applied = get_applied_versions()
+    con = get_db()
+    cur = con.cursor()
+    done = []
+
+    for migration in MIGRATIONS:
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+        if not USE_POSTGRESQL:
+            # sqlite3 only opens transactions by itself before data changes, not DDL.
+            cur.execute('BEGIN;')
+        try:
+            migration.apply(cur)
+            _execute(
+                cur,
+                'INSERT INTO {schema_migrations} (version, description, applied_at) VALUES (?, ?, ?);',
+                (migration.version, migration.description, _now_timestamp()),
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        done.append(migration)
+    return done
+
+
+def _read_plan(statement: str, lines: list[str]) -> QueryPlan:
+    tables = set(TABLE_NAMES[_statements.dialect].values())
+    indexes, scanned = [], []
+    for line in lines:
+        if USE_POSTGRESQL:
+            indexes += _POSTGRES_INDEX.findall(line)
+            scanned += [table for table in _POSTGRES_SEQ_SCAN.findall(line) if table in tables]
+        elif match := _SQLITE_PLAN.match(line):
+            table = match['table']
+            if match['index']:
+                indexes.append(match['index'])
+            elif match['key'] or match['kind'] == 'SEARCH':
+                indexes.append(f'{table} primary key')
+            elif match['fts']:
+                indexes.append(f'{table} full-text index')
+            elif table in tables:
+                scanned.append(table)
+    return QueryPlan(statement, tuple(dict.fromkeys(indexes)), tuple(dict.fromkeys(scanned)))
+
+
+def index_report() -> list[QueryPlan]:
+    """Explain every statement db_interface has registered, except INSERTs.
+
+    On PostgreSQL sequential scans are disabled while explaining, so a table shows up
+    as scanned only when no index can serve the statement, however small the table.
+
+    Returns:
+        The plan of each statement, by statement name.
+    """
+    con = get_db()
+    cur = con.cursor()
+    plans = []
+
+    if USE_POSTGRESQL:
+        cur.execute('SET LOCAL enable_seqscan = off;')
+        # Plan for any parameter values rather than the NULLs passed below.
+        cur.execute('SET LOCAL plan_cache_mode = force_generic_plan;')
+    try:
+        for statement in sorted(_statements, key=lambda statement: statement.name):
+            if statement.sql.lstrip().upper().startswith('INSERT'):
+                continue
+            try:
+                if USE_POSTGRESQL:
+                    cur.execute('SAVEPOINT explain;')
+                    prepared = _prepared_statements.setdefault(con, set())
+                    if statement.name not in prepared:
+                        cur.execute(statement.prepare_sql)
+                        prepared.add(statement.name)
+                    cur.execute(f'EXPLAIN {statement.execute_sql}', [None] * statement.execute_sql.count('%s'))
+                    lines = [row['QUERY PLAN'] for row in cur.fetchall()]
+                else:
+                    cur.execute(f'EXPLAIN QUERY PLAN {statement.sql}', [None] * statement.sql.count('?'))
+                    lines = [row['detail'] for row in cur.fetchall()]
+            except Exception as e:
+                if USE_POSTGRESQL:
+                    cur.execute('ROLLBACK TO SAVEPOINT explain;')
+                plans.append(QueryPlan(statement.name, error=str(e).strip()))
+                continue
+            plans.append(_read_plan(statement.name, lines))
+    finally:
+        con.rollback()
+    return plans
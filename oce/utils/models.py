@@ -4,10 +4,11 @@
 
 from dataclasses import dataclass
 
-from argon2.exceptions import VerifyMismatchError
+from flask import has_request_context, request, session
 from flask_login import UserMixin
+from werkzeug.exceptions import TooManyRequests
 
-from .. import login_manager, password_hasher
+from .. import login_manager
 
 
 class User(UserMixin):
@@ -17,29 +18,58 @@ class User(UserMixin):
         username: str,
         email: str,
         password: str,
-        profile_pic: bytes,
+        profile_pic_hash: str | None,
         about_me: str,
-        datetime_created: str
+        datetime_created: str,
+        avatar_version: int = 0,
+        post_count: int = 0,
     ):
         self.id = user_uuid
         self.user_uuid = user_uuid
         self.username = username
         self.email = email
         self.password = password
-        self.profile_pic = profile_pic
+        self.profile_pic_hash = profile_pic_hash
         self.about_me = about_me
         self.datetime_created = datetime_created
+        self.avatar_version = avatar_version
+        self.post_count = post_count
+
+
+class SessionUser(UserMixin):
+    """The few fields of a user needed to render pages for them.
+
+    Loaded on every request for the logged in user, so it leaves out the profile picture
+    and password hash. Templates link to the picture through the avatar route, whose URL
+    changes with avatar_version.
+    """
+
+    def __init__(self, user_uuid: str, username: str, avatar_version: int):
+        self.id = user_uuid
+        self.user_uuid = user_uuid
+        self.username = username
+        self.avatar_version = avatar_version
 
 
 @login_manager.user_loader
-def user_loader(uuid: str) -> User | None:
-    from ..utils.db_interface import get_user_by_uuid
+def user_loader(uuid: str) -> SessionUser | None:
+    from ..utils.db_interface import get_session_user_by_uuid
 
-    if user_data := get_user_by_uuid(uuid):
-        user = User(**user_data)
-        return user
+    if user_data := get_session_user_by_uuid(uuid):
+        return SessionUser(**user_data)
     return None
 
+
+def inject_logged_in_user() -> dict:
+    """Template context processor providing logged_in_user, the session's user or None."""
+    from ..utils.db_interface import get_session_user_by_uuid
+
+    user = None
+    if 'user_uuid' in session:
+        if user_data := get_session_user_by_uuid(session['user_uuid']):
+            user = SessionUser(**user_data)
+    return dict(logged_in_user=user)
+
 def validate_user_login(email: str, password: str) -> tuple[bool, str]:
     """Validate a login attempt given a email and password.
 
@@ -52,15 +82,18 @@ def validate_user_login(email: str, password: str) -> tuple[bool, str]:
         The status is True if the login was a success.
         The status is False if the login was a fail, and the status message is set accordingly.
     """
-    from ..utils.db_interface import get_user_data_by_email
+    from ..utils.db_interface import check_user_password, get_user_credentials_by_email
+    from ..utils.rate_limit import throttle
+
+    try:
+        throttle(login_ip=request.remote_addr if has_request_context() else None, login_email=email.lower())
+    except TooManyRequests:
+        return (False, 'Too Many Attempts')
 
-    if (user_data := get_user_data_by_email(email)) is not None:
-        try:
-            password_hasher.verify(user_data['password'], password)
-        except VerifyMismatchError:
+    if (user_data := get_user_credentials_by_email(email)) is not None:
+        if not check_user_password(user_data, password):
             return (False, 'Incorrect Password')
-        else:
-            return (True, '')
+        return (True, '')
     return (False, 'Unrecognized Email')
 
 
@@ -74,9 +107,11 @@ class Post:
     tag3: str
     tag4: str
     tag5: str
-    image: bytes
+    image_hash: str | None
     datetime: str
     location: str
+    comment_count: int = 0
+    last_activity_at: str | None = None
 
 
 @dataclass
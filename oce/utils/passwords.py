@@ -0,0 +1,247 @@
+"""
+Argon2 password hashing in a pool of worker processes.
+
+Argon2 is meant to be expensive: each hash or verification takes tens of milliseconds
+of CPU and, with the default parameters, 64 MiB of memory. Run inline, it holds the web
+worker's thread (and the GIL) for the whole time. PasswordHashingPool runs hashes and
+verifications in worker processes instead, so they use every core, and bounds how many
+may be queued or running at once. Once the queue is full, callers wait for a slot for
+up to `timeout` seconds and then get HashingBusyError, so a burst of logins is turned
+away with a 503 instead of piling up memory and latency.
+
+Workers are started with the spawn method, which is safe from a multi-threaded server,
+and only when the first password arrives. With workers=0 the hashes run on the calling
+thread, still bounded by the queue. When a worker dies, e.g. killed for running out of
+memory, the workers are restarted and its calls run once more before giving up with
+HashingBusyError.
+"""
+
+import functools
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+# (time_cost, memory_cost, parallelism), picklable so it can be sent to the workers
+Argon2Parameters = tuple[int, int, int]
+
+
+class HashingBusyError(RuntimeError):
+    """Raised when no hashing slot became free before the timeout."""
+
+
+@functools.lru_cache(maxsize=8)
+def _hasher(parameters: Argon2Parameters) -> PasswordHasher:
+    time_cost, memory_cost, parallelism = parameters
+    return PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+def _hash(parameters: Argon2Parameters, password: str) -> str:
+    return _hasher(parameters).hash(password)
+
+
+def _verify(parameters: Argon2Parameters, password_hash: str, password: str) -> bool:
+    try:
+        return _hasher(parameters).verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+class PasswordHashingPool:
+    """Hashes and verifies passwords with Argon2 in worker processes.
+
+    Args:
+        workers: Worker processes. Defaults to None (one per core). 0 hashes on the
+            calling thread.
+        max_queue: Hashes queued or running at once. Defaults to None (four per worker).
+        timeout: Seconds to wait for a free slot before giving up. Defaults to 5.
+        time_cost: Argon2 iterations. Defaults to argon2-cffi's default.
+        memory_cost: Argon2 memory in KiB. Defaults to argon2-cffi's default.
+        parallelism: Argon2 lanes. Defaults to argon2-cffi's default.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_queue: int | None = None,
+        timeout: float = 5.0,
+        time_cost: int | None = None,
+        memory_cost: int | None = None,
+        parallelism: int | None = None,
+    ):
+        defaults = PasswordHasher()
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_queue = max_queue or 4 * max(self.workers, 1)
+        if self.workers < 0 or self.max_queue < 1:
+            raise ValueError(f'Invalid hashing pool bounds: workers={self.workers}, max_queue={self.max_queue}.')
+
+        self.timeout = timeout
+        self.parameters: Argon2Parameters = (
+            time_cost or defaults.time_cost,
+            memory_cost or defaults.memory_cost,
+            parallelism or defaults.parallelism,
+        )
+        self.pid = os.getpid()
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._stats = {
+            'in_flight': 0,
+            'hashes': 0,
+            'verifications': 0,
+            'waits': 0,
+            'rejected': 0,
+        }
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        """Start a fresh executor, replacing a broken one. Must be called with the lock held."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _acquire_slot(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['rejected'] += 1
+                raise HashingBusyError(
+                    f'No password hashing slot free after {self.timeout}s (max_queue={self.max_queue}).'
+                )
+        with self._lock:
+            self._stats['in_flight'] += 1
+
+    def _release_slot(self, _future: Future | None = None) -> None:
+        with self._lock:
+            self._stats['in_flight'] -= 1
+        self._slots.release()
+
+    def _replace_executor(self, broken: ProcessPoolExecutor | None) -> ProcessPoolExecutor:
+        """Replace a broken executor, unless another thread already did."""
+        with self._lock:
+            if self._executor is broken or self._executor is None:
+                return self._new_executor()
+            return self._executor
+
+    def _submit(self, function: Callable[..., Any], *args: Any) -> tuple[Future, ProcessPoolExecutor | None]:
+        """Queue a call, waiting for a slot first. The slot is freed when the call finishes.
+
+        Returns:
+            The call's future, and the executor running it, None when run inline.
+
+        Raises:
+            HashingBusyError: No slot became free within the timeout.
+        """
+        self._acquire_slot()
+        executor = None
+        try:
+            if self.workers == 0:
+                future = Future()
+                try:
+                    future.set_result(function(self.parameters, *args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                with self._lock:
+                    executor = self._executor or self._new_executor()
+                try:
+                    future = executor.submit(function, self.parameters, *args)
+                except BrokenProcessPool:
+                    # A worker died, e.g. killed for running out of memory
+                    executor = self._replace_executor(executor)
+                    future = executor.submit(function, self.parameters, *args)
+        except BaseException:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future, executor
+
+    def _result(self, future: Future, executor: ProcessPoolExecutor | None, function: Callable[..., Any], *args: Any):
+        """Wait for a call's result, running it once more if its worker died meanwhile.
+
+        Raises:
+            HashingBusyError: The worker died again on the second attempt.
+        """
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # Every call in flight on the dead worker's executor fails with it
+            self._replace_executor(executor)
+        future, executor = self._submit(function, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            self._replace_executor(executor)
+            raise HashingBusyError('A password hashing worker died twice in a row.') from e
+
+    def _call(self, function: Callable[..., Any], *args: Any):
+        return self._result(*self._submit(function, *args), function, *args)
+
+    def hash(self, password: str) -> str:
+        """Hash a password.
+
+        Raises:
+            HashingBusyError: The queue stayed full for the whole timeout.
+        """
+        with self._lock:
+            self._stats['hashes'] += 1
+        return self._call(_hash, password)
+
+    def hash_many(self, passwords: Iterable[str]) -> list[str]:
+        """Hash several passwords at once, spread over the workers.
+
+        Raises:
+            HashingBusyError: The queue stayed full for the whole timeout.
+        """
+        calls = []
+        for password in passwords:
+            with self._lock:
+                self._stats['hashes'] += 1
+            calls.append((*self._submit(_hash, password), password))
+        return [self._result(future, executor, _hash, password) for future, executor, password in calls]
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against its hash.
+
+        Returns:
+            True if the password matches, False if it does not or the hash is not a
+            valid Argon2 hash.
+
+        Raises:
+            HashingBusyError: The queue stayed full for the whole timeout.
+        """
+        with self._lock:
+            self._stats['verifications'] += 1
+        return self._call(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a hash was made with other Argon2 parameters than the pool's.
+
+        Only the hash's parameters are parsed, so this runs on the calling thread.
+        """
+        return _hasher(self.parameters).check_needs_rehash(password_hash)
+
+    def close(self) -> None:
+        """Stop the worker processes once the queued hashes are done."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the pool's bounds and counters.
+
+        Returns:
+            Mapping with the worker count, queue size, hashes in flight, and running
+            totals of hashes, verifications, waits for a slot and rejected calls.
+        """
+        with self._lock:
+            return {'workers': self.workers, 'max_queue': self.max_queue, **self._stats}
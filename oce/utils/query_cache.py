@@ -0,0 +1,157 @@
+"""
+Read-through cache for db_interface query results, shared across requests.
+
+Results are cached under a key made of the statement, its parameters and the current
+version of every table the statement reads. Writes bump the versions of the tables they
+touch, so stale entries are never looked up again and simply age out.
+
+Entries live in an in-process LRU with a TTL. Optionally a cachelib backend (e.g. a
+RedisCache) is layered behind it: table versions are then kept there too, so every
+gunicorn worker sees a write as soon as it is committed.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from cachelib import BaseCache
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL.
+
+    Args:
+        max_entries: Entries kept before the least recently used one is evicted.
+        ttl: Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        """Retrieve a value, or MISSING if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class QueryCache:
+    """Versioned query result cache.
+
+    Args:
+        max_entries: Entries kept in the in-process LRU. Defaults to 1024.
+        ttl: Seconds an entry stays valid. Defaults to 60.
+        shared: cachelib cache shared by all workers, or None to keep everything in
+            process. Without it, a write is only seen immediately by the worker that
+            made it; other workers see it once their entries expire. Defaults to None.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60, shared: BaseCache | None = None):
+        self.ttl = ttl
+        self.shared = shared
+        self._local = LRUCache(max_entries, ttl)
+        self._versions: dict[str, int] = {}
+        self._versions_lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def _table_versions(self, tables: Sequence[str]) -> tuple[int, ...]:
+        if self.shared is not None:
+            return tuple(version or 0 for version in self.shared.get_many(*(f'version:{t}' for t in tables)))
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def _key(self, statement_name: str, params: Sequence, tables: Sequence[str]) -> str:
+        versions = self._table_versions(tables)
+        digest = hashlib.sha1(repr((tuple(params), versions)).encode()).hexdigest()
+        return f'query:{statement_name}:{digest}'
+
+    def get(self, statement_name: str, params: Sequence, tables: Sequence[str]) -> tuple[str, Any]:
+        """Look up a query result.
+
+        Args:
+            statement_name: Name of the statement.
+            params: Parameters the statement runs with.
+            tables: Tables the statement reads, in a stable order.
+
+        Returns:
+            The cache key, to hand to set() on a miss, and the cached result or MISSING.
+        """
+        key = self._key(statement_name, params, tables)
+
+        value = self._local.get(key)
+        if value is not MISSING:
+            self._stats['hits'] += 1
+            return key, value
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._stats['shared_hits'] += 1
+                self._local.set(key, value[0])
+                return key, value[0]
+
+        self._stats['misses'] += 1
+        return key, MISSING
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a query result under a key obtained from get()."""
+        self._local.set(key, value)
+        if self.shared is not None:
+            # Wrapped so that a cached None is distinguishable from an absent key.
+            self.shared.set(key, (value,), timeout=int(self.ttl))
+
+    def bump(self, tables: Iterable[str]) -> None:
+        """Invalidate every cached result reading any of the tables."""
+        for table in tables:
+            if self.shared is not None:
+                self.shared.inc(f'version:{table}')
+            else:
+                with self._versions_lock:
+                    self._versions[table] = self._versions.get(table, 0) + 1
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of hit, miss and eviction counters.
+
+        Returns:
+            Mapping with local hits, shared backend hits, misses, LRU evictions and
+            expirations, and the number of entries held in process.
+        """
+        return {
+            **self._stats,
+            'evictions': self._local.evictions,
+            'expirations': self._local.expirations,
+            'entries': len(self._local),
+        }
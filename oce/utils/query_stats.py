@@ -0,0 +1,66 @@
+"""
+Per-request statistics of the statements db_interface runs.
+
+db_interface records every statement it sends to the database, with how long it took
+and how many rows it returned or changed, in a QueryStats kept on flask.g. At the end
+of a request the totals go into a Server-Timing header, and statements run more often
+than a threshold are logged as likely N+1 queries.
+
+Only totals per statement are kept, so a long-running script that runs millions of
+statements in one app context uses no more memory than a single request.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class StatementStats:
+    """Totals for one statement.
+
+    Attributes:
+        count: Times the statement ran.
+        seconds: Time spent running it, including fetching the rows.
+        rows: Rows returned by queries, or changed by writes.
+        slowest: Duration of the slowest run in seconds.
+    """
+
+    count: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    slowest: float = 0.0
+
+
+class QueryStats:
+    """Totals of the statements run during one request, by statement name."""
+
+    def __init__(self):
+        self.statements: dict[str, StatementStats] = {}
+
+    def record(self, name: str, seconds: float, rows: int) -> None:
+        """Add one run of a statement."""
+        stats = self.statements.get(name)
+        if stats is None:
+            stats = self.statements[name] = StatementStats()
+        stats.count += 1
+        stats.seconds += seconds
+        stats.rows += rows
+        stats.slowest = max(stats.slowest, seconds)
+
+    @property
+    def count(self) -> int:
+        return sum(stats.count for stats in self.statements.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(stats.seconds for stats in self.statements.values())
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """List the statements that ran more than threshold times, most repeated first."""
+        return sorted(
+            ((name, stats.count) for name, stats in self.statements.items() if stats.count > threshold),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+    def server_timing(self) -> str:
+        """Format the totals as a Server-Timing header value."""
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
@@ -0,0 +1,212 @@
+"""
+Token-bucket rate limits for logins and signups.
+
+Every login or signup attempt costs an Argon2 hash, so a single client sending them in
+a loop can keep every core busy. The routes check these limits first, and an attempt
+over its limit is answered with 429 Too Many Requests and a Retry-After header before
+any query or hash runs.
+
+A Limit of N attempts per S seconds is a bucket of N tokens refilled at N/S tokens a
+second. Buckets are kept in the generic cell rate algorithm (GCRA) form: a single
+timestamp per key, the time at which the bucket will be full again. That makes a check
+one read and one write, whether the timestamps are kept in a dict in process
+(MemoryBucketStore) or in an SQLite file shared by every worker (SQLiteBucketStore).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import NamedTuple
+
+from flask import current_app
+from werkzeug.exceptions import TooManyRequests
+
+
+class Limit(NamedTuple):
+    """At most `attempts` attempts in any `seconds` long window, with bursts of up to `attempts`."""
+
+    attempts: int
+    seconds: float
+
+
+class MemoryBucketStore:
+    """Buckets of one process, in a dict.
+
+    Checks take no lock. Two threads racing on the same key can both be let through on
+    its last token, which is harmless for a limit meant to protect the CPU.
+
+    Args:
+        max_keys: Keys kept before full buckets are dropped. Defaults to 100000.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._full_at: dict[str, float] = {}
+        self._prune_at = max_keys
+
+    def take(self, key: str, interval: float, tolerance: float) -> float:
+        """Take a token from a bucket.
+
+        Args:
+            key: Bucket to take from.
+            interval: Seconds it takes to refill one token.
+            tolerance: Seconds it takes to refill the whole bucket.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        full_at = max(self._full_at.get(key, now), now) + interval
+        if (wait := full_at - now - tolerance) > 0:
+            return wait
+
+        self._full_at[key] = full_at
+        if len(self._full_at) > self._prune_at:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        """Drop the buckets that are full again, which behave like missing ones."""
+        for key, full_at in list(self._full_at.items()):
+            if full_at <= now:
+                self._full_at.pop(key, None)
+        # Buckets still filling stay, so wait for more keys before scanning again
+        self._prune_at = max(self.max_keys, 2 * len(self._full_at))
+
+
+class SQLiteBucketStore:
+    """Buckets in an SQLite file, shared by every worker process on the host.
+
+    A check is a single upsert, which SQLite runs atomically across processes.
+
+    Args:
+        path: SQLite file to keep the buckets in. Created if missing.
+        busy_timeout: Milliseconds to wait on a locked file. Defaults to 5000.
+    """
+
+    def __init__(self, path: str | Path, busy_timeout: int = 5000):
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, full_at REAL NOT NULL) WITHOUT ROWID;'
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            con = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            con.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)};')
+            con.execute('PRAGMA journal_mode = WAL;')
+            con.execute('PRAGMA synchronous = NORMAL;')
+            self._local.con, self._local.pid, self._local.takes = con, os.getpid(), 0
+        return self._local.con
+
+    def take(self, key: str, interval: float, tolerance: float) -> float:
+        """Take a token from a bucket. See MemoryBucketStore.take()."""
+        con = self._connect()
+        # Wall-clock time, since the buckets are shared between processes
+        now = time.time()
+        taken = con.execute(
+            'INSERT INTO rate_limits (key, full_at) VALUES (?1, ?2 + ?3) '
+            'ON CONFLICT (key) DO UPDATE SET full_at = MAX(full_at, ?2) + ?3 '
+            'WHERE MAX(full_at, ?2) + ?3 - ?2 <= ?4 '
+            'RETURNING full_at;',
+            (key, now, interval, tolerance),
+        ).fetchone()
+
+        self._local.takes += 1
+        if self._local.takes % 1000 == 0:
+            con.execute('DELETE FROM rate_limits WHERE full_at <= ?;', (now,))
+
+        if taken is not None:
+            return 0.0
+        (full_at,) = con.execute('SELECT full_at FROM rate_limits WHERE key = ?;', (key,)).fetchone()
+        return max(full_at, now) + interval - now - tolerance
+
+
+class RateLimiter:
+    """Named limits, each with a bucket per key, e.g. per IP address or per email.
+
+    Args:
+        limits: Limit of each rule by name. A rule whose limit is None is not limited.
+        store: Where the buckets are kept. Defaults to a MemoryBucketStore.
+    """
+
+    def __init__(self, limits: Mapping[str, Limit | None], store: MemoryBucketStore | SQLiteBucketStore | None = None):
+        self.limits = {rule: Limit(*limit) for rule, limit in limits.items() if limit is not None}
+        self.store = store or MemoryBucketStore()
+        self._lock = threading.Lock()
+        self._stats = {f'{rule}_{outcome}': 0 for rule in limits for outcome in ('allowed', 'rejected')}
+
+    def hit(self, rule: str, key: str) -> float:
+        """Count an attempt against a rule's bucket for a key.
+
+        Returns:
+            0 if the attempt is allowed, otherwise the seconds until it would be.
+        """
+        if (limit := self.limits.get(rule)) is None:
+            return 0.0
+        wait = self.store.take(f'{rule}:{key}', limit.seconds / limit.attempts, limit.seconds)
+        with self._lock:
+            self._stats[f"{rule}_{'rejected' if wait else 'allowed'}"] += 1
+        return wait
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the allowed and rejected attempts of each rule, e.g. login_ip_rejected."""
+        with self._lock:
+            return dict(self._stats)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Retrieve the app's rate limiter, creating it on first use.
+
+    The rules are the app's RATE_LIMIT_LOGIN_PER_IP, RATE_LIMIT_LOGIN_PER_EMAIL and
+    RATE_LIMIT_SIGNUP_PER_IP settings, each an (attempts, seconds) pair or None. The
+    buckets are kept in RATE_LIMIT_STORE, an SQLite file shared by all workers, or in
+    process when it is None.
+    """
+    limiter = current_app.extensions.get('oce_rate_limiter')
+    if limiter is None:
+        config = current_app.config
+        store = SQLiteBucketStore(config['RATE_LIMIT_STORE']) if config.get('RATE_LIMIT_STORE') else None
+        limiter = current_app.extensions.setdefault(
+            'oce_rate_limiter',
+            RateLimiter(
+                {
+                    'login_ip': config.get('RATE_LIMIT_LOGIN_PER_IP'),
+                    'login_email': config.get('RATE_LIMIT_LOGIN_PER_EMAIL'),
+                    'signup_ip': config.get('RATE_LIMIT_SIGNUP_PER_IP'),
+                },
+                store,
+            ),
+        )
+    return limiter
+
+
+def get_rate_limit_stats() -> dict[str, int]:
+    """Retrieve the allowed and rejected attempts of each rate limit in this process."""
+    return get_rate_limiter().stats()
+
+
+def throttle(**keys: str | None) -> None:
+    """Count an attempt against several rules, stopping at the first one over its limit.
+
+    Args:
+        **keys: Key of the attempt for each rule, e.g. login_ip='203.0.113.7'. Rules
+            whose key is None or empty are skipped.
+
+    Raises:
+        TooManyRequests: A rule is over its limit. Flask answers it with a 429 and a
+            Retry-After header.
+    """
+    limiter = get_rate_limiter()
+    for rule, key in keys.items():
+        if key and (wait := limiter.hit(rule, key)):
+            raise TooManyRequests(
+                'Too many attempts, please wait a moment before trying again.',
+                retry_after=max(int(wait + 0.999), 1),
+            )
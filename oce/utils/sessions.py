@@ -0,0 +1,240 @@
+"""
+Server-side sessions kept in an indexed SQLite table.
+
+Flask-Session's filesystem backend keeps one file per session and never removes them,
+so the directory only grows and every request opens, reads and rewrites a file.
+SQLiteSessionInterface keeps the sessions in one SQLite file instead: a row per session
+with its msgpack data and an expiry time, and an index on the expiry time.
+
+- A request reads its session with one primary key lookup. Expired rows are ignored.
+- A session is only written back when its data changed, or when its expiry is more than
+  `refresh_after` seconds old, so most requests of a logged in user write nothing.
+  Visitors who never store anything in the session get no row at all.
+- A daemon thread in each process deletes expired sessions every `sweep_interval`
+  seconds, `sweep_batch` rows per transaction so that requests never wait long on the
+  write lock.
+
+Sessions are only created once something is stored in them, e.g. at login or when a
+message is flashed. Until then a visitor has no cookie and costs no session I/O, and the
+pages marked with @cacheable_when_anonymous are sent with a public Cache-Control header
+so that shared caches and CDNs can serve them. Static files never open a session, and a
+cookie whose session expired or was cleared is deleted so that the browser stops
+sending it.
+
+The file defaults to sessions.db in the app's instance folder, which unlike the static
+folder is not served to browsers, and is shared by every worker on the host.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from flask import Flask, Request, Response, request
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+
+
+def cacheable_when_anonymous(view):
+    """Mark a view whose page is the same for every visitor without a session.
+
+    Responses to such visitors get Cache-Control: public with PUBLIC_PAGE_MAX_AGE.
+    """
+    view.cacheable_when_anonymous = True
+    return view
+
+
+class SQLiteSession(ServerSideSession):
+    """A session, with the data and expiry it was stored with when it was opened."""
+
+    stored_data: bytes | None = None
+    stored_expiry: float = 0.0
+    # Opened for a static file, and never saved
+    detached: bool = False
+
+
+class SQLiteSessionInterface(ServerSideSessionInterface):
+    """Flask session interface storing the sessions in an SQLite file.
+
+    The file is the app's SESSION_SQLITE_PATH, or sessions.db in its instance folder
+    when that is None. It is looked up when a thread first opens it, so tests and
+    scripts may change it after the app was created.
+
+    Args:
+        app: The Flask app.
+        refresh_after: Seconds after which an unchanged session's expiry is written
+            back. Defaults to 3600.
+        sweep_interval: Seconds between sweeps of the expired sessions. None disables
+            the sweeper thread. Defaults to 300.
+        sweep_batch: Sessions deleted per transaction by a sweep. Defaults to 1000.
+        **kwargs: Passed on to Flask-Session's ServerSideSessionInterface.
+    """
+
+    session_class = SQLiteSession
+    # Expiry is handled here, so Flask-Session registers no cleanup of its own
+    ttl = True
+
+    def __init__(
+        self,
+        app: Flask,
+        refresh_after: float = 3600,
+        sweep_interval: float | None = 300,
+        sweep_batch: int = 1000,
+        **kwargs: Any,
+    ):
+        super().__init__(app, **kwargs)
+        self.refresh_after = refresh_after
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._local = threading.local()
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {'reads': 0, 'writes': 0, 'skipped_writes': 0, 'deletes': 0, 'swept': 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    @property
+    def path(self) -> Path:
+        return Path(self.app.config.get('SESSION_SQLITE_PATH') or Path(self.app.instance_path) / 'sessions.db')
+
+    def _connect(self) -> sqlite3.Connection:
+        """The calling thread's connection to the session file, opened on first use."""
+        path = self.path
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.by_path, self._local.pid = {}, os.getpid()
+        con = self._local.by_path.get(path)
+        if con is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            con.execute('PRAGMA busy_timeout = 5000;')
+            con.execute('PRAGMA journal_mode = WAL;')
+            con.execute('PRAGMA synchronous = NORMAL;')
+            con.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID;'
+            )
+            con.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);')
+            self._local.by_path[path] = con
+        return con
+
+    def _read(self, store_id: str) -> tuple[bytes, float] | None:
+        self._count('reads')
+        return self._connect().execute(
+            'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?;', (store_id, time.time())
+        ).fetchone()
+
+    def open_session(self, app: Flask, request: Request) -> SQLiteSession:
+        self._start_sweeper()
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            session = self.session_class(sid=None)
+            session.detached = True
+            return session
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and (row := self._read(self._get_store_id(sid))) is not None:
+            data, expires_at = row
+            session = self.session_class(self.serializer.decode(data), sid=sid)
+            session.stored_data, session.stored_expiry = data, expires_at
+            return session
+        return self.session_class(sid=self._generate_sid(self.sid_length), permanent=self.permanent)
+
+    def save_session(self, app: Flask, session: SQLiteSession, response: Response) -> None:
+        if session.detached:
+            return
+        super().save_session(app, session, response)
+
+        had_cookie = self.get_cookie_name(app) in request.cookies
+        if had_cookie and not session and not session.modified:
+            # The cookie's session expired or was never stored, stop the browser sending it
+            response.delete_cookie(
+                self.get_cookie_name(app), domain=self.get_cookie_domain(app), path=self.get_cookie_path(app)
+            )
+        elif (
+            not had_cookie
+            and not session
+            and request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+            and 'Cache-Control' not in response.headers
+            and getattr(app.view_functions.get(request.endpoint), 'cacheable_when_anonymous', False)
+        ):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config.get('PUBLIC_PAGE_MAX_AGE', 300)
+
+    def should_set_storage(self, app: Flask, session: SQLiteSession) -> bool:
+        # Compare the encoded data too, as a nested value may change without marking
+        # the session modified
+        session.encoded = self.serializer.encode(session)
+        if session.modified or session.encoded != session.stored_data:
+            return True
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        if expires_at - session.stored_expiry >= self.refresh_after:
+            return True
+        self._count('skipped_writes')
+        return False
+
+    def _retrieve_session_data(self, store_id: str) -> dict | None:
+        row = self._read(store_id)
+        return self.serializer.decode(row[0]) if row is not None else None
+
+    def _upsert_session(self, session_lifetime: timedelta, session: SQLiteSession, store_id: str) -> None:
+        data = getattr(session, 'encoded', None) or self.serializer.encode(session)
+        expires_at = time.time() + session_lifetime.total_seconds()
+        self._connect().execute(
+            'INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at;',
+            (store_id, data, expires_at),
+        )
+        session.stored_data, session.stored_expiry = data, expires_at
+        self._count('writes')
+
+    def _delete_session(self, store_id: str) -> None:
+        self._connect().execute('DELETE FROM sessions WHERE id = ?;', (store_id,))
+        self._count('deletes')
+
+    def sweep(self) -> int:
+        """Delete the expired sessions, one batch per transaction.
+
+        Returns:
+            Number of sessions deleted.
+        """
+        con = self._connect()
+        swept = 0
+        while True:
+            deleted = con.execute(
+                'DELETE FROM sessions WHERE id IN '
+                '(SELECT id FROM sessions WHERE expires_at <= ? ORDER BY expires_at LIMIT ?);',
+                (time.time(), self.sweep_batch),
+            ).rowcount
+            swept += deleted
+            if deleted < self.sweep_batch:
+                break
+        self._count('swept', swept)
+        return swept
+
+    def _start_sweeper(self) -> None:
+        """Start this process's sweeper thread, once. Forked workers start their own."""
+        if self.sweep_interval is None or self._sweeper_pid == os.getpid():
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_forever, name='session-sweeper', daemon=True).start()
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                self.app.logger.exception('Sweeping expired sessions failed.')
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the session reads, writes, skipped writes, deletes and swept sessions."""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,162 @@
+"""
+Dialect-aware registry of the SQL statements run by db_interface.
+
+Statements are written once as templates in which `{users}`, `{posts}`, `{comments}` and
+`{post_tags}` stand for table names and `?` marks a parameter. The SQLite full-text
+indexes are `{posts_fts}` and `{comments_fts}`; PostgreSQL searches tsvector columns of
+the tables themselves. `{schema_migrations}` records the applied schema migrations.
+Statements are compiled for the active dialect when registered, so no SQL string work
+happens when a query runs.
+
+On SQLite the compiled text is handed to the driver as-is; sqlite3 caches the compiled
+program per connection, keyed by that text. On PostgreSQL every statement also gets a
+PREPARE/EXECUTE pair so it can run as a server-side prepared statement, and INSERT
+statements get a multi-row form for bulk loading.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Literal, TypeAlias
+
+Dialect: TypeAlias = Literal['sqlite', 'postgresql']
+Fetch: TypeAlias = Literal['one', 'all']
+
+_VALUES_LIST = re.compile(r'VALUES \(%s(?:, %s)*\)')
+_TABLE_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+TABLE_NAMES = {
+    'sqlite': {
+        'users': 'USERS',
+        'posts': 'POSTS',
+        'comments': 'COMMENTS',
+        'post_tags': 'POST_TAGS',
+        'posts_fts': 'POSTS_FTS',
+        'comments_fts': 'COMMENTS_FTS',
+        'schema_migrations': 'SCHEMA_MIGRATIONS',
+    },
+    'postgresql': {
+        'users': 'users',
+        'posts': 'posts',
+        'comments': 'comments',
+        'post_tags': 'post_tags',
+        'schema_migrations': 'schema_migrations',
+    },
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Statement:
+    name: str
+    sql: str
+    fetch: Fetch | None
+    prepare_sql: str | None = None
+    execute_sql: str | None = None
+    many_sql: str | None = None
+    tables: tuple[str, ...] = ()
+    cacheable: bool = False
+
+
+class StatementRegistry:
+    """Compiled statements for one SQL dialect, looked up by name.
+
+    Args:
+        dialect: Either 'sqlite' or 'postgresql'.
+    """
+
+    def __init__(self, dialect: Dialect):
+        if dialect not in TABLE_NAMES:
+            raise ValueError(f'Unknown SQL dialect: {dialect}')
+        self.dialect = dialect
+        self._tables = TABLE_NAMES[dialect]
+        self._statements: dict[str, Statement] = {}
+
+    def add(self, name: str, template: str, fetch: Fetch | None = None, cache: bool = True) -> Statement:
+        """Compile and register a statement.
+
+        Args:
+            name: Name the statement is run by.
+            template: SQL template. Must not contain `?` other than as parameter markers.
+            fetch: 'one' or 'all' for queries returning rows, None for writes. Defaults to None.
+            cache: Whether the query cache may hold the statement's results. Ignored for
+                writes. Defaults to True.
+
+        Raises:
+            ValueError: A statement with the same name was already registered.
+
+        Returns:
+            The compiled statement.
+        """
+        if name in self._statements:
+            raise ValueError(f'Statement already registered: {name}')
+
+        statement = self._statements[name] = self._compile(name, template, fetch, cache)
+        return statement
+
+    def _compile(self, name: str, template: str, fetch: Fetch | None, cache: bool = True) -> Statement:
+        """Compile a statement template for this registry's dialect."""
+        sql = template.format(**self._tables)
+        # The tables a statement reads or writes, for query cache keys and invalidation.
+        tables = tuple(sorted(set(_TABLE_PLACEHOLDER.findall(template))))
+        cacheable = cache and fetch is not None
+        if self.dialect == 'sqlite':
+            statement = Statement(name, sql, fetch, many_sql=sql, tables=tables, cacheable=cacheable)
+        else:
+            parts = sql.split('?')
+            param_count = len(parts) - 1
+            prepared_name = 'oce_' + re.sub(r'\W', '_', name)
+            if len(prepared_name) > 63 or not name.isidentifier():
+                # Keep distinct names distinct within PostgreSQL's 63 character identifier limit.
+                prepared_name = f'{prepared_name[:54]}_{hashlib.sha1(name.encode()).hexdigest()[:8]}'
+
+            numbered = parts[0]
+            for i, part in enumerate(parts[1:], start=1):
+                numbered += f'${i}{part}'
+
+            escaped = '%s'.join(part.replace('%', '%%') for part in parts)
+            statement = Statement(
+                name,
+                escaped,
+                fetch,
+                prepare_sql=f'PREPARE {prepared_name} AS {numbered}',
+                execute_sql=(
+                    f'EXECUTE {prepared_name} ({", ".join(["%s"] * param_count)});'
+                    if param_count
+                    else f'EXECUTE {prepared_name};'
+                ),
+                # Multi-row form for psycopg2.extras.execute_values.
+                many_sql=_VALUES_LIST.sub('VALUES %s', escaped, count=1) if _VALUES_LIST.search(escaped) else None,
+                tables=tables,
+                cacheable=cacheable,
+            )
+        return statement
+
+    def get_or_add(self, name: str, template: str, fetch: Fetch | None = None, cache: bool = True) -> Statement:
+        """Retrieve a statement, compiling and registering it on first use.
+
+        Meant for statements whose shape depends on the call, e.g. the number of values
+        in an IN list, so each variant is still compiled only once.
+
+        Args:
+            name: Name the statement is run by. Must identify the template.
+            template: SQL template, see add().
+            fetch: 'one' or 'all' for queries returning rows, None for writes. Defaults to None.
+            cache: See add(). Defaults to True.
+
+        Returns:
+            The compiled statement.
+        """
+        statement = self._statements.get(name)
+        if statement is None:
+            statement = self._compile(name, template, fetch, cache)
+            statement = self._statements.setdefault(name, statement)
+        return statement
+
+    def __getitem__(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._statements
+
+    def __iter__(self):
+        return iter(self._statements.values())
@@ -0,0 +1,27 @@
+import pytest
+
+from oce import create_app
+from oce.utils.db_interface import close_thread_connections
+from oce.utils.migrations import migrate
+
+
+@pytest.fixture
+def unmigrated_app(tmp_path):
+    """The site with its database, images and sessions in tmp_path, and no schema yet."""
+    app = create_app()
+    app.config.update({
+        'TESTING': True,
+        'DB_NAME': str(tmp_path / 'oce.db'),
+        'BLOB_STORE_DIR': str(tmp_path / 'blobs'),
+        'SESSION_SQLITE_PATH': str(tmp_path / 'sessions.db'),
+    })
+    yield app
+    close_thread_connections()
+
+
+@pytest.fixture
+def app(unmigrated_app):
+    """The site on a fresh, migrated database in tmp_path."""
+    with unmigrated_app.app_context():
+        migrate()
+    return unmigrated_app
@@ -0,0 +1,67 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from oce.utils.db_interface import create_user, get_user_by_email
+from oce.utils.images import DEFAULT_AVATAR, file_digest
+
+
+def make_user(app, picture: bytes) -> dict:
+    with app.app_context():
+        create_user('Avatar', 'avatar@email.com', 'password', profile_pic=picture)
+        return get_user_by_email('avatar@email.com')
+
+
+def test_avatar_is_cacheable(app):
+    user = make_user(app, b'\x89PNG\r\n\x1a\n not really a png')
+    client = app.test_client()
+
+    response = client.get(f"/avatar/{user['user_uuid']}/0")
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == b'\x89PNG\r\n\x1a\n not really a png'
+    assert response.get_etag() == (user['profile_pic_hash'], False)
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert response.cache_control.immutable
+
+    response = client.get(f"/avatar/{user['user_uuid']}/0", headers={'If-None-Match': f'"{user["profile_pic_hash"]}"'})
+    assert response.status_code == 304
+
+    response = client.get(f"/avatar/{user['user_uuid']}/3?size=40")
+    assert response.status_code == 302
+    assert response.location == f"/avatar/{user['user_uuid']}/0?size=40"
+
+    response = client.get(f"/avatar/{user['user_uuid']}/3?version=1&user_uuid=x&other=y")
+    assert response.status_code == 302
+    assert response.location == f"/avatar/{user['user_uuid']}/0"
+
+    assert client.get('/avatar/nobody/0').status_code == 404
+
+
+def test_avatar_thumbnail(app):
+    Image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), 'red').save(buffer, 'JPEG')
+    user = make_user(app, buffer.getvalue())
+
+    response = app.test_client().get(f"/avatar/{user['user_uuid']}/0?size=64")
+    assert response.status_code == 200
+    assert response.get_etag() == (f"{user['profile_pic_hash']}-80", False)
+    with Image.open(io.BytesIO(response.data)) as thumbnail:
+        assert thumbnail.size == (80, 80)
+
+
+def test_default_avatar_is_shared(app):
+    with app.app_context():
+        create_user('Default', 'default@email.com', 'password')
+        user = get_user_by_email('default@email.com')
+    assert user['profile_pic_hash'] is None
+
+    response = app.test_client().get(f"/avatar/{user['user_uuid']}/0")
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    default = Path(app.static_folder) / DEFAULT_AVATAR
+    assert response.data == default.read_bytes()
+    assert response.get_etag() == (file_digest(default), False)
+    assert not any(Path(app.config['BLOB_STORE_DIR']).glob('??/??/*'))
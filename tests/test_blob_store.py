@@ -0,0 +1,34 @@
+import hashlib
+import io
+
+import pytest
+
+from oce.utils.blob_store import BlobStore
+
+
+def test_put_deduplicates_and_shards(tmp_path):
+    store = BlobStore(tmp_path)
+    digest = store.put(b'image bytes')
+    assert digest == hashlib.sha256(b'image bytes').hexdigest()
+    assert store.put(b'image bytes') == digest
+    assert store.path(digest) == tmp_path / digest[:2] / digest[2:4] / digest
+    assert store.get(digest) == b'image bytes'
+    assert list(store) == [digest]
+
+
+def test_put_stream_matches_put(tmp_path):
+    store = BlobStore(tmp_path)
+    data = bytes(range(256)) * 1000
+    digest = store.put_stream(io.BytesIO(data))
+    assert digest == store.put(data)
+    with store.open(digest) as fp:
+        assert fp.read() == data
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith('.upload-')] == []
+
+
+def test_rejects_paths_that_are_not_digests(tmp_path):
+    store = BlobStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.path('../../etc/passwd')
+    assert 'a' * 64 not in store
+    store.delete('a' * 64)
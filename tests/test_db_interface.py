@@ -7,34 +7,28 @@ from argon2.exceptions import VerifyMismatchError
 
 from oce import create_app
 from oce.utils.db_interface import *
-from oce.utils.db_interface import _dict_factory
+from oce.utils.db_interface import _dict_factory, _statements
+from oce.utils.migrations import migrate
 
 
 @pytest.fixture(scope='module')
-def app():
+def app(tmp_path_factory):
     app = create_app()
-    app.config.update({'TESTING': True, 'DB_NAME': 'test.db'})
+    app.config.update({'TESTING': True, 'DB_NAME': 'test.db', 'BLOB_STORE_DIR': str(tmp_path_factory.mktemp('blobs'))})
 
     yield app
 
 
 @pytest.fixture(scope='module')
-def setup_database():
+def setup_database(app):
     db_path = Path('oce') / 'static' / 'test.db'
+    with app.app_context():
+        migrate()
     con = sqlite3.connect(db_path)
     con.row_factory = _dict_factory
     cur = con.cursor()
-    cur.execute(
-        'CREATE TABLE USERS(user_uuid TEXT PRIMARY KEY, username TEXT NOT NULL, email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, profile_pic BLOB NOT NULL, about_me TEXT NOT NULL);'
-    )
-    cur.execute(
-        'CREATE TABLE POSTS(post_uuid TEXT PRIMARY KEY, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, tag1 TEXT, tag2 TEXT, tag3 TEXT, tag4 TEXT, tag5 TEXT, image BLOB, datetime TEXT NOT NULL, location TEXT);'
-    )
-    cur.execute(
-        'CREATE TABLE COMMENTS(comment_uuid TEXT PRIMARY KEY, parent_post_uuid TEXT NOT NULL, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, datetime TEXT NOT NULL);'
-    )
-    con.commit()
     yield cur
+    close_thread_connections()
     con.close()
     db_path.unlink()
 
@@ -81,7 +75,7 @@ def test_update_user_profile_pic(app, setup_database):
     with app.app_context():
         u = User(**get_user_by_email('new.email@tsest.com'))
         update_user_profile_pic(u, b'\x89PNG')
-        assert b'\x89PNG' in get_user_by_email('new.email@tsest.com').values()
+        assert get_user_profile_pic(u.user_uuid) == b'\x89PNG'
 
 def test_update_user_about_me(app, setup_database):
     with app.app_context():
@@ -174,3 +168,346 @@ def test_delete_comment(app, setup_database):
         ...
 
 # endregion
+
+
+def test_sqlite_connection_reused_across_app_contexts(app, setup_database):
+    with app.app_context():
+        con = get_db()
+        close_db()
+    with app.app_context():
+        assert get_db() is con
+
+
+def test_sqlite_connection_uses_wal(app, setup_database):
+    with app.app_context():
+        con = get_db()
+        assert con.execute('PRAGMA journal_mode;').fetchone()['journal_mode'] == 'wal'
+        assert con.execute('PRAGMA synchronous;').fetchone()['synchronous'] == 1  # NORMAL
+
+
+def test_get_posts_page_walks_feed_newest_first(app, setup_database):
+    with app.app_context():
+        for i in range(5):
+            create_post('PagingAuthor', f'paging post {i}')
+        rows = get_db().execute('SELECT post_uuid, datetime FROM POSTS;').fetchall()
+        expected = [
+            post['post_uuid']
+            for post in sorted(rows, key=lambda p: (p['datetime'], p['post_uuid']), reverse=True)
+        ]
+
+        seen = []
+        page, older, newer = get_posts_page(limit=2)
+        assert newer is None
+        seen += [post['post_uuid'] for post in page]
+        while older:
+            page, older, newer = get_posts_page(limit=2, cursor=older)
+            assert newer is not None
+            seen += [post['post_uuid'] for post in page]
+        assert seen == expected
+
+        page, older, newer = get_posts_page(limit=2, cursor=newer)
+        assert [post['post_uuid'] for post in page] == expected[2:4]
+
+
+def test_get_posts_page_rejects_malformed_cursor(app, setup_database):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            get_posts_page(cursor='not-a-cursor')
+
+
+def test_post_tags_queries(app, setup_database):
+    with app.app_context():
+        create_post('TagAuthor', 'tagged post one')
+        create_post('TagAuthor', 'tagged post two')
+        one, two = (
+            Post(**post)
+            for post in sorted(
+                get_db().execute("SELECT * FROM POSTS WHERE author_uuid = 'TagAuthor';").fetchall(),
+                key=lambda post: post['text_content'],
+            )
+        )
+        update_post_tags(one, ('block1', 'block2', 'None', 'None', 'None'))
+        update_post_tags(two, ('block2', 'block3', 'block3', '', 'None'))
+
+        assert [post['post_uuid'] for post in get_posts_by_tag('block1')] == [one.post_uuid]
+        assert {post['post_uuid'] for post in get_posts_by_tags(['block1', 'block3'])} == {one.post_uuid, two.post_uuid}
+        assert [post['post_uuid'] for post in get_posts_by_tags(['block2', 'block3'], match='all')] == [two.post_uuid]
+        assert get_tag_counts()[0] == {'tag': 'block2', 'post_count': 2}
+
+        delete_post(one)
+        assert get_posts_by_tag('block1') == []
+        assert {'tag': 'block2', 'post_count': 1} in get_tag_counts()
+
+
+def test_create_posts_and_comments_in_bulk(app, setup_database):
+    with app.app_context():
+        posts = (
+            {'author_uuid': 'BulkAuthor', 'text_content': f'bulk post {i}', 'tag1': 'bulk'}
+            for i in range(25)
+        )
+        assert create_posts(posts, chunk_size=10) == 25
+        assert len(get_posts_by_tag('bulk')) == 25
+
+        parent = get_posts_by_tag('bulk')[0]
+        comments = (
+            {'parent_post_uuid': parent['post_uuid'], 'author_uuid': 'BulkAuthor', 'text_content': f'comment {i}'}
+            for i in range(7)
+        )
+        assert create_comments(comments, chunk_size=3) == 7
+        assert len(get_comments_by_parent_post(Post(**parent))) == 7
+
+
+def test_create_users_in_bulk(app, setup_database, setup_password_hasher):
+    with app.app_context():
+        users = [
+            {'username': f'bulk{i}', 'email': f'bulk{i}@email.com', 'password': 'hashed', 'profile_pic': b''}
+            for i in range(3)
+        ]
+        assert create_users(users, hash_passwords=False) == 3
+        assert get_user_by_email('bulk2@email.com')['password'] == 'hashed'
+
+        assert create_users([{'username': 'bulk3', 'email': 'bulk3@email.com', 'password': 'secret'}]) == 1
+        assert setup_password_hasher.verify(get_user_by_email('bulk3@email.com')['password'], 'secret')
+
+
+def test_update_user_changes_several_fields_at_once(app, setup_database):
+    with app.app_context():
+        u = User(**get_user_by_email('bulk0@email.com'))
+        assert update_user(u, username='Renamed', about_me='Multi-field') is True
+        row = get_user_by_email('bulk0@email.com')
+        assert (row['username'], row['about_me']) == ('Renamed', 'Multi-field')
+        assert u.username == 'Renamed'
+
+        assert update_user(u, username='Renamed') is False
+        with pytest.raises(ValueError):
+            update_user(u, user_uuid='not-allowed')
+
+
+def test_update_post_changes_fields_and_tags(app, setup_database):
+    with app.app_context():
+        p = Post(**get_posts_by_tag('bulk')[0])
+        assert update_post(p, text_content='edited', tag1='edited-tag', location='Library') is True
+        row = get_post_by_uuid(p.post_uuid)
+        assert (row['text_content'], row['tag1'], row['location']) == ('edited', 'edited-tag', 'Library')
+        assert [post['post_uuid'] for post in get_posts_by_tag('edited-tag')] == [p.post_uuid]
+
+        assert update_post(p, text_content='edited') is False
+
+
+def test_session_user_and_credentials_projections(app, setup_database):
+    with app.app_context():
+        u = User(**get_user_by_email('bulk1@email.com'))
+        assert get_session_user_by_uuid(u.user_uuid) == {
+            'user_uuid': u.user_uuid,
+            'username': 'bulk1',
+            'avatar_version': 0,
+        }
+        assert set(get_user_credentials_by_email('bulk1@email.com')) == {'user_uuid', 'username', 'email', 'password'}
+
+        assert update_user(u, profile_pic=b'\x89PNG new') is True
+        assert u.avatar_version == 1
+        update_user_profile_pic(u, b'\x89PNG newer')
+        assert get_session_user_by_uuid(u.user_uuid)['avatar_version'] == 2
+        assert get_user_profile_pic(u.user_uuid) == b'\x89PNG newer'
+
+
+def test_identity_map_forgets_misses_once_the_rows_are_created(app, setup_database):
+    with app.app_context():
+        assert get_user_by_uuid('explicit-user') is None
+        assert get_post_by_uuid('explicit-post') is None
+        assert get_comment_by_uuid('explicit-comment') is None
+
+        create_users(
+            [{'user_uuid': 'explicit-user', 'username': 'explicit', 'email': 'explicit@email.com', 'password': 'x'}],
+            hash_passwords=False,
+        )
+        create_posts([{'post_uuid': 'explicit-post', 'author_uuid': 'explicit-user', 'text_content': 'explicit'}])
+        create_comments([{
+            'comment_uuid': 'explicit-comment', 'parent_post_uuid': 'explicit-post',
+            'author_uuid': 'explicit-user', 'text_content': 'explicit',
+        }])
+
+        assert get_user_by_uuid('explicit-user')['username'] == 'explicit'
+        assert get_post_by_uuid('explicit-post')['text_content'] == 'explicit'
+        assert get_comment_by_uuid('explicit-comment')['text_content'] == 'explicit'
+
+
+def test_rejected_updates_store_no_blobs(app, setup_database):
+    with app.app_context():
+        u = User(**get_user_by_email('bulk1@email.com'))
+        store = get_blob_store()
+        before = sorted(store.root.rglob('*'))
+        with pytest.raises(ValueError):
+            update_user(u, profile_pic=b'\x89PNG orphan', user_uuid='not-allowed')
+        with pytest.raises(ValueError):
+            update_user(u, profile_pic_hash='0' * 64)
+        create_post(u.user_uuid, 'post with a bad edit')
+        p = Post(**get_db().execute("SELECT * FROM POSTS WHERE text_content = 'post with a bad edit';").fetchone())
+        with pytest.raises(ValueError):
+            update_post(p, image=b'GIF89a orphan', datetime='not a timestamp')
+        with pytest.raises(ValueError):
+            update_post(p, image_hash='0' * 64)
+        assert sorted(store.root.rglob('*')) == before
+
+
+def test_identity_map_serves_repeated_lookups(app, setup_database):
+    with app.app_context():
+        u = User(**get_user_by_email('bulk2@email.com'))
+        first = get_user_by_uuid(u.user_uuid)
+        assert get_user_by_uuid(u.user_uuid) is first
+        assert get_queries_saved() == 1
+
+        update_user_about_me(u, 'changed within the request')
+        assert get_user_by_uuid(u.user_uuid)['about_me'] == 'changed within the request'
+        assert get_queries_saved() == 1
+
+        assert get_comment_by_uuid('missing') is None
+        assert get_comment_by_uuid('missing') is None
+        assert get_queries_saved() == 2
+
+    with app.app_context():
+        assert get_queries_saved() == 0
+
+
+def test_query_cache_serves_reads_until_a_write_commits(app, setup_database):
+    app.config['QUERY_CACHE_ENABLED'] = True
+    try:
+        with app.app_context():
+            u = User(**get_user_by_email('bulk3@email.com'))
+            get_session_user_by_uuid(u.user_uuid)
+
+        with app.app_context():
+            assert get_session_user_by_uuid(u.user_uuid)['username'] == u.username
+            assert get_query_cache_stats()['hits'] == 1
+
+        with app.app_context():
+            update_user_username(u, 'CachedNoMore')
+
+        with app.app_context():
+            assert get_session_user_by_uuid(u.user_uuid)['username'] == 'CachedNoMore'
+            assert get_query_cache_stats()['hits'] == 1
+    finally:
+        app.config['QUERY_CACHE_ENABLED'] = False
+
+
+def test_images_are_stored_once_by_content(app, setup_database):
+    with app.app_context():
+        first = User(**get_user_by_email('bulk0@email.com'))
+        second = User(**get_user_by_email('bulk3@email.com'))
+        update_user_profile_pic(first, b'\x89PNG shared')
+        assert update_user(second, profile_pic=b'\x89PNG shared') is True
+        assert update_user(second, profile_pic=b'\x89PNG shared') is False
+
+        path = get_user_profile_pic_path(first.user_uuid)
+        assert path == get_user_profile_pic_path(second.user_uuid)
+        assert path.read_bytes() == b'\x89PNG shared'
+
+        create_posts([{'post_uuid': 'image-post', 'author_uuid': first.user_uuid, 'text_content': 'pic', 'image': b'GIF89a'}])
+        post = Post(**get_post_by_uuid('image-post'))
+        assert get_post_image(post) == b'GIF89a'
+        assert update_post(post, image=b'GIF89a') is False
+        update_post_image(post, b'GIF89a v2')
+        assert get_post_image(Post(**get_post_by_uuid('image-post'))) == b'GIF89a v2'
+
+
+def test_search_is_ranked_highlighted_paginated_and_in_sync(app, setup_database):
+    with app.app_context():
+        create_posts([
+            {'post_uuid': f'search-{i}', 'author_uuid': 'searcher', 'text_content': text}
+            for i, text in enumerate([
+                'Learning <b>dominoes</b> together',
+                'Dominoes and more dominoes: learning dominoes',
+                'Nothing relevant here',
+            ])
+        ])
+
+        results, has_more = search_posts('learn DOMINOES', limit=1)
+        assert [post['post_uuid'] for post in results] == ['search-1']
+        assert has_more
+        results, has_more = search_posts('learn DOMINOES', limit=1, page=2)
+        assert [post['post_uuid'] for post in results] == ['search-0']
+        assert str(results[0]['snippet']) == '<mark>Learning</mark> &lt;b&gt;<mark>dominoes</mark>&lt;/b&gt; together'
+        assert not has_more
+
+        assert search_posts('"AND OR* (') == ([], False)
+        assert search_posts('') == ([], False)
+
+        post = Post(**get_post_by_uuid('search-2'))
+        update_post_text_content(post, 'Now about dominoes')
+        assert 'search-2' in [p['post_uuid'] for p in search_posts('dominoes')[0]]
+        delete_post(post)
+        assert 'search-2' not in [p['post_uuid'] for p in search_posts('dominoes')[0]]
+
+        create_comment(Post(**get_post_by_uuid('search-0')), User('searcher', '', '', '', None, '', ''), 'Great dominoes tip', '')
+        comment = Comment(**get_comment_by_uuid(search_comments('tip')[0][0]['comment_uuid']))
+        update_comment_text_content(comment, 'Great advice')
+        assert search_comments('tip') == ([], False)
+        delete_comment(comment)
+        assert search_comments('advice') == ([], False)
+
+
+def test_timestamps_are_normalized_and_range_queries_use_indexes(app, setup_database):
+    with app.app_context():
+        create_posts([
+            {'post_uuid': 'time-0', 'author_uuid': 'clock', 'text_content': 'x', 'datetime': '2020-01-01T09:00:00-05:00'},
+            {'post_uuid': 'time-1', 'author_uuid': 'clock', 'text_content': 'x', 'datetime': '2020-01-02'},
+            {'post_uuid': 'time-2', 'author_uuid': 'clock', 'text_content': 'x', 'datetime': datetime(2020, 1, 3, 12)},
+        ])
+        assert get_post_by_uuid('time-0')['datetime'] == '2020-01-01T14:00:00.000000+00:00'
+        assert [post['post_uuid'] for post in get_posts_by_datetime('2020-01-02T00:00:00Z')] == ['time-1']
+        assert [post['post_uuid'] for post in get_posts_between('2020-01-01', '2020-01-03T12:00:00')] == ['time-0', 'time-1']
+
+        post = Post(**get_post_by_uuid('time-0'))
+        create_comment(post, User('clock', '', '', '', None, '', ''), 'late', '2020-01-05T00:00:00+01:00')
+        create_comment(post, User('clock', '', '', '', None, '', ''), 'early', '2020-01-04')
+        # Comments made by other tests are newer
+        assert [comment['text_content'] for comment in get_comments_since('2020-01-03')][:2] == ['early', 'late']
+        assert 'late' not in [comment['text_content'] for comment in get_comments_since('2020-01-04T23:00:00+00:00')]
+
+        with pytest.raises(ValueError):
+            get_posts_between('yesterday', '2020-01-01')
+
+        plans = [
+            get_db().execute(f'EXPLAIN QUERY PLAN {_statements[name].sql}', params).fetchall()
+            for name, params in (('get_posts_between', ('a', 'b')), ('get_comments_since', ('a',)))
+        ]
+        assert 'idx_posts_datetime' in plans[0][0]['detail']
+        assert 'idx_comments_datetime' in plans[1][0]['detail']
+
+
+def test_activity_counters_follow_posts_and_comments(app, setup_database):
+    with app.app_context():
+        create_user('Counter', 'counter@email.com', 'password')
+        author = User(**get_user_by_email('counter@email.com'))
+        create_posts([
+            {'post_uuid': f'count-{i}', 'author_uuid': author.user_uuid, 'text_content': 'x', 'datetime': '2021-01-01'}
+            for i in range(3)
+        ])
+        create_post(author.user_uuid, 'one more')
+        assert get_user_by_uuid(author.user_uuid)['post_count'] == 4
+
+        post = Post(**get_post_by_uuid('count-0'))
+        create_comments([
+            {'parent_post_uuid': 'count-0', 'author_uuid': author.user_uuid, 'text_content': 'a', 'datetime': '2021-01-03'},
+            {'parent_post_uuid': 'count-0', 'author_uuid': author.user_uuid, 'text_content': 'b', 'datetime': '2021-01-02'},
+        ])
+        create_comment(post, author, 'c', '2021-01-04')
+        counters = get_db().execute("SELECT comment_count, last_activity_at FROM POSTS WHERE post_uuid = 'count-0';").fetchone()
+        assert counters == {'comment_count': 3, 'last_activity_at': '2021-01-04T00:00:00.000000+00:00'}
+
+        latest = Comment(**get_comments_since('2021-01-03T12:00:00')[0])
+        delete_comment(latest)
+        counters = get_db().execute("SELECT comment_count, last_activity_at FROM POSTS WHERE post_uuid = 'count-0';").fetchone()
+        assert counters == {'comment_count': 2, 'last_activity_at': '2021-01-03T00:00:00.000000+00:00'}
+
+        delete_post(Post(**get_post_by_uuid('count-1')))
+        assert get_user_by_uuid(author.user_uuid)['post_count'] == 3
+        assert check_activity_counters() == {'posts': 0, 'users': 0}
+
+        get_db().execute("UPDATE POSTS SET comment_count = 7 WHERE post_uuid = 'count-2';")
+        get_db().execute("UPDATE USERS SET post_count = 0 WHERE user_uuid = ?;", (author.user_uuid,))
+        get_db().commit()
+        assert check_activity_counters() == {'posts': 1, 'users': 1}
+        assert rebuild_activity_counters() == {'posts': 1, 'users': 1}
+        assert check_activity_counters() == {'posts': 0, 'users': 0}
+        assert get_user_by_uuid(author.user_uuid)['post_count'] == 3
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from oce.utils.db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    return ConnectionPool(
+        FakeConnection,
+        check=lambda con, idle_for: not con.closed,
+        reset=lambda con: con.rollback(),
+        **kwargs,
+    )
+
+
+def test_pool_opens_min_size_eagerly():
+    pool = make_pool(min_size=2, max_size=4)
+    stats = pool.stats()
+    assert stats['size'] == 2
+    assert stats['idle'] == 2
+    assert stats['connects'] == 2
+
+
+def test_pool_reuses_returned_connection():
+    pool = make_pool(min_size=0, max_size=2)
+    con = pool.getconn()
+    pool.putconn(con)
+    assert pool.getconn() is con
+    assert con.rollbacks == 1
+    assert pool.stats()['connects'] == 1
+
+
+def test_pool_replaces_unhealthy_connection():
+    pool = make_pool(min_size=1, max_size=1)
+    con = pool.getconn()
+    pool.putconn(con)
+    con.closed = True
+    replacement = pool.getconn()
+    assert replacement is not con
+    assert pool.stats()['discarded'] == 1
+
+
+def test_pool_checks_idle_connections_without_holding_the_lock():
+    blocked = []
+
+    def slow_check(con, idle_for):
+        # Another thread can use the pool while a check waits on the server
+        other = threading.Thread(target=lambda: pool.putconn(pool.getconn()))
+        other.start()
+        other.join(timeout=5)
+        blocked.append(other.is_alive())
+        return True
+
+    pool = ConnectionPool(FakeConnection, min_size=2, max_size=3, check=slow_check)
+    pool.getconn()
+    assert blocked[0] is False
+
+
+def test_pool_replenishes_discarded_connections_up_to_min_size():
+    pool = make_pool(min_size=2, max_size=4)
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+    first.closed = second.closed = True
+
+    # The dead connection is replaced at once, and the caller gets the replacement
+    con = pool.getconn()
+    assert con not in (first, second)
+    stats = pool.stats()
+    assert stats['discarded'] == 1
+    assert stats['size'] == 2
+    assert stats['idle'] == 1
+
+    pool.putconn(con, discard=True)
+    assert pool.stats()['size'] == 2
+
+
+def test_pool_discards_connection_when_reset_fails():
+    def broken_reset(con):
+        raise RuntimeError('connection lost')
+
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, reset=broken_reset)
+    con = pool.getconn()
+    pool.putconn(con)
+    assert con.closed
+    assert pool.stats()['size'] == 0
+
+
+def test_pool_times_out_when_exhausted():
+    pool = make_pool(min_size=0, max_size=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_pool_waiter_receives_returned_connection():
+    pool = make_pool(min_size=0, max_size=1, timeout=5)
+    con = pool.getconn()
+    received = []
+
+    waiter = threading.Thread(target=lambda: received.append(pool.getconn()))
+    waiter.start()
+    pool.putconn(con)
+    waiter.join(timeout=5)
+
+    assert received == [con]
+    assert pool.stats()['in_use'] == 1
+
+
+def test_pool_counts_concurrent_connects():
+    pool = make_pool(min_size=0, max_size=16)
+    threads = [threading.Thread(target=pool.getconn) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    stats = pool.stats()
+    assert stats['connects'] == stats['size'] == stats['checkouts'] == 16
+
+
+def test_pool_rejects_invalid_bounds():
+    with pytest.raises(ValueError):
+        ConnectionPool(FakeConnection, min_size=3, max_size=2)
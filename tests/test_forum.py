@@ -0,0 +1,108 @@
+from oce.utils.db_interface import (
+    create_comment, create_posts, create_user, get_db, get_post_by_uuid, get_posts_page,
+    get_user_by_email,
+)
+from oce.utils.models import Post, User
+
+
+def add_posts(count: int, author: str, start: int = 0) -> None:
+    create_posts([
+        {
+            'post_uuid': f'forum-{i:03}',
+            'author_uuid': author,
+            'text_content': f'forum post {i}',
+            'datetime': f'2024-01-01T00:{i // 60:02}:{i % 60:02}',
+        }
+        for i in range(start, start + count)
+    ])
+
+
+def test_feed_page_carries_authors_and_comment_counts(app):
+    with app.app_context():
+        create_user('Forum Author', 'forum@email.com', 'password')
+        author = get_user_by_email('forum@email.com')
+        add_posts(2, author['user_uuid'])
+        add_posts(1, 'Typed Name', start=2)
+        post = Post(**get_post_by_uuid('forum-000'))
+        create_comment(post, User(**author), 'first', '2024-02-01T10:00:00Z')
+        create_comment(post, User(**author), 'second', '2024-02-03T10:00:00Z')
+
+        posts, _, _ = get_posts_page(limit=3)
+
+    assert [p['post_uuid'] for p in posts] == ['forum-002', 'forum-001', 'forum-000']
+    assert [p['author_username'] for p in posts] == [None, 'Forum Author', 'Forum Author']
+    assert posts[1]['author_avatar_version'] == author['avatar_version']
+    assert [p['comment_count'] for p in posts] == [0, 0, 2]
+    assert posts[2]['last_activity_at'] == '2024-02-03T10:00:00.000000+00:00'
+    assert posts[0]['last_activity_at'] == posts[0]['datetime']
+
+    with app.app_context():
+        posts, older, _ = get_posts_page(limit=2, sort='activity')
+        assert [p['post_uuid'] for p in posts] == ['forum-000', 'forum-002']
+        assert [p['post_uuid'] for p in get_posts_page(limit=2, cursor=older, sort='activity')[0]] == ['forum-001']
+
+
+def test_concept_exchange_renders_in_constant_queries(app):
+    client = app.test_client()
+    statements = []
+
+    def count_queries(limit):
+        with app.app_context():
+            get_db().set_trace_callback(statements.append)
+        statements.clear()
+        response = client.get(f'/content/ConceptExchange/?limit={limit}')
+        with app.app_context():
+            get_db().set_trace_callback(None)
+        assert response.status_code == 200
+        return len(statements), response.get_data(as_text=True)
+
+    with app.app_context():
+        create_user('Forum Author', 'forum@email.com', 'password')
+        author = get_user_by_email('forum@email.com')
+        add_posts(3, author['user_uuid'])
+        create_comment(Post(**get_post_by_uuid('forum-002')), User(**author), 'a comment')
+    few, page = count_queries(3)
+    assert page.count('Forum Author') == 3
+    assert '1 comment\n' in page and '0 comments' in page
+
+    with app.app_context():
+        add_posts(30, author['user_uuid'], start=3)
+    many, page = count_queries(30)
+    assert page.count('Forum Author') == 30
+
+    assert many == few == 1
+
+
+def test_posts_made_on_the_site_carry_their_author(app):
+    with app.app_context():
+        create_user('Site Author', 'site@email.com', 'password')
+        author = get_user_by_email('site@email.com')
+
+    client = app.test_client()
+    assert client.post('/create_post', json={'text_content': 'anonymous'}).status_code == 401
+    with client.session_transaction() as session:
+        session['user_uuid'] = author['user_uuid']
+    assert client.post('/create_post', json={'text_content': 'from the site'}).json == {'success': True}
+
+    with app.app_context():
+        posts, _, _ = get_posts_page(limit=5)
+    assert [p['text_content'] for p in posts] == ['from the site']
+    assert posts[0]['author_uuid'] == author['user_uuid']
+    assert posts[0]['author_username'] == 'Site Author'
+    assert posts[0]['author_avatar_version'] == author['avatar_version']
+
+
+def test_posts_made_on_the_site_count_towards_their_author(app):
+    with app.app_context():
+        create_user('Counted Author', 'counted@email.com', 'password')
+        author = get_user_by_email('counted@email.com')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_uuid'] = author['user_uuid']
+    for i in range(2):
+        client.post('/create_post', json={'text_content': f'counted post {i}'})
+
+    with app.app_context():
+        assert author['post_count'] == 0
+        assert get_user_by_email('counted@email.com')['post_count'] == 2
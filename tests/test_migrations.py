@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from oce.utils.db_interface import get_db
+from oce.utils.migrations import MIGRATIONS, get_schema_version, index_report, migrate
+
+
+@pytest.fixture
+def app(unmigrated_app):
+    # Each test migrates the database itself
+    return unmigrated_app
+
+
+def test_migrate_records_versions_and_is_idempotent(app):
+    with app.app_context():
+        assert get_schema_version() == 0
+        assert [migration.version for migration in migrate(target=3)] == [1, 2, 3]
+        assert get_schema_version() == 3
+        assert [migration.version for migration in migrate()] == [migration.version for migration in MIGRATIONS[3:]]
+        assert migrate() == []
+        assert get_schema_version() == MIGRATIONS[-1].version
+
+
+def test_migrate_upgrades_unversioned_database(app, tmp_path):
+    # The schema the site shipped with, before migrations were recorded.
+    con = sqlite3.connect(tmp_path / 'oce.db')
+    con.execute(
+        'CREATE TABLE USERS(user_uuid TEXT PRIMARY KEY, username TEXT NOT NULL, email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, profile_pic BLOB NOT NULL, about_me TEXT NOT NULL, datetime_created TEXT);'
+    )
+    con.execute(
+        'CREATE TABLE POSTS(post_uuid TEXT PRIMARY KEY, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, tag1 TEXT, tag2 TEXT, tag3 TEXT, tag4 TEXT, tag5 TEXT, image BLOB, datetime TEXT NOT NULL, location TEXT);'
+    )
+    con.execute(
+        'CREATE TABLE COMMENTS(comment_uuid TEXT PRIMARY KEY, parent_post_uuid TEXT NOT NULL, author_uuid TEXT NOT NULL, text_content TEXT NOT NULL, datetime TEXT NOT NULL);'
+    )
+    con.execute("INSERT INTO USERS VALUES ('u1', 'old', 'old@email.com', 'pw', x'89504e47', '', NULL);")
+    con.execute("INSERT INTO POSTS VALUES ('p1', 'u1', 'old dominoes post', 'block1', 'None', 'None', 'None', 'None', NULL, 'None', 'None');")
+    con.commit()
+    con.close()
+
+    with app.app_context():
+        migrate()
+        cur = get_db().cursor()
+        user = cur.execute('SELECT * FROM USERS;').fetchone()
+        assert user['avatar_version'] == 0 and 'profile_pic' not in user
+        assert user['profile_pic_hash'] is not None
+        assert cur.execute('SELECT * FROM POST_TAGS;').fetchall() == [{'post_uuid': 'p1', 'tag': 'block1'}]
+        assert cur.execute('SELECT datetime FROM POSTS;').fetchone()['datetime'] == '1970-01-01T00:00:00.000000+00:00'
+        assert cur.execute("SELECT post_uuid FROM POSTS_FTS WHERE POSTS_FTS MATCH 'domino';").fetchall() == [{'post_uuid': 'p1'}]
+
+
+def test_index_report_shows_lookups_use_indexes(app):
+    with app.app_context():
+        migrate()
+        plans = {plan.statement: plan for plan in index_report()}
+
+    for statement, index in (
+        ('get_posts_by_author', 'idx_posts_author'),
+        ('get_comments_by_parent_post', 'idx_comments_post_datetime'),
+        ('get_comments_by_author', 'idx_comments_author'),
+        ('get_user_by_username', 'idx_users_username'),
+    ):
+        assert plans[statement].index_backed
+        assert index in plans[statement].indexes
+    assert plans['get_all_posts'].scanned_tables == ('POSTS',)
+    assert not any(plan.error for plan in plans.values())
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from oce.utils import passwords
+from oce.utils.db_interface import check_user_password, create_users, get_password_hasher, get_user_credentials_by_email
+from oce.utils.passwords import HashingBusyError, PasswordHashingPool
+
+# Cheap Argon2 parameters, the suite does not need to be slow to crack
+FAST = {'time_cost': 1, 'memory_cost': 64, 'parallelism': 1}
+
+
+@pytest.fixture
+def app(app):
+    app.config.update({'ARGON2_TIME_COST': 1, 'ARGON2_MEMORY_COST': 64, 'ARGON2_PARALLELISM': 1})
+    return app
+
+
+def test_pool_hashes_and_verifies_in_worker_processes():
+    pool = PasswordHashingPool(workers=1, **FAST)
+    try:
+        hashes = pool.hash_many(['first', 'second'])
+        assert pool.verify(hashes[0], 'first')
+        assert not pool.verify(hashes[1], 'first')
+        assert not pool.verify('not a hash', 'first')
+        assert pool.stats() == {
+            'workers': 1, 'max_queue': 4, 'in_flight': 0, 'hashes': 2, 'verifications': 3, 'waits': 0, 'rejected': 0,
+        }
+    finally:
+        pool.close()
+
+
+def test_pool_rejects_calls_once_the_queue_is_full():
+    pool = PasswordHashingPool(workers=0, max_queue=1, timeout=0.01, **FAST)
+    pool._acquire_slot()
+    with pytest.raises(HashingBusyError):
+        pool.hash('password')
+    pool._release_slot()
+
+    assert pool.verify(pool.hash('password'), 'password')
+    assert pool.stats()['rejected'] == 1
+
+
+def _die_first(parameters, marker, password):
+    # Run in a worker process: the first call kills it, later ones hash
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return passwords._hash(parameters, password)
+
+
+def _die(parameters, password):
+    os._exit(1)
+
+
+def test_pool_replaces_a_worker_that_died_mid_hash(tmp_path):
+    pool = PasswordHashingPool(workers=1, **FAST)
+    try:
+        password_hash = pool._call(_die_first, str(tmp_path / 'died'), 'password')
+        assert pool.verify(password_hash, 'password')
+
+        with pytest.raises(HashingBusyError):
+            pool._call(_die, 'password')
+        assert pool.verify(pool.hash('password'), 'password')
+        assert pool.stats()['in_flight'] == 0
+    finally:
+        pool.close()
+
+
+def test_signup_stores_one_hash_and_login_accepts_it(app):
+    client = app.test_client()
+    form = {'username': 'Signup', 'email': 'signup@email.com', 'password': 'correct horse', 'about_me': ''}
+    assert client.post('/content/SignupPage', data=form).location == '/content/Login/'
+
+    login = client.post('/content/Login/', data={'email': 'signup@email.com', 'password': 'correct horse'})
+    assert login.location == '/'
+    wrong = client.post('/content/Login/', data={'email': 'signup@email.com', 'password': 'wrong horse'})
+    assert wrong.location == '/content/Login/'
+
+
+def test_login_rehashes_passwords_made_with_old_parameters(app):
+    with app.app_context():
+        old_hash = PasswordHashingPool(workers=0, time_cost=2, memory_cost=64, parallelism=1).hash('secret')
+        create_users([{'username': 'Old', 'email': 'old@email.com', 'password': old_hash}], hash_passwords=False)
+        assert check_user_password(get_user_credentials_by_email('old@email.com'), 'secret')
+
+        new_hash = get_user_credentials_by_email('old@email.com')['password']
+        assert new_hash != old_hash
+        assert not get_password_hasher().needs_rehash(new_hash)
+        assert check_user_password(get_user_credentials_by_email('old@email.com'), 'secret')
+
+
+def test_busy_hashing_pool_answers_503(app, monkeypatch):
+    def busy(*args):
+        raise HashingBusyError('full')
+
+    with app.app_context():
+        monkeypatch.setattr(get_password_hasher(), 'verify', busy)
+    client = app.test_client()
+    client.post('/content/SignupPage', data={'username': 'Busy', 'email': 'busy@email.com', 'password': 'password1'})
+    response = client.post('/content/Login/', data={'email': 'busy@email.com', 'password': 'password1'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,61 @@
+from cachelib import SimpleCache
+
+from oce.utils.query_cache import MISSING, LRUCache, QueryCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(max_entries=2, ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') is MISSING
+    assert cache.expirations == 1
+
+
+def test_bump_invalidates_only_readers_of_the_table():
+    cache = QueryCache()
+    users_key, _ = cache.get('get_user', ('u1',), ('users',))
+    cache.set(users_key, {'user_uuid': 'u1'})
+    posts_key, _ = cache.get('get_posts', (), ('posts',))
+    cache.set(posts_key, [])
+
+    cache.bump(['posts'])
+    assert cache.get('get_user', ('u1',), ('users',))[1] == {'user_uuid': 'u1'}
+    assert cache.get('get_posts', (), ('posts',))[1] is MISSING
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 3
+
+
+def test_shared_backend_is_seen_by_every_worker():
+    shared = SimpleCache()
+    worker1, worker2 = QueryCache(shared=shared), QueryCache(shared=shared)
+
+    key, _ = worker1.get('get_user', ('u1',), ('users',))
+    worker1.set(key, {'x': 1})
+    assert worker2.get('get_user', ('u1',), ('users',))[1] == {'x': 1}
+    assert worker2.get('get_user', ('u1',), ('users',))[1] == {'x': 1}
+    assert worker2.stats()['shared_hits'] == 1
+    assert worker2.stats()['hits'] == 1
+
+    key, _ = worker1.get('get_post', ('p1',), ('posts',))
+    worker1.set(key, None)
+    assert worker2.get('get_post', ('p1',), ('posts',))[1] is None
+
+    worker1.bump(['users'])
+    assert worker2.get('get_user', ('u1',), ('users',))[1] is MISSING
+
+
+def test_password_hashes_are_not_cached():
+    from oce.utils.db_interface import _statements
+
+    for name in ('get_user_by_uuid', 'get_user_by_email', 'get_user_by_username', 'get_user_credentials_by_email'):
+        assert not _statements[name].cacheable
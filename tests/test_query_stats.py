@@ -0,0 +1,54 @@
+import logging
+
+import pytest
+
+from oce.utils.db_interface import get_query_stats, get_user_by_uuid
+from oce.utils.query_stats import QueryStats
+
+
+@pytest.fixture
+def app(app):
+    @app.route('/_users/<int:count>')
+    def look_up_users(count):
+        for i in range(count):
+            get_user_by_uuid(f'user-{i}')
+        return 'done'
+
+    return app
+
+
+def test_query_stats_totals_per_statement():
+    stats = QueryStats()
+    stats.record('a', 0.002, 3)
+    stats.record('a', 0.004, 0)
+    stats.record('b', 0.001, 1)
+
+    assert stats.count == 3
+    assert stats.statements['a'].rows == 3
+    assert stats.statements['a'].slowest == 0.004
+    assert stats.repeated(1) == [('a', 2)]
+    assert stats.server_timing() == 'db;dur=7.0;desc="3 queries"'
+
+
+def test_request_reports_queries_in_server_timing(app, caplog):
+    with caplog.at_level(logging.WARNING):
+        response = app.test_client().get('/_users/3')
+    assert response.headers['Server-Timing'].endswith('desc="3 queries"')
+    assert 'N+1' not in caplog.text
+
+    with app.app_context():
+        get_user_by_uuid('user-0')
+        get_user_by_uuid('user-0')
+        stats = get_query_stats()
+        assert stats.statements['get_user_by_uuid'].count == 1
+
+
+def test_repeated_and_slow_statements_are_logged(app, caplog):
+    app.config.update({'QUERY_REPEAT_WARNING': 5, 'QUERY_SLOW_MS': 0})
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get('/_users/6')
+    assert 'Statement get_user_by_uuid ran 6 times in GET /_users/6, likely an N+1 query.' in caplog.text
+    assert 'Slow query get_user_by_uuid took' in caplog.text
+
+    app.config['QUERY_SERVER_TIMING'] = False
+    assert 'Server-Timing' not in app.test_client().get('/_users/1').headers
@@ -0,0 +1,88 @@
+import pytest
+
+from oce.utils import rate_limit
+from oce.utils.db_interface import get_password_hasher
+from oce.utils.rate_limit import Limit, MemoryBucketStore, RateLimiter, SQLiteBucketStore, get_rate_limit_stats
+
+
+class FakeTime:
+    now = 1000.0
+
+    @classmethod
+    def monotonic(cls):
+        return cls.now
+
+    time = monotonic
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(FakeTime, 'now', 1000.0)
+    monkeypatch.setattr(rate_limit, 'time', FakeTime)
+    return FakeTime
+
+
+@pytest.fixture
+def app(app):
+    app.config.update({'RATE_LIMIT_LOGIN_PER_EMAIL': (2, 60), 'RATE_LIMIT_SIGNUP_PER_IP': (1, 60)})
+    return app
+
+
+@pytest.mark.parametrize('store', ['memory', 'sqlite'])
+def test_bucket_allows_a_burst_then_refills(store, clock, tmp_path):
+    limiter = RateLimiter(
+        {'login_ip': Limit(3, 30), 'signup_ip': None},
+        MemoryBucketStore() if store == 'memory' else SQLiteBucketStore(tmp_path / 'limits.db'),
+    )
+
+    assert [limiter.hit('login_ip', 'a') for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit('login_ip', 'a') == pytest.approx(10)
+    assert limiter.hit('login_ip', 'b') == 0
+    assert limiter.hit('signup_ip', 'a') == 0
+
+    clock.now += 10
+    assert limiter.hit('login_ip', 'a') == 0
+    assert limiter.hit('login_ip', 'a') > 0
+    assert limiter.stats() == {
+        'login_ip_allowed': 5, 'login_ip_rejected': 2, 'signup_ip_allowed': 0, 'signup_ip_rejected': 0,
+    }
+
+
+def test_sqlite_buckets_are_shared_between_stores(clock, tmp_path):
+    first = SQLiteBucketStore(tmp_path / 'limits.db')
+    second = SQLiteBucketStore(tmp_path / 'limits.db')
+    assert first.take('key', 10, 20) == 0
+    assert second.take('key', 10, 20) == 0
+    assert first.take('key', 10, 20) == pytest.approx(10)
+
+
+def test_memory_store_drops_full_buckets(clock):
+    store = MemoryBucketStore(max_keys=2)
+    store.take('a', 1, 1)
+    store.take('b', 1, 1)
+    clock.now += 5
+    store.take('c', 1, 1)
+    assert list(store._full_at) == ['c']
+
+
+def test_login_over_the_limit_gets_429_without_hashing(app, monkeypatch):
+    verified = []
+    with app.app_context():
+        hasher = get_password_hasher()
+        monkeypatch.setattr(hasher, 'verify', lambda *args: verified.append(args) or False)
+
+    client = app.test_client()
+    form = {'email': 'target@email.com', 'password': 'guess'}
+    client.post('/content/SignupPage', data={'username': 'Target', 'email': 'target@email.com', 'password': 'password1'})
+    assert [client.post('/content/Login/', data=form).status_code for _ in range(3)] == [302, 302, 429]
+    assert len(verified) == 2
+
+    response = client.post('/content/Login/', data={**form, 'email': 'TARGET@email.com'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert client.post('/content/SignupPage', data={'username': 'Second', 'email': 'x@y.com'}).status_code == 429
+
+    with app.app_context():
+        stats = get_rate_limit_stats()
+    assert stats['login_email_rejected'] == 2
+    assert stats['signup_ip_allowed'] == 1
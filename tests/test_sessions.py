@@ -0,0 +1,112 @@
+import time
+
+import pytest
+from flask import session
+
+
+@pytest.fixture
+def app(app):
+    @app.route('/_session/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        session['cart'] = []
+        return 'set'
+
+    @app.route('/_session/get')
+    def get_value():
+        return session.get('value', 'none')
+
+    @app.route('/_session/add/<item>')
+    def add_to_cart(item):
+        # Changes a nested value without marking the session modified
+        session['cart'].append(item)
+        return 'added'
+
+    @app.route('/_session/clear')
+    def clear():
+        session.clear()
+        return 'cleared'
+
+    return app
+
+
+def stored_sessions(app) -> list[tuple]:
+    return app.session_interface._connect().execute('SELECT id, expires_at FROM sessions;').fetchall()
+
+
+def test_unchanged_sessions_are_not_written_back(app):
+    interface = app.session_interface
+    client = app.test_client()
+
+    assert client.get('/_session/get').text == 'none'
+    assert stored_sessions(app) == []
+
+    client.get('/_session/set/first')
+    assert client.get('/_session/get').text == 'first'
+    assert interface.stats()['writes'] == 1
+    assert interface.stats()['skipped_writes'] == 1
+
+    client.get('/_session/add/book')
+    assert interface.stats()['writes'] == 2
+
+    interface.refresh_after = 0
+    client.get('/_session/get')
+    assert interface.stats()['writes'] == 3
+    assert len(stored_sessions(app)) == 1
+
+    client.get('/_session/clear')
+    assert stored_sessions(app) == []
+    assert client.get('/_session/get').text == 'none'
+
+
+def test_expired_sessions_are_ignored_and_swept_in_batches(app):
+    interface = app.session_interface
+    interface.sweep_batch = 2
+    client = app.test_client()
+    client.get('/_session/set/kept')
+
+    interface._connect().executemany(
+        'INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?);',
+        [(f'session:old-{i}', b'\x80', time.time() - 1) for i in range(5)],
+    )
+    stale = app.test_client()
+    stale.set_cookie(app.config['SESSION_COOKIE_NAME'], 'old-0')
+    assert stale.get('/_session/get').text == 'none'
+
+    assert interface.sweep() == 5
+    assert len(stored_sessions(app)) == 1
+    assert client.get('/_session/get').text == 'kept'
+
+
+PUBLIC_PAGES = [
+    '/', *(f'/content/block{n}' for n in range(1, 10)), '/content/resources/teen', '/content/calendar/',
+]
+
+
+def test_crawling_public_pages_creates_no_sessions(app):
+    interface = app.session_interface
+    before = interface.stats()
+    client = app.test_client()
+
+    for url in PUBLIC_PAGES:
+        response = client.get(url)
+        assert response.status_code == 200, url
+        assert 'Set-Cookie' not in response.headers
+        assert response.headers['Cache-Control'] == 'public, max-age=300'
+    assert client.get('/static/css/ArchStone1.css').status_code == 200
+    assert interface.stats() == before
+
+    # A flashed message creates a session; its pages are then private to the visitor
+    client.get('/content/Shop/')
+    assert interface.stats()['writes'] == before['writes'] + 1
+    assert 'Cache-Control' not in client.get('/content/block1').headers
+    client.get('/static/css/ArchStone1.css')
+    reads = interface.stats()['reads']
+    client.get('/static/css/ArchStone2.css')
+    assert interface.stats()['reads'] == reads
+
+    # Once the session is gone the cookie is dropped and the visitor is anonymous again
+    interface._connect().execute('DELETE FROM sessions;')
+    response = client.get('/content/block2')
+    assert 'session=;' in response.headers['Set-Cookie']
+    assert client.get('/content/block3').headers['Cache-Control'] == 'public, max-age=300'
@@ -0,0 +1,65 @@
+import pytest
+
+from oce.utils.statements import StatementRegistry
+
+
+def test_sqlite_statement_keeps_qmark_placeholders():
+    registry = StatementRegistry('sqlite')
+    statement = registry.add('get_user_by_uuid', 'SELECT * FROM {users} WHERE user_uuid = ?;', 'one')
+    assert statement.sql == 'SELECT * FROM USERS WHERE user_uuid = ?;'
+    assert statement.fetch == 'one'
+    assert statement.prepare_sql is None
+
+
+def test_postgresql_statement_is_prepared():
+    registry = StatementRegistry('postgresql')
+    statement = registry.add('update_user_email', 'UPDATE {users} SET email = ? WHERE user_uuid = ?;')
+    assert statement.sql == 'UPDATE users SET email = %s WHERE user_uuid = %s;'
+    assert statement.prepare_sql == 'PREPARE oce_update_user_email AS UPDATE users SET email = $1 WHERE user_uuid = $2;'
+    assert statement.execute_sql == 'EXECUTE oce_update_user_email (%s, %s);'
+
+
+def test_postgresql_statement_escapes_percent():
+    registry = StatementRegistry('postgresql')
+    statement = registry.add('like', "SELECT * FROM {posts} WHERE text_content LIKE '%' || ?;", 'all')
+    assert statement.sql == "SELECT * FROM posts WHERE text_content LIKE '%%' || %s;"
+    assert statement.prepare_sql.endswith("LIKE '%' || $1;")
+
+
+def test_statement_names_are_unique():
+    registry = StatementRegistry('sqlite')
+    registry.add('delete_user', 'DELETE FROM {users} WHERE user_uuid = ?;')
+    with pytest.raises(ValueError):
+        registry.add('delete_user', 'DELETE FROM {users} WHERE user_uuid = ?;')
+
+
+def test_postgresql_insert_has_multi_row_form():
+    registry = StatementRegistry('postgresql')
+    insert = registry.add('insert_post_tag', 'INSERT INTO {post_tags} (post_uuid, tag) VALUES (?, ?);')
+    select = registry.add('get_tag_counts', 'SELECT tag FROM {post_tags};', 'all')
+    assert insert.many_sql == 'INSERT INTO post_tags (post_uuid, tag) VALUES %s;'
+    assert select.many_sql is None
+
+
+def test_postgresql_prepared_names_stay_unique_and_short():
+    registry = StatementRegistry('postgresql')
+    columns = 'image,location,tag1,tag2,tag3,tag4,tag5,text_content'
+    first = registry.add(f'update_posts({columns})', 'UPDATE {posts} SET image = ? WHERE post_uuid = ?;')
+    second = registry.add(f'update_posts({columns},datetime)', 'UPDATE {posts} SET image = ? WHERE post_uuid = ?;')
+    first_name = first.prepare_sql.split()[1]
+    second_name = second.prepare_sql.split()[1]
+    assert first_name != second_name
+    assert len(first_name) <= 63 and len(second_name) <= 63
+
+
+def test_statement_records_tables_and_cacheability():
+    registry = StatementRegistry('sqlite')
+    query = registry.add(
+        'get_posts_by_tag',
+        'SELECT {posts}.* FROM {posts} JOIN {post_tags} ON {post_tags}.post_uuid = {posts}.post_uuid WHERE tag = ?;',
+        'all',
+    )
+    assert query.tables == ('post_tags', 'posts')
+    assert query.cacheable
+    assert not registry.add('delete_post', 'DELETE FROM {posts} WHERE post_uuid = ?;').cacheable
+    assert not registry.add('secret', 'SELECT password FROM {users};', 'all', cache=False).cacheable
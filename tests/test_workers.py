@@ -0,0 +1,125 @@
+import os
+import subprocess
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from oce import create_app
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Serves wsgi.app on a free port and prints the port once it is listening
+WORKER = """
+from werkzeug.serving import make_server
+from wsgi import app
+server = make_server('127.0.0.1', 0, app, threaded=True)
+print(server.port, flush=True)
+server.serve_forever()
+"""
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+def request(port, path, cookie=None, form=None):
+    """Send a request to a worker without following redirects, returning its status, headers and body."""
+    data = urllib.parse.urlencode(form).encode() if form is not None else None
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data)
+    if cookie:
+        req.add_header('Cookie', cookie)
+    try:
+        with urllib.request.build_opener(NoRedirect).open(req, timeout=30) as response:
+            return response.status, response.headers, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read().decode()
+
+
+@pytest.fixture
+def worker_env(tmp_path):
+    env = {
+        **os.environ,
+        'OCE_PROFILE': 'production',
+        'OCE_SECRET_KEY': 'shared-test-secret',
+        'OCE_INSTANCE_PATH': str(tmp_path / 'instance'),
+        'OCE_DB_NAME': str(tmp_path / 'oce.db'),
+        'OCE_BLOB_STORE_DIR': str(tmp_path / 'blobs'),
+        'OCE_PASSWORD_HASH_WORKERS': '0',
+        'OCE_ARGON2_TIME_COST': '1',
+        'OCE_ARGON2_MEMORY_COST': '1024',
+        'OCE_ARGON2_PARALLELISM': '1',
+        'OCE_QUERY_SLOW_MS': 'null',
+        'USE_POSTGRESQL': 'false',
+    }
+    subprocess.run([sys.executable, 'migrate.py', '--no-report'], cwd=ROOT, env=env, check=True, capture_output=True)
+    return env
+
+
+@pytest.fixture
+def workers(worker_env):
+    processes = [
+        subprocess.Popen([sys.executable, '-c', WORKER], cwd=ROOT, env=worker_env, stdout=subprocess.PIPE, text=True)
+        for _ in range(3)
+    ]
+    try:
+        yield [int(process.stdout.readline()) for process in processes]
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+            process.stdout.close()
+
+
+def test_sessions_work_across_worker_processes(workers):
+    first, second, third = workers
+    signup = {'username': 'Roamer', 'email': 'roamer@email.com', 'password': 'password1'}
+    assert request(first, '/content/SignupPage', form=signup)[0] == 302
+
+    status, headers, _ = request(second, '/content/Login/', form={'email': 'roamer@email.com', 'password': 'password1'})
+    assert status == 302
+    cookie = headers['Set-Cookie'].split(';')[0]
+
+    # The flash stored by the second worker is shown by the third
+    status, _, body = request(third, '/content/Login/', cookie=cookie)
+    assert status == 200
+    assert 'Welcome back, Roamer!' in body
+    assert '/avatar' in request(first, '/content/block1', cookie=cookie)[2]
+
+    assert request(first, '/content/Shop/', cookie=cookie)[0] == 200
+    assert request(first, '/content/Shop/')[0] == 302
+
+
+def test_generated_secret_key_is_kept_in_the_instance_folder(tmp_path, monkeypatch):
+    monkeypatch.setenv('OCE_INSTANCE_PATH', str(tmp_path))
+    monkeypatch.delenv('OCE_SECRET_KEY', raising=False)
+
+    key = create_app().secret_key
+    assert key == (tmp_path / 'secret_key').read_text()
+    assert create_app().secret_key == key
+
+    with pytest.raises(RuntimeError, match='SECRET_KEY'):
+        create_app('production')
+    monkeypatch.setenv('OCE_SECRET_KEY', 'configured')
+    assert create_app('production').secret_key == 'configured'
+
+
+def test_settings_file_and_environment_override_the_profile(tmp_path, monkeypatch):
+    settings = tmp_path / 'settings.py'
+    settings.write_text("QUERY_CACHE_TTL = 5\nRATE_LIMIT_STORE = 'limits.db'\n")
+    monkeypatch.setenv('OCE_INSTANCE_PATH', str(tmp_path))
+    monkeypatch.setenv('OCE_SETTINGS', str(settings))
+    monkeypatch.setenv('OCE_QUERY_CACHE_TTL', '10')
+    monkeypatch.setenv('OCE_RATE_LIMIT_LOGIN_PER_IP', '[1, 2]')
+
+    config = create_app().config
+    assert config['QUERY_CACHE_TTL'] == 10
+    assert config['RATE_LIMIT_LOGIN_PER_IP'] == [1, 2]
+    assert config['RATE_LIMIT_STORE'] == str(tmp_path / 'limits.db')
+
+    with pytest.raises(ValueError, match='staging'):
+        create_app('staging')